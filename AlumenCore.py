@@ -1,6 +1,8 @@
 # --- START OF FILE AlumenCore.py ---
 import time
 import google.generativeai as genai
+from google.generativeai import client as genai_client
+from google.generativeai import caching as genai_caching
 import google.api_core.exceptions
 import csv
 import os
@@ -11,12 +13,30 @@ import json
 import polib
 import threading
 import textwrap
+import copy
+import io
+import pickle
+import operator
+import codecs
+import queue
+import sqlite3
+import multiprocessing
+import asyncio
+import contextvars
+import functools
+import atexit
+import hashlib
+import math
+import bisect
 import requests
 from packaging import version
-from threading import Lock, Event
+from threading import Lock, Event, Condition
 from datetime import datetime
 from tenacity import retry, stop_after_attempt, wait_exponential
-from collections import deque
+from collections import deque, OrderedDict, Counter
+from contextlib import nullcontext, contextmanager
+from collections.abc import MutableMapping
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
 
 # Moduli Opzionali
 try: import openpyxl
@@ -28,6 +48,9 @@ except ImportError: telegram_bot = None
 # Modulo per Fuzzy Matching
 try: from thefuzz import fuzz
 except ImportError: fuzz = None
+# rapidfuzz (dipendenza di thefuzz) calcola lo stesso punteggio in C su tutta la lista dei candidati
+try: from rapidfuzz import process as rf_process, fuzz as rf_fuzz
+except ImportError: rf_process = rf_fuzz = None
 
 
 from rich.console import Console
@@ -38,56 +61,313 @@ CURRENT_SCRIPT_VERSION = "2.2.1"
 GITHUB_REPO = "zSavT/Alumen"
 DEFAULT_MODEL_NAME = "gemini-2.5-flash"
 DEFAULT_CACHE_FILE = "alumen_cache.json"
+DEFAULT_SQLITE_CACHE_FILE = "alumen_cache.db"
+CACHE_JOURNAL_SUFFIX = ".journal"
+CACHE_COMPACT_INTERVAL = 300
+CACHE_COMPACT_JOURNAL_BYTES = 16 * 1024 * 1024
+CACHE_HOT_ENTRIES = 100_000
+CONTEXT_TIER_ENTRIES = 20_000
+CONTEXT_TIER_SUFFIX = ".context.json"
+BLOOM_MIN_CAPACITY = 1_000_000
+BLOOM_ERROR_RATE = 0.01
 LOG_FILE_NAME = "log.txt"
+LOG_BUFFER_BYTES = 64 * 1024
+LOG_DEBUG, LOG_INFO, LOG_WARNING, LOG_ERROR = 10, 20, 30, 40
+LOG_LEVELS = {'debug': LOG_DEBUG, 'info': LOG_INFO, 'warning': LOG_WARNING, 'error': LOG_ERROR}
 ESTIMATED_CHARS_PER_TOKEN = 3.5
 FILE_CONTEXT_SAMPLE_SIZE = 15
+BATCH_TOKEN_LIMIT = 3000
+ADAPTIVE_MAX_BATCH_SIZE = 150
+ADAPTIVE_TARGET_LATENCY = 20.0
+STREAM_CHUNK_ROWS = 500
+STREAM_QUEUE_CHUNKS = 4
+STREAM_READ_CHARS = 1024 * 1024
+PIPELINE_PREFETCH_FILES = 2
+PIPELINE_WRITE_WORKERS = 2
+POOL_REPARSE_FORMATS = {'xlsx'}  # --parse-workers: deserializzare un workbook openpyxl costa più che rileggerlo
+CONTEXT_CACHE_TTL = 3600
+CONTEXT_CACHE_REFRESH_MARGIN = 300
+CONTEXT_CACHE_MIN_TOKENS = 1024
+CONTEXT_CACHE_PRICE_RATIO = 0.25
+TELEMETRY_LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+TELEMETRY_COUNT_BUCKETS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 25000)
+METRICS_WRITE_INTERVAL = 30
+DRY_RUN_AVG_LATENCY = 6.0
+DRY_RUN_FILE_CONTEXT_CHARS = 200
+# Prezzi Gemini in USD per milione di token (input, output), tier a pagamento, prompt <= 200k token
+MODEL_PRICING = {
+    "gemini-2.5-pro": (1.25, 10.00),
+    "gemini-2.5-flash": (0.30, 2.50),
+    "gemini-2.5-flash-lite": (0.10, 0.40),
+    "gemini-2.0-flash": (0.10, 0.40),
+    "gemini-2.0-flash-lite": (0.075, 0.30),
+    "gemini-1.5-pro": (1.25, 5.00),
+    "gemini-1.5-flash": (0.075, 0.30),
+}
 
 # ----- GLOBALI -----
 console = Console()
-translation_cache = {}
-available_api_keys = []
-api_call_counts = {} 
-blacklisted_keys = set()
-current_api_key_index = 0
-model = None
-glossary_terms = {}
 BLACKLIST_TERMS = set(["Dummy", "dummy", "null", "NULL", "None"]) 
-total_files_translated = 0
-total_entries_translated = 0
-cache_hit_count = 0
-rpm_limit = None
-rpm_request_timestamps = []
-rpm_lock = Lock()
-last_cache_save_time = 0
-gui_log_queue = None 
-active_cache_file = DEFAULT_CACHE_FILE
-context_window_deque = deque()
-script_args_global = None 
-
-# Eventi flusso
-global_stop_event = None
-global_pause_event = None
-global_skip_event = None
-global_skip_api_event = None
+# Condivisi tra tutti i motori del processo
+async_loop = None
+async_loop_lock = Lock()
+call_usage = threading.local()
 interactive_commands_thread = None
+log_writer = None
+log_writer_lock = Lock()
+
+# --- TELEMETRIA ---
+class Histogram:
+    """Istogramma a bucket fissi (compatibile con Prometheus); i percentili sono interpolati nei bucket."""
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1) # L'ultimo bucket è +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def percentile(self, q):
+        if not self.count: return 0.0
+        rank, seen = q * self.count, 0
+        for i, c in enumerate(self.counts):
+            if c and seen + c >= rank:
+                lo = self.buckets[i - 1] if i > 0 else 0.0
+                hi = self.buckets[i] if i < len(self.buckets) else self.max
+                return min(self.max, lo + (hi - lo) * (rank - seen) / c)
+            seen += c
+        return self.max
+
+class Telemetry:
+    """
+    Metriche di prestazione di un motore: istogrammi (latenza e token per richiesta, dimensione
+    dei batch, attesa del rate limiter, lookup in cache, parsing) e contatori, esportabili in
+    JSON o nel formato testuale di Prometheus.
+    """
+    HISTOGRAMS = {
+        'request_latency_seconds': TELEMETRY_LATENCY_BUCKETS,
+        'request_tokens_in': TELEMETRY_COUNT_BUCKETS,
+        'request_tokens_out': TELEMETRY_COUNT_BUCKETS,
+        'batch_size': TELEMETRY_COUNT_BUCKETS,
+        'batch_latency_seconds': TELEMETRY_LATENCY_BUCKETS,
+        'rate_limit_wait_seconds': TELEMETRY_LATENCY_BUCKETS,
+        'cache_lookup_seconds': TELEMETRY_LATENCY_BUCKETS,
+        'response_parse_seconds': TELEMETRY_LATENCY_BUCKETS,
+        'file_parse_seconds': TELEMETRY_LATENCY_BUCKETS,
+    }
+
+    def __init__(self):
+        self.lock = Lock()
+        self.start_time = time.time()
+        self.last_write_time = 0
+        self.histograms = {name: Histogram(buckets) for name, buckets in self.HISTOGRAMS.items()}
+        self.counters = {}
+
+    def observe(self, name, value):
+        with self.lock: self.histograms[name].observe(value)
+
+    def inc(self, name, n=1):
+        with self.lock: self.counters[name] = self.counters.get(name, 0) + n
+
+    @contextmanager
+    def timer(self, name):
+        start = time.perf_counter()
+        try: yield
+        finally: self.observe(name, time.perf_counter() - start)
+
+    def snapshot(self):
+        with self.lock:
+            elapsed = max(1e-9, time.time() - self.start_time)
+            histograms = {
+                name: {'count': h.count, 'sum': h.sum, 'max': h.max, 'p50': h.percentile(0.5), 'p90': h.percentile(0.9), 'p99': h.percentile(0.99)}
+                for name, h in self.histograms.items()
+            }
+            return {
+                'elapsed_seconds': elapsed,
+                'counters': dict(self.counters),
+                'histograms': histograms,
+                'throughput': {
+                    'requests_per_second': self.histograms['request_latency_seconds'].count / elapsed,
+                    'tokens_out_per_second': self.histograms['request_tokens_out'].sum / elapsed,
+                },
+            }
+
+    def to_prometheus(self, gauges=None):
+        lines = []
+        with self.lock:
+            for name, value in sorted(self.counters.items()):
+                lines += [f"# TYPE alumen_{name} counter", f"alumen_{name} {value}"]
+            for name, value in sorted((gauges or {}).items()):
+                lines += [f"# TYPE alumen_{name} gauge", f"alumen_{name} {value}"]
+            for name, h in self.histograms.items():
+                lines.append(f"# TYPE alumen_{name} histogram")
+                cumulative = 0
+                for bound, c in zip(self.histograms[name].buckets + ('+Inf',), h.counts):
+                    cumulative += c
+                    lines.append(f'alumen_{name}_bucket{{le="{bound}"}} {cumulative}')
+                lines += [f"alumen_{name}_sum {h.sum}", f"alumen_{name}_count {h.count}"]
+        return "\n".join(lines) + "\n"
+
+# --- MOTORE ---
+class AlumenEngine:
+    """
+    Stato di un job di traduzione: cache, chiavi API, rate limiter, contatori ed eventi di controllo.
+    Ogni job gira nel proprio motore, quindi più motori (coppie di lingue o progetti diversi)
+    possono lavorare in parallelo nello stesso processo. Le funzioni del modulo operano sul
+    motore corrente (current_engine()); senza un motore esplicito si usa quello predefinito,
+    che è anche quello visto da GUI, CLI e bot Telegram.
+    Un motore può ricevere una cache e un ThreadPoolExecutor condivisi con altri motori.
+    """
+    def __init__(self, cache=None, executor=None):
+        self.shared_cache = cache is not None
+        self.translation_cache = cache if cache is not None else {}
+        self.executor = executor
+        self.available_api_keys = []
+        self.api_call_counts = {}
+        self.blacklisted_keys = set()
+        self.current_api_key_index = 0
+        self.model = None
+        self.glossary_terms = {}
+        self.glossary_index = None
+        self.files_total = 0
+        self.total_files_translated = 0
+        self.total_entries_translated = 0
+        self.cache_hit_count = 0
+        self.rpm_limit = None
+        self.rate_limiter = None
+        self.key_models = {}
+        self.key_async_models = {}
+        self.key_clients = {}
+        self.system_instruction = None
+        self.context_cache = None
+        self.context_cache_tokens = 0
+        self.telemetry = Telemetry()
+        self.adaptive_batch_state = {}
+        self.recovery_stats = {'batches': 0, 'rows': 0, 'calls': 0, 'salvaged': 0}
+        self.stats_lock = Lock()
+        self.last_cache_save_time = 0
+        self.compact_cache = True
+        self.gui_log_queue = None
+        self.log_level = LOG_INFO
+        self.active_cache_file = DEFAULT_CACHE_FILE
+        self.context_window_deque = deque()
+        self.context_tier = None
+        self.fuzzy_indexes = {}
+        self.cache_journal = None
+        self.script_args_global = None
+        # Eventi flusso
+        self.global_stop_event = None
+        self.global_pause_event = None
+        self.global_skip_event = None
+        self.global_skip_api_event = None
+
+    def call(self, fn, *args, **kwargs):
+        """Esegue fn con questo motore come motore corrente."""
+        token = _current_engine.set(self)
+        try: return fn(*args, **kwargs)
+        finally: _current_engine.reset(token)
+
+    def setup(self, args): return self.call(setup_engine, args)
+    def run(self, args, **kwargs): return self.call(run_core_process, args, **kwargs)
+    def translate(self, entries, args, stop_event, file_context=None): return self.call(translate_batch, entries, args, stop_event, file_context)
+    def stats_text(self, **kwargs): return self.call(_get_full_stats_text, **kwargs)
+
+_current_engine = contextvars.ContextVar('alumen_engine', default=None)
+default_engine = AlumenEngine()
+_ENGINE_STATE = frozenset(vars(default_engine))
+
+def current_engine():
+    return _current_engine.get() or default_engine
+
+def _bind_engine(fn):
+    """Lega fn al motore corrente: i thread dei pool non ereditano il contesto del chiamante."""
+    eng = current_engine()
+    return lambda *args, **kwargs: eng.call(fn, *args, **kwargs)
+
+def __getattr__(name):
+    # Compatibilità: AlumenCore.translation_cache, AlumenCore.global_stop_event, ... leggono il motore corrente
+    if name in _ENGINE_STATE: return getattr(current_engine(), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+# --- LOGGING ---
+class LogWriter:
+    """
+    Scrive i log in un thread dedicato: log_msg si limita ad accodare, mentre rendering Rich,
+    file di log (handle persistente con buffer, svuotato quando la coda è vuota), coda della GUI
+    e notifiche Telegram restano fuori dal percorso di traduzione.
+    """
+    def __init__(self):
+        self.queue = queue.SimpleQueue()
+        self.files = {}
+        self.thread = threading.Thread(target=self._run, name="alumen-log", daemon=True)
+        self.thread.start()
 
-def log_msg(message, style=""):
-    timestamp = datetime.now().strftime('%H:%M:%S')
-    full_msg = f"[{timestamp}] {message}"
-    console.print(message, style=style)
-    
-    if script_args_global and hasattr(script_args_global, 'enable_file_log') and script_args_global.enable_file_log:
-        try:
-            with open(LOG_FILE_NAME, 'a', encoding='utf-8') as f:
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            if isinstance(item, Event):
+                self._flush_files()
+                item.set()
+                continue
+            self._write(*item)
+            if self.queue.empty(): self._flush_files()
+
+    def _flush_files(self):
+        for f in self.files.values():
+            try: f.flush()
+            except Exception: pass
+
+    def _write(self, timestamp, message, style, level, gui_queue, log_file):
+        full_msg = f"[{timestamp}] {message}"
+        try: console.print(message, style=style)
+        except Exception: pass
+        if log_file:
+            try:
+                f = self.files.get(log_file)
+                if f is None: f = self.files[log_file] = open(log_file, 'a', encoding='utf-8', buffering=LOG_BUFFER_BYTES)
                 f.write(full_msg + "\n")
-        except: pass
-
-    if gui_log_queue:
-        gui_log_queue.put(full_msg)
-    
-    if telegram_bot and ("🛑" in message or "✅" in message):
-        try: telegram_bot.send_telegram_notification(message)
-        except: pass
+            except Exception: pass
+        if gui_queue: gui_queue.put((level, full_msg))
+        if telegram_bot:
+            try: telegram_bot.notify(message, level)
+            except: pass
+
+    def flush(self, timeout=10):
+        """Attende che i messaggi già accodati siano scritti."""
+        if not self.thread.is_alive(): return
+        done = Event()
+        self.queue.put(done)
+        done.wait(timeout)
+
+def _get_log_writer():
+    global log_writer
+    if log_writer is None:
+        with log_writer_lock:
+            if log_writer is None: log_writer = LogWriter()
+    return log_writer
+
+def flush_logs():
+    if log_writer: log_writer.flush()
+
+atexit.register(flush_logs)
+
+def log_msg(message, style="", level=None):
+    """
+    Accoda un messaggio di log. Il livello, se non indicato, si deduce dallo stile (rosso = errore,
+    giallo = avviso). message può essere una funzione senza argomenti: viene chiamata solo se il
+    livello è attivo, così i payload di debug (prompt e risposte) non si formattano inutilmente.
+    """
+    eng = current_engine()
+    if level is None: level = LOG_ERROR if 'red' in style else LOG_WARNING if 'yellow' in style else LOG_INFO
+    if level < eng.log_level: return
+    if callable(message): message = message()
+    log_file = LOG_FILE_NAME if getattr(eng.script_args_global, 'enable_file_log', False) else None
+    _get_log_writer().queue.put((datetime.now().strftime('%H:%M:%S'), message, style, level, eng.gui_log_queue, log_file))
 
 def clean_api_key(key):
     if not key: return ""
@@ -152,6 +432,147 @@ def normalize_text_for_fuzzy(text):
     if t and t[-1] in ".,;!?'\"": t = t[:-1]
     return t
 
+class FuzzyIndex:
+    """
+    Indice della cache per il fuzzy matching di una coppia di lingue. fuzz.ratio non può raggiungere la
+    soglia se le lunghezze differiscono troppo, quindi i testi sono raggruppati in fasce di lunghezza e una
+    ricerca visita solo quelle compatibili. Dentro ogni fascia un filtro sui caratteri scarta in blocco, con
+    operazioni su bitset, i testi che non hanno abbastanza caratteri in comune con la ricerca: solo i
+    sopravvissuti sono valutati da rapidfuzz in C (senza, da fuzz.ratio) e il risultato è sempre il
+    migliore sopra --fuzzy-threshold.
+    """
+    def __init__(self, threshold):
+        self.threshold = threshold
+        self.docs = set()   # testi originali in cache
+        self.bands = {}     # fascia -> [testo]
+        self.bits = {}      # fascia -> {(carattere, n): bitset dei testi con almeno n occorrenze, lunghezza: bitset dei testi}
+        self.indexed = {}   # fascia -> quanti testi sono già nei bitset
+        self.lock = Lock()
+
+    @staticmethod
+    def _band(length):
+        """Fascia di una lunghezza: larga 1 fino a 15 caratteri, poi proporzionale alla lunghezza (16-31 a coppie, ...)."""
+        width = 1 << max(0, length.bit_length() - 4)
+        return width, length // width
+
+    def add(self, text):
+        with self.lock:
+            if text in self.docs: return
+            self.docs.add(text)
+            self.bands.setdefault(self._band(len(text)), []).append(text)
+
+    def _char_bits(self, band):
+        """Bitset della fascia. I testi aggiunti dopo l'ultima ricerca vengono indicizzati qui, in blocco."""
+        texts, bits = self.bands[band], self.bits.setdefault(band, {})
+        start = self.indexed.get(band, 0)
+        if start == len(texts): return bits
+        exact = {}   # (carattere, n) o lunghezza -> posizioni dei nuovi testi con esattamente n occorrenze o quella lunghezza
+        for pos in range(start, len(texts)):
+            exact.setdefault(len(texts[pos]), []).append(pos)
+            for ch, n in Counter(texts[pos]).items(): exact.setdefault((ch, n), []).append(pos)
+        size = (len(texts) + 7) // 8
+        for key, positions in exact.items():
+            buf = bytearray(size)
+            for pos in positions: buf[pos >> 3] |= 1 << (pos & 7)
+            mask = int.from_bytes(buf, 'little')
+            if isinstance(key, int): bits[key] = bits.get(key, 0) | mask
+            else:
+                for k in range(1, key[1] + 1): bits[(key[0], k)] = bits.get((key[0], k), 0) | mask
+        self.indexed[band] = len(texts)
+        return bits
+
+    def _filter(self, band, wanted, max_misses):
+        """Testi della fascia a cui mancano al più max_misses[lunghezza] dei caratteri (carattere, n) di wanted."""
+        texts, bits = self.bands[band], self._char_bits(band)
+        everyone = (1 << len(texts)) - 1
+        # Contatore binario dei caratteri mancanti, una cifra per bitset. Ogni testo parte da top - max_misses
+        # della sua lunghezza, così un solo confronto con top vale per tutte le lunghezze della fascia
+        top = max(max_misses.values())
+        digits = [0] * top.bit_length()
+        rejected = everyone
+        for lb, misses in max_misses.items():
+            mask = bits.get(lb, 0)
+            rejected ^= mask
+            for j in range(len(digits)):
+                if (top - misses) >> j & 1: digits[j] |= mask
+        for key in wanted:
+            carry = everyone ^ bits.get(key, 0)
+            for j in range(len(digits)):
+                if not carry: break
+                digit = digits[j]
+                digits[j], carry = digit ^ carry, carry & digit
+            rejected |= carry   # oltre l'ultima cifra: più di top
+        equal = everyone
+        for j in range(len(digits) - 1, -1, -1):
+            if top >> j & 1: equal &= digits[j]
+            else:
+                rejected |= equal & digits[j]
+                equal &= everyone ^ digits[j]
+        survivors = bin(everyone ^ rejected)[:1:-1]   # testo i -> bit i
+        found, i = [], survivors.find('1')
+        while i != -1:
+            found.append(texts[i])
+            i = survivors.find('1', i + 1)
+        return found
+
+    def best_match(self, text):
+        """Restituisce (testo_in_cache, similarità) del miglior match sopra soglia, oppure (None, 0)."""
+        la = len(text)
+        if not la or self.threshold <= 0: return None, 0
+        # fuzz.ratio arrotonda 100 * (1 - indel / (la + lb)) e non supera 200 * min(la, lb) / (la + lb):
+        # sotto cutoff (soglia - 0.5 prima dell'arrotondamento) le lunghezze fuori da [lb_min, lb_max] sono escluse
+        cutoff = self.threshold - 0.5
+        lb_min = math.ceil(la * cutoff / (200 - cutoff))
+        lb_max = math.floor(la * (200 - cutoff) / cutoff)
+        # La sottosequenza comune non supera i caratteri in comune (contati con le ripetizioni), quindi
+        # fuzz.ratio <= 200 * comuni / (la + lb): a un testo lungo lb possono mancare al più
+        # la - ceil(cutoff * (la + lb) / 200) caratteri della ricerca. La n-esima occorrenza di un carattere è (carattere, n)
+        wanted = [(ch, k) for ch, n in Counter(text).items() for k in range(1, n + 1)]
+        bands = {}
+        # Prima le lunghezze più vicine: rapidfuzz alza il cutoff al miglior punteggio trovato e scarta prima gli altri
+        for lb in sorted(range(lb_min, lb_max + 1), key=lambda lb: abs(lb - la)):
+            bands.setdefault(self._band(lb), {})[lb] = la - math.ceil(cutoff * (la + lb) / 200)
+        candidates = []
+        with self.lock:
+            for band, max_misses in bands.items():
+                if band in self.bands: candidates += self._filter(band, wanted, max_misses)
+        if rf_process:
+            match = rf_process.extractOne(text, candidates, scorer=rf_fuzz.ratio, score_cutoff=cutoff)
+            best_text, best_score = (match[0], int(round(match[1]))) if match else (None, 0)
+        else:
+            best_text, best_score = None, 0
+            for cand in candidates:
+                score = fuzz.ratio(text, cand)
+                if score > best_score: best_text, best_score = cand, score
+        return (best_text, best_score) if best_score >= self.threshold else (None, 0)
+
+def _get_fuzzy_index(args):
+    """Restituisce (costruendolo alla prima richiesta) l'indice fuzzy per la coppia di lingue corrente."""
+    eng = current_engine()
+    pair = (args.source_lang, args.target_lang)
+    index = eng.fuzzy_indexes.get(pair)
+    if index is None or index.threshold != args.fuzzy_threshold:
+        index = FuzzyIndex(args.fuzzy_threshold)
+        if isinstance(eng.translation_cache, SQLiteCacheStore):
+            for text in eng.translation_cache.iter_texts(args.source_lang, args.target_lang): index.add(text)
+        else:
+            lang_tuple_part = f', "{args.source_lang}", "{args.target_lang}"]'
+            for key in list(eng.translation_cache.keys()):
+                if key.endswith(lang_tuple_part):
+                    try: index.add(json.loads(key)[0])
+                    except: continue
+        eng.fuzzy_indexes[pair] = index
+        log_msg(f"🔍 Indice fuzzy costruito ({len(index.docs)} voci).", style="dim")
+    return index
+
+def _store_translation(text, translated_text, args):
+    """Salva una traduzione esatta in cache e aggiorna l'eventuale indice fuzzy."""
+    eng = current_engine()
+    exact_ck = json.dumps((text, args.source_lang, args.target_lang), ensure_ascii=False)
+    _cache_put(exact_ck, translated_text)
+    index = eng.fuzzy_indexes.get((args.source_lang, args.target_lang))
+    if index: index.add(text)
+
 def _excel_col_to_index(col_str):
     """Converte una lettera di colonna Excel (es. 'A', 'B', 'AA') in un indice 0-based."""
     index = 0
@@ -169,6 +590,65 @@ def _load_glossary_dict(filepath):
         except: pass
     return g_dict
 
+class GlossaryIndex:
+    """
+    Automa di Aho-Corasick sui termini del glossario (senza distinzione maiuscole/minuscole):
+    trova in una sola passata i termini presenti in un testo, qualunque sia la dimensione del glossario.
+    """
+    def __init__(self, glossary):
+        self.glossary = glossary
+        self.goto, self.fail, self.out = [{}], [0], [[]]
+        for term in glossary:
+            key = term.lower()
+            if not key: continue
+            node = 0
+            for ch in key:
+                nxt = self.goto[node].get(ch)
+                if nxt is None:
+                    nxt = len(self.goto)
+                    self.goto[node][ch] = nxt
+                    self.goto.append({}); self.fail.append(0); self.out.append([])
+                node = nxt
+            self.out[node].append((term, len(key)))
+        # Link di fallimento in ampiezza: i nodi di profondità 1 puntano alla radice
+        q = deque(self.goto[0].values())
+        while q:
+            node = q.popleft()
+            for ch, nxt in self.goto[node].items():
+                q.append(nxt)
+                f = self.fail[node]
+                while f and ch not in self.goto[f]: f = self.fail[f]
+                self.fail[nxt] = self.goto[f].get(ch, 0)
+                self.out[nxt] = self.out[nxt] + self.out[self.fail[nxt]]
+
+    @staticmethod
+    def _joins(a, b):
+        # Confine di parola solo tra caratteri alfanumerici ASCII (le lingue senza spazi corrispondono sempre)
+        return a.isascii() and a.isalnum() and b.isascii() and b.isalnum()
+
+    def find(self, text):
+        """Termini presenti nel testo come parole intere, in ordine di prima occorrenza."""
+        found = {}
+        low = text.lower()
+        node = 0
+        for i, ch in enumerate(low):
+            while node and ch not in self.goto[node]: node = self.fail[node]
+            node = self.goto[node].get(ch, 0)
+            for term, n in self.out[node]:
+                if term in found: continue
+                start = i - n + 1
+                if start > 0 and self._joins(low[start - 1], low[start]): continue
+                if i + 1 < len(low) and self._joins(low[i], low[i + 1]): continue
+                found[term] = self.glossary[term]
+        return found
+
+def _glossary_block(texts):
+    """Sezione GLOSSARIO con i soli termini presenti nei testi da tradurre (--glossary-filter)."""
+    eng = current_engine()
+    if not eng.glossary_index: return ""
+    terms = eng.glossary_index.find("\n".join(texts))
+    return f"GLOSSARIO (usa TASSATIVAMENTE):\n{json.dumps(terms, ensure_ascii=False)}\n" if terms else ""
+
 def _build_system_instruction_text(args, glossary_dict):
     blacklist_str = ", ".join(BLACKLIST_TERMS)
     parts = [
@@ -185,7 +665,9 @@ def _build_system_instruction_text(args, glossary_dict):
         "",
         "--- GLOSSARIO ---"
     ]
-    if glossary_dict:
+    if glossary_dict and getattr(args, 'glossary_filter', False):
+        parts.append("Ogni richiesta riporta i termini del glossario presenti nel testo (sezione GLOSSARIO): usali TASSATIVAMENTE.")
+    elif glossary_dict:
         parts.append(f"Usa TASSATIVAMENTE il seguente glossario:\n{json.dumps(glossary_dict, ensure_ascii=False, indent=2)}")
     else:
         parts.append("Nessun glossario specifico fornito.")
@@ -206,31 +688,759 @@ def generate_prompt_preview(args):
     real_glossary = _load_glossary_dict(args.glossary)
     system_instr = _build_system_instruction_text(args, real_glossary)
     mock_input = ["Start Game", "Options", "Variable {x} test."]
-    user_msg = f"Traduci il seguente array JSON da {args.source_lang} a {args.target_lang}.\nINPUT:\n{json.dumps(mock_input, ensure_ascii=False, indent=2)}"
+    glossary_str = ""
+    if real_glossary and getattr(args, 'glossary_filter', False):
+        terms = GlossaryIndex(real_glossary).find("\n".join(mock_input))
+        glossary_str = f"GLOSSARIO (usa TASSATIVAMENTE):\n{json.dumps(terms, ensure_ascii=False)}\n" if terms else ""
+    user_msg = f"{glossary_str}Traduci il seguente array JSON da {args.source_lang} a {args.target_lang}.\nINPUT:\n{json.dumps(mock_input, ensure_ascii=False, indent=2)}"
     est_tokens = int(len(system_instr + user_msg) / ESTIMATED_CHARS_PER_TOKEN)
     return f"=== SYSTEM ===\n{system_instr}\n\n=== USER ===\n{user_msg}\n\n📊 Token Stimati: ~{est_tokens}"
 
-# --- SETUP ENGINE ---
-def setup_engine(args):
-    global available_api_keys, model, glossary_terms, translation_cache, rpm_limit, active_cache_file, context_window_deque, script_args_global, api_call_counts
-    script_args_global = args 
-    active_cache_file = args.cache_file if args.cache_file else DEFAULT_CACHE_FILE
-    
-    if args.full_context_sample and not args.enable_file_context:
-        args.full_context_sample = False
-    if args.context_window:
-        context_window_deque = deque(maxlen=args.context_window)
+# --- CACHE BACKEND ---
+class SQLiteCacheStore(MutableMapping):
+    """
+    Cache persistente su SQLite (WAL) con la stessa interfaccia del dizionario JSON.
+    Le chiavi restano le stringhe JSON delle tuple (text, source_lang, target_lang[, context])
+    ma vengono salvate in colonne separate. Le letture sono lazy (una query per chiave),
+    le scritture restano in memoria fino a flush(), che esegue un upsert incrementale.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.lock = Lock()
+        self.pending = {}
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS translations ("
+            "text TEXT NOT NULL, source_lang TEXT NOT NULL, target_lang TEXT NOT NULL, "
+            "context TEXT NOT NULL DEFAULT '', translation TEXT NOT NULL, "
+            "PRIMARY KEY (text, source_lang, target_lang, context))"
+        )
+        self.conn.commit()
+        self.count = self.conn.execute("SELECT COUNT(*) FROM translations").fetchone()[0]
+
+    @staticmethod
+    def _split_key(key):
+        # Le chiavi (text, src, tgt) e (text, src, tgt, "") indicano la stessa voce generica
+        parts = json.loads(key)
+        return (parts[0], parts[1], parts[2], parts[3] if len(parts) > 3 else "")
+
+    @staticmethod
+    def _join_key(row):
+        text, src, tgt, ctx = row
+        return json.dumps((text, src, tgt, ctx) if ctx else (text, src, tgt), ensure_ascii=False)
+
+    def _select(self, parts):
+        row = self.conn.execute(
+            "SELECT translation FROM translations WHERE text=? AND source_lang=? AND target_lang=? AND context=?", parts
+        ).fetchone()
+        return row[0] if row else None
+
+    def __getitem__(self, key):
+        parts = self._split_key(key)
+        with self.lock:
+            if parts in self.pending: return self.pending[parts]
+            value = self._select(parts)
+        if value is None: raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        parts = self._split_key(key)
+        with self.lock:
+            if parts not in self.pending and self._select(parts) is None: self.count += 1
+            self.pending[parts] = value
+
+    def __delitem__(self, key):
+        parts = self._split_key(key)
+        with self.lock:
+            if self.pending.pop(parts, None) is None and self._select(parts) is None: raise KeyError(key)
+            self.conn.execute("DELETE FROM translations WHERE text=? AND source_lang=? AND target_lang=? AND context=?", parts)
+            self.conn.commit()
+            self.count -= 1
+
+    def __iter__(self):
+        self.flush()
+        for row in self.conn.execute("SELECT text, source_lang, target_lang, context FROM translations"):
+            yield self._join_key(row)
+
+    def __len__(self):
+        return self.count
+
+    def iter_texts(self, source_lang, target_lang):
+        """Testi originali delle voci generiche di una coppia di lingue (usato dall'indice fuzzy)."""
+        self.flush()
+        for (text,) in self.conn.execute(
+            "SELECT text FROM translations WHERE source_lang=? AND target_lang=? AND context=''", (source_lang, target_lang)
+        ):
+            yield text
+
+    def update_many(self, items):
+        """Upsert diretto di un iterabile di coppie (chiave JSON, traduzione), usato dall'importer."""
+        with self.lock:
+            self.conn.executemany(
+                "INSERT INTO translations (text, source_lang, target_lang, context, translation) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(text, source_lang, target_lang, context) DO UPDATE SET translation=excluded.translation",
+                (self._split_key(k) + (v,) for k, v in items)
+            )
+            self.conn.commit()
+            self.count = self.conn.execute("SELECT COUNT(*) FROM translations").fetchone()[0]
+
+    def pop_context_entries(self):
+        """Rimuove e restituisce come ((text, src, tgt, context), traduzione) le voci qualificate da un contesto."""
+        self.flush()
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT text, source_lang, target_lang, context, translation FROM translations WHERE context != ''"
+            ).fetchall()
+            if rows:
+                self.conn.execute("DELETE FROM translations WHERE context != ''")
+                self.conn.commit()
+                self.count -= len(rows)
+        return [(row[:4], row[4]) for row in rows]
+
+    def flush(self):
+        with self.lock:
+            if not self.pending: return
+            self.conn.executemany(
+                "INSERT INTO translations (text, source_lang, target_lang, context, translation) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(text, source_lang, target_lang, context) DO UPDATE SET translation=excluded.translation",
+                [parts + (value,) for parts, value in self.pending.items()]
+            )
+            self.conn.commit()
+            self.pending.clear()
+
+    def close(self):
+        self.flush()
+        self.conn.close()
+
+class BloomFilter:
+    """Filtro di Bloom sulle chiavi della cache: risponde "sicuramente assente" senza accedere al disco."""
+    def __init__(self, capacity, error_rate=BLOOM_ERROR_RATE):
+        self.capacity = max(1, capacity)
+        self.size = max(8, int(-self.capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / self.capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key):
+        # Double hashing su un unico digest: k posizioni con una sola funzione di hash
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+        h1, h2 = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, key):
+        for pos in self._positions(key): self.bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, key):
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+class TieredCacheStore(SQLiteCacheStore):
+    """
+    Cache a livelli per translation memory molto grandi: LRU in memoria limitata a hot_size voci,
+    filtro di Bloom sulle chiavi salvate (le assenze certe non toccano SQLite) e SQLite come
+    livello freddo. Tiene i contatori di hit per livello, miss ed evizioni dalla LRU.
+    """
+    def __init__(self, path, hot_size=CACHE_HOT_ENTRIES):
+        super().__init__(path)
+        self.hot_size = max(1, hot_size)
+        self.hot = OrderedDict()
+        self.stats = {'hot_hits': 0, 'cold_hits': 0, 'bloom_misses': 0, 'cold_misses': 0, 'evictions': 0}
+        if not self._load_bloom(): self._build_bloom()
+
+    def _build_bloom(self):
+        self.bloom = BloomFilter(max(self.count * 2, BLOOM_MIN_CAPACITY))
+        for row in self.conn.execute("SELECT text, source_lang, target_lang, context FROM translations"):
+            self.bloom.add(self._join_key(row))
+
+    def _load_bloom(self):
+        """Riusa il filtro salvato alla chiusura precedente se il numero di voci coincide (evita di rileggere tutto il DB)."""
+        try:
+            with open(self.path + ".bloom", 'rb') as f:
+                meta = json.loads(f.readline())
+                if meta['rows'] != self.count: return False
+                bloom = BloomFilter(meta['capacity'])
+                bloom.bits, bloom.count = bytearray(f.read()), meta['count']
+            if len(bloom.bits) != (bloom.size + 7) // 8: return False
+            self.bloom = bloom
+            return True
+        except (OSError, ValueError, KeyError): return False
+
+    def _save_bloom(self):
+        try:
+            with open(self.path + ".bloom", 'wb') as f:
+                f.write(json.dumps({'rows': self.count, 'capacity': self.bloom.capacity, 'count': self.bloom.count}).encode() + b"\n")
+                f.write(self.bloom.bits)
+        except OSError: pass
+
+    @staticmethod
+    def _canonical(key):
+        # (text, src, tgt, "") e (text, src, tgt) sono la stessa voce: evita il parsing JSON della chiave
+        return key[:-5] + "]" if key.endswith(', ""]') else key
+
+    def _remember(self, key, value):
+        self.hot[key] = value
+        self.hot.move_to_end(key)
+        if len(self.hot) > self.hot_size:
+            self.hot.popitem(last=False)
+            self.stats['evictions'] += 1
+
+    def _lookup(self, key):
+        key = self._canonical(key)
+        with self.lock:
+            value = self.hot.get(key)
+            if value is not None:
+                self.hot.move_to_end(key)
+                self.stats['hot_hits'] += 1
+                return value
+            if key not in self.bloom:
+                self.stats['bloom_misses'] += 1
+                return None
+            parts = self._split_key(key)
+            value = self.pending.get(parts)
+            if value is None: value = self._select(parts)
+            if value is None:
+                self.stats['cold_misses'] += 1
+                return None
+            self.stats['cold_hits'] += 1
+            self._remember(key, value)
+            return value
+
+    def __getitem__(self, key):
+        value = self._lookup(key)
+        if value is None: raise KeyError(key)
+        return value
+
+    def __contains__(self, key):
+        return self._lookup(key) is not None
+
+    def get(self, key, default=None):
+        value = self._lookup(key)
+        return default if value is None else value
+
+    def __setitem__(self, key, value):
+        key = self._canonical(key)
+        parts = self._split_key(key)
+        with self.lock:
+            if key not in self.bloom: self.count += 1
+            elif key not in self.hot and parts not in self.pending and self._select(parts) is None: self.count += 1
+            self.bloom.add(key)
+            self.pending[parts] = value
+            self._remember(key, value)
+        if self.bloom.count > self.bloom.capacity:
+            # Oltre la capacità i falsi positivi crescono: il filtro viene ricostruito più grande
+            self.flush()
+            with self.lock: self._build_bloom()
+
+    def __delitem__(self, key):
+        key = self._canonical(key)
+        with self.lock: self.hot.pop(key, None)
+        super().__delitem__(key)
+
+    def update_many(self, items):
+        super().update_many(items)
+        with self.lock:
+            self.hot.clear()
+            self._build_bloom()
+
+    def pop_context_entries(self):
+        items = super().pop_context_entries()
+        if items:
+            with self.lock:
+                self.hot.clear()
+                self._build_bloom()
+        return items
+
+    def close(self):
+        super().close()
+        self._save_bloom()
+
+class ContextKeyTier:
+    """
+    Livello separato per le voci della modalità legacy qualificate dal contesto dinamico (contesto
+    del file e ultime traduzioni), quasi sempre irripetibili: chiavi compatte (hash di 16 byte)
+    in una LRU di al massimo max_entries voci, salvata in un file a parte accanto alla cache.
+    La cache principale contiene solo le voci generiche.
+    """
+    def __init__(self, max_entries=CONTEXT_TIER_ENTRIES):
+        self.max_entries = max(1, max_entries)
+        self.entries = OrderedDict()
+        self.lock = Lock()
+        self.evictions = 0
+
+    @staticmethod
+    def key(text, source_lang, target_lang, context):
+        raw = "\x00".join((text, source_lang, target_lang, context)).encode('utf-8')
+        return hashlib.blake2b(raw, digest_size=16).hexdigest()
+
+    def get(self, key):
+        with self.lock:
+            value = self.entries.get(key)
+            if value is not None: self.entries.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def __len__(self):
+        return len(self.entries)
+
+    def load(self, path):
+        if not os.path.exists(path): return
+        try:
+            with open(path, 'r', encoding='utf-8') as f: data = json.load(f)
+        except (OSError, ValueError): return
+        for key, value in data.items(): self.put(key, value)
+
+    def save(self, path):
+        with self.lock: data = dict(self.entries)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f: json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
 
-    if args.persistent_cache and os.path.exists(active_cache_file):
+class CacheJournal:
+    """
+    Journal append-only (JSON-lines) delle nuove voci della cache JSON.
+    Ogni batch tradotto viene accodato e sincronizzato su disco con fsync (costo O(batch)),
+    così un crash tra due compattazioni non perde traduzioni già pagate.
+    Viene riapplicato all'avvio e svuotato dopo ogni compattazione nel file di cache principale.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.pending = []
+        self.lock = Lock()
+
+    def record(self, key, value):
+        with self.lock: self.pending.append((key, value))
+
+    def commit(self):
+        with self.lock:
+            if not self.pending: return
+            lines = "".join(json.dumps(item, ensure_ascii=False) + "\n" for item in self.pending)
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(lines)
+                f.flush()
+                os.fsync(f.fileno())
+            self.pending.clear()
+
+    def replay(self, cache):
+        if not os.path.exists(self.path): return 0
+        replayed = 0
+        valid_end = 0
+        with open(self.path, 'rb') as f:
+            for line in f:
+                if not line.endswith(b"\n"): break # Ultima riga troncata da un crash
+                valid_end += len(line)
+                try: key, value = json.loads(line.decode('utf-8'))
+                except ValueError: continue
+                cache[key] = value
+                replayed += 1
+        # Rimuove l'eventuale record troncato, così i prossimi append partono da una riga pulita
+        if valid_end < self.size(): os.truncate(self.path, valid_end)
+        return replayed
+
+    def size(self):
+        return os.path.getsize(self.path) if os.path.exists(self.path) else 0
+
+    def truncate(self):
+        with self.lock:
+            with open(self.path, 'w', encoding='utf-8'): pass
+
+def import_json_cache(json_path, store):
+    """Importa in un SQLiteCacheStore una cache nel formato JSON (alumen_cache.json o output di cache_extractor.py)."""
+    with open(json_path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    valid = ((k, v) for k, v in data.items() if isinstance(v, str))
+    store.update_many(valid)
+    log_msg(f"📥 Importate {len(data)} voci da '{json_path}' in '{store.path}'.", style="cyan")
+    return len(data)
+
+def _open_cache(args):
+    """
+    Apre la cache persistente secondo --cache-backend e restituisce (cache, percorso).
+    Per il backend JSON la cache è None se il file non esiste (si mantiene quella in memoria).
+    """
+    eng = current_engine()
+    backend = getattr(args, 'cache_backend', 'json') or 'json'
+    if backend in ('sqlite', 'tiered'):
+        path = args.cache_file if args.cache_file else DEFAULT_SQLITE_CACHE_FILE
+        json_source = None
+        if path.lower().endswith('.json'):
+            # Migrazione one-shot: un file .json indicato come cache diventa la sorgente del DB omonimo
+            json_source, path = path, os.path.splitext(path)[0] + ".db"
+        is_new = not os.path.exists(path)
+        if backend == 'tiered': store = TieredCacheStore(path, getattr(args, 'cache_hot_size', None) or CACHE_HOT_ENTRIES)
+        else: store = SQLiteCacheStore(path)
+        if is_new and json_source and os.path.exists(json_source):
+            try: import_json_cache(json_source, store)
+            except Exception as e: log_msg(f"⚠️ Importazione cache JSON fallita: {e}", style="yellow")
+        log_msg(f"💾 Cache {'a livelli' if backend == 'tiered' else 'SQLite'} aperta: '{path}' ({len(store)} voci)", style="dim")
+        return store, path
+
+    path = args.cache_file if args.cache_file else DEFAULT_CACHE_FILE
+    cache = None
+    if os.path.exists(path):
         try:
-            with open(active_cache_file, 'r', encoding='utf-8') as f:
-                translation_cache = json.load(f)
-            log_msg(f"💾 Cache caricata ({len(translation_cache)} voci)", style="dim")
+            with open(path, 'r', encoding='utf-8') as f:
+                cache = json.load(f)
+            log_msg(f"💾 Cache caricata ({len(cache)} voci)", style="dim")
         except: pass
+    journal = CacheJournal(path + CACHE_JOURNAL_SUFFIX)
+    if journal.size():
+        if cache is None: cache = dict(eng.translation_cache)
+        replayed = journal.replay(cache)
+        if replayed: log_msg(f"♻️ Journal cache: recuperate {replayed} voci non ancora compattate.", style="cyan")
+    return cache, path
+
+# --- TELEMETRIA: STRUMENTAZIONE ED EXPORT ---
+def _timed(metric):
+    """Decoratore: registra la durata della funzione nell'istogramma metric del motore corrente."""
+    def wrap(fn):
+        @functools.wraps(fn)
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try: return fn(*args, **kwargs)
+            finally: current_engine().telemetry.observe(metric, time.perf_counter() - start)
+        return timed
+    return wrap
+
+def _count_retry(retry_state):
+    current_engine().telemetry.inc('retries_total')
+
+def _engine_gauges():
+    eng = current_engine()
+    return {
+        'files_translated': eng.total_files_translated,
+        'entries_translated': eng.total_entries_translated,
+        'cache_hits': eng.cache_hit_count,
+        'api_calls': sum(eng.api_call_counts.values()),
+    } | ({f"cache_{k}": v for k, v in eng.translation_cache.stats.items()} if isinstance(eng.translation_cache, TieredCacheStore) else {})
+
+def write_metrics(args, force=False):
+    """
+    Esporta la telemetria in --metrics-file: testo Prometheus se il file termina in .prom o .txt,
+    altrimenti JSON. Scrittura atomica, al massimo ogni METRICS_WRITE_INTERVAL secondi se non forzata.
+    """
+    eng = current_engine()
+    path = getattr(args, 'metrics_file', None)
+    if not path: return
+    now = time.time()
+    if not force and now - eng.telemetry.last_write_time < METRICS_WRITE_INTERVAL: return
+    eng.telemetry.last_write_time = now
+    try:
+        if path.lower().endswith(('.prom', '.txt')): content = eng.telemetry.to_prometheus(_engine_gauges())
+        else: content = json.dumps(eng.telemetry.snapshot() | {'engine': _engine_gauges()}, indent=2)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f: f.write(content)
+        os.replace(tmp_path, path)
+    except Exception as e:
+        log_msg(f"⚠️ Errore scrittura metriche: {e}", style="yellow")
+
+# --- RATE LIMITING ---
+class RateLimiter:
+    """
+    Token bucket per API key con budget RPM (richieste/minuto) e TPM (token/minuto).
+    acquire() sceglie, tra le chiavi candidate, quella che ha capacità per prima e
+    dorme esattamente fino a quel momento (niente polling). I token stimati prenotati
+    vengono poi corretti con quelli reali tramite settle().
+    """
+    def __init__(self, rpm=None, tpm=None):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.cond = Condition()
+        self.buckets = {} # key -> [richieste disponibili, token disponibili, ultimo refill]
+
+    def _bucket(self, key, now):
+        b = self.buckets.get(key)
+        if b is None:
+            b = self.buckets[key] = [float(self.rpm or 0), float(self.tpm or 0), now]
+        elapsed = now - b[2]
+        if self.rpm: b[0] = min(self.rpm, b[0] + elapsed * self.rpm / 60)
+        if self.tpm: b[1] = min(self.tpm, b[1] + elapsed * self.tpm / 60)
+        b[2] = now
+        return b
+
+    def _wait_time(self, b, tokens):
+        wait = 0.0
+        if self.rpm and b[0] < 1: wait = max(wait, (1 - b[0]) * 60 / self.rpm)
+        if self.tpm and b[1] < tokens: wait = max(wait, (tokens - b[1]) * 60 / self.tpm)
+        return wait
+
+    def _try_acquire(self, keys, tokens):
+        """Da chiamare con self.cond acquisito: restituisce (chiave, 0) se c'è budget, altrimenti (None, attesa)."""
+        now = time.monotonic()
+        best_key, best_wait = None, None
+        for key in keys:
+            wait = self._wait_time(self._bucket(key, now), tokens)
+            if best_wait is None or wait < best_wait: best_key, best_wait = key, wait
+        if best_wait > 0: return None, best_wait
+        b = self.buckets[best_key]
+        if self.rpm: b[0] -= 1
+        if self.tpm: b[1] -= tokens
+        return best_key, 0
+
+    def acquire(self, keys, tokens=0):
+        """Blocca finché una delle chiavi ha budget, lo consuma e restituisce la chiave scelta."""
+        if self.tpm: tokens = min(tokens, self.tpm) # Una richiesta più grande del budget non deve bloccare per sempre
+        with self.cond:
+            while True:
+                key, wait = self._try_acquire(keys, tokens)
+                if key is not None: return key
+                self.cond.wait(timeout=wait)
+
+    async def acquire_async(self, keys, tokens=0):
+        """Come acquire(), ma attende con asyncio.sleep senza bloccare l'event loop."""
+        if self.tpm: tokens = min(tokens, self.tpm)
+        while True:
+            with self.cond: key, wait = self._try_acquire(keys, tokens)
+            if key is not None: return key
+            await asyncio.sleep(wait)
+
+    def settle(self, key, estimated_tokens, actual_tokens):
+        """Corregge il budget TPM con i token realmente consumati dalla richiesta."""
+        if not self.tpm or actual_tokens is None: return
+        with self.cond:
+            b = self._bucket(key, time.monotonic())
+            b[1] -= (actual_tokens - min(estimated_tokens, self.tpm))
+            self.cond.notify_all()
+
+def _candidate_keys():
+    """Chiavi utilizzabili: la corrente per prima, poi le altre non in blacklist."""
+    eng = current_engine()
+    current = eng.available_api_keys[eng.current_api_key_index]
+    others = [k for k in eng.available_api_keys if k != current and k not in eng.blacklisted_keys]
+    return [current] + others
+
+# --- CONTEXT CACHING ---
+genai_config_lock = Lock()
+
+@contextmanager
+def _genai_configured(api_key):
+    """
+    Esegue il blocco con la configurazione globale di genai su api_key (le API pubbliche di caching
+    usano il client di default), poi torna alla chiave corrente del motore.
+    """
+    eng = current_engine()
+    with genai_config_lock:
+        genai.configure(api_key=api_key)
+        try: yield
+        finally:
+            if eng.available_api_keys: genai.configure(api_key=eng.available_api_keys[eng.current_api_key_index])
+
+class GeminiContextCache:
+    """
+    Context caching di Gemini: la system instruction (glossario e guida di stile compresi) viene
+    caricata una volta per chiave e modello come CachedContent; le richieste la referenziano per
+    nome e inviano solo il payload del batch. Il TTL viene prolungato prima della scadenza
+    (refresh); un contenuto che non si riesce a prolungare viene scartato e ricaricato.
+    """
+    min_tokens = CONTEXT_CACHE_MIN_TOKENS
+
+    def __init__(self, ttl=CONTEXT_CACHE_TTL):
+        self.ttl = ttl
+        self.lock = Lock()
+        self.handles = {}  # (api_key, modello) -> CachedContent
+        self.expires = {}  # (api_key, modello) -> scadenza (time.time())
+        self.uploads = 0
+        self.refreshes = 0
+
+    def _upload(self, api_key, model_name, instruction):
+        with _genai_configured(api_key):
+            return genai_caching.CachedContent.create(model_name, display_name="alumen", system_instruction=instruction, ttl=self.ttl)
+
+    def _extend(self, api_key, handle):
+        with _genai_configured(api_key): handle.update(ttl=self.ttl)
+
+    def get(self, api_key, model_name, instruction):
+        """Nome del contenuto in cache per (chiave, modello), caricato alla prima richiesta."""
+        with self.lock:
+            slot = (api_key, model_name)
+            handle = self.handles.get(slot)
+            if handle is None:
+                handle = self._upload(api_key, model_name, instruction)
+                self.handles[slot], self.expires[slot] = handle, time.time() + self.ttl
+                self.uploads += 1
+            return handle
+
+    def refresh(self, api_key):
+        """
+        Prolunga i contenuti della chiave che scadono entro CONTEXT_CACHE_REFRESH_MARGIN secondi.
+        True se uno è stato scartato: i modelli che lo referenziano vanno ricreati.
+        """
+        now = time.time()
+        dropped = False
+        with self.lock:
+            for slot in [s for s in self.handles if s[0] == api_key and self.expires[s] - now < CONTEXT_CACHE_REFRESH_MARGIN]:
+                try:
+                    self._extend(api_key, self.handles[slot])
+                    self.expires[slot] = now + self.ttl
+                    self.refreshes += 1
+                except Exception as e:
+                    log_msg(f"⚠️ Rinnovo context cache fallito ({e}): il contenuto verrà ricaricato.", style="yellow")
+                    del self.handles[slot], self.expires[slot]
+                    dropped = True
+        return dropped
+
+    def invalidate(self, api_key):
+        """Scarta i contenuti della chiave (scaduti o rimossi lato server): la prossima richiesta li ricarica."""
+        with self.lock:
+            for slot in [s for s in self.handles if s[0] == api_key]: del self.handles[slot], self.expires[slot]
+
+    def model(self, model_name, handle, instruction):
+        return genai.GenerativeModel.from_cached_content(handle)
+
+    def release(self):
+        """Elimina i contenuti caricati: altrimenti restano a pagamento fino alla scadenza del TTL."""
+        with self.lock:
+            for (api_key, _), handle in self.handles.items():
+                try:
+                    with _genai_configured(api_key): handle.delete()
+                except Exception: pass
+            self.handles.clear()
+            self.expires.clear()
+
+class LocalContextCache(GeminiContextCache):
+    """
+    Sostituto locale per i test, senza chiamate di rete: registra caricamenti e riferimenti
+    come il context cache di Gemini ma lascia la system instruction sul modello.
+    """
+    min_tokens = 0
+
+    def __init__(self, ttl=CONTEXT_CACHE_TTL):
+        super().__init__(ttl)
+        self.contents = {}
+
+    def _upload(self, api_key, model_name, instruction):
+        handle = f"local/{len(self.contents)}"
+        self.contents[handle] = instruction
+        return handle
+
+    def _extend(self, api_key, handle):
+        pass
+
+    def model(self, model_name, handle, instruction):
+        return genai.GenerativeModel(model_name, system_instruction=self.contents[handle])
+
+    def release(self):
+        with self.lock:
+            self.handles.clear()
+            self.expires.clear()
+            self.contents.clear()
+
+CONTEXT_CACHE_PROVIDERS = {'gemini': GeminiContextCache, 'local': LocalContextCache}
+
+def _release_context_cache():
+    eng = current_engine()
+    if eng.context_cache: eng.context_cache.release()
+    eng.context_cache = None
+
+def _new_model_for_key(api_key, args):
+    """GenerativeModel con la system instruction del motore, referenziata dal context cache se attivo."""
+    eng = current_engine()
+    clean_model_name = args.model_name.split(' |')[0].strip()
+    cc = eng.context_cache
+    if cc:
+        try: return cc.model(clean_model_name, cc.get(api_key, clean_model_name, eng.system_instruction), eng.system_instruction)
+        except Exception as e:
+            # Modello o piano non supportati: si torna alla system instruction inviata a ogni richiesta
+            log_msg(f"⚠️ Context cache non disponibile ({e}). Disattivato.", style="yellow")
+            eng.context_cache = None
+    return genai.GenerativeModel(clean_model_name, system_instruction=eng.system_instruction)
+
+# --- CLIENT PER API KEY ---
+# google-generativeai non espone client per chiave: _ClientManager e gli attributi _client / _async_client
+# di GenerativeModel sono privati. Si usano solo qui, nelle versioni verificate [min, max).
+GENAI_PER_KEY_CLIENT_VERSIONS = ("0.7.0", "0.9.0")
+KEY_CLIENT_ATTRS = {'generative': '_client', 'generative_async': '_async_client'}
+
+def _per_key_clients_supported():
+    low, high = (version.parse(v) for v in GENAI_PER_KEY_CLIENT_VERSIONS)
+    try: return low <= version.parse(genai.__version__) < high and hasattr(genai_client, '_ClientManager')
+    except Exception: return False
+
+def _key_client(api_key, kind):
+    """
+    Client genai ('generative' o 'generative_async') legato ad api_key, creato una volta per motore.
+    None se la versione di google-generativeai non è tra quelle verificate.
+    """
+    eng = current_engine()
+    client = eng.key_clients.get((api_key, kind))
+    if client is None:
+        if not _per_key_clients_supported(): return None
+        manager = genai_client._ClientManager()
+        manager.configure(api_key=api_key)
+        client = eng.key_clients[(api_key, kind)] = manager.get_default_client(kind)
+    return client
+
+def _bind_key_client(m, api_key, kind='generative'):
+    """
+    Collega al modello il client della chiave. Fallback (SDK non verificato o errore): genai.configure
+    globale con questa chiave; con più chiavi in parallelo vale allora l'ultima configurata.
+    """
+    try: client = _key_client(api_key, kind)
+    except Exception: client = None
+    if client is not None: setattr(m, KEY_CLIENT_ATTRS[kind], client)
+    else: genai.configure(api_key=api_key)
+    return m
 
-    glossary_terms = _load_glossary_dict(args.glossary)
-    if glossary_terms: log_msg(f"📚 Glossario caricato: {len(glossary_terms)} termini.", style="green")
+def _get_model_for_key(api_key, args):
+    """
+    Restituisce (creandolo alla prima richiesta) un GenerativeModel legato a una specifica
+    API key, con un client proprio invece della configurazione globale di genai.
+    """
+    eng = current_engine()
+    if eng.context_cache and eng.context_cache.refresh(api_key): _drop_key_models(api_key)
+    m = eng.key_models.get(api_key)
+    if m is None:
+        m = eng.key_models[api_key] = _bind_key_client(_new_model_for_key(api_key, args), api_key)
+    return m
+
+def _get_async_model_for_key(api_key, args):
+    """
+    Come _get_model_for_key, ma con il client asincrono (grpc asyncio) della chiave.
+    Va chiamata dal thread dell'event loop del motore async: il canale resta aperto
+    e viene riutilizzato da tutte le richieste successive con la stessa chiave.
+    """
+    eng = current_engine()
+    if eng.context_cache and eng.context_cache.refresh(api_key): _drop_key_models(api_key)
+    m = eng.key_async_models.get(api_key)
+    if m is None:
+        m = eng.key_async_models[api_key] = _bind_key_client(_new_model_for_key(api_key, args), api_key, 'generative_async')
+    return m
+
+def _drop_key_models(api_key):
+    eng = current_engine()
+    eng.key_models.pop(api_key, None)
+    eng.key_async_models.pop(api_key, None)
+
+def _plain_model_for_key(api_key, args, kind='generative'):
+    """Modello della chiave con la system instruction inviata a ogni richiesta, senza context cache."""
+    eng = current_engine()
+    clean_model_name = args.model_name.split(' |')[0].strip()
+    return _bind_key_client(genai.GenerativeModel(clean_model_name, system_instruction=eng.system_instruction), api_key, kind)
+
+def _drop_expired_context_cache(e, api_key):
+    """
+    True se e indica un contenuto del context cache scaduto o rimosso: il contenuto della chiave viene
+    scartato (la prossima richiesta ne carica uno nuovo) e l'errore non va imputato alla chiave.
+    """
+    eng = current_engine()
+    if not eng.context_cache: return False
+    msg = str(e).lower()
+    if not (isinstance(e, google.api_core.exceptions.NotFound) or ('cache' in msg and ('expire' in msg or 'not found' in msg))): return False
+    eng.context_cache.invalidate(api_key)
+    _drop_key_models(api_key)
+    log_msg("♻️ Context cache scaduto o rimosso: ripeto la richiesta senza cache, il contenuto verrà ricaricato.", style="yellow")
+    return True
 
+# --- SETUP ENGINE ---
+def _load_api_keys(args):
     keys = []
     if args.api_file and os.path.exists(args.api_file):
         with open(args.api_file, "r", encoding="utf-8") as f: keys.extend([clean_api_key(l) for l in f if l.strip()])
@@ -238,95 +1448,234 @@ def setup_engine(args):
         keys.extend([clean_api_key(k) for k in args.api.split(',') if k.strip()])
     elif os.path.exists("api_key.txt"):
         with open("api_key.txt", "r", encoding="utf-8") as f: keys.extend([clean_api_key(l) for l in f if l.strip()])
+    return list(dict.fromkeys([k for k in keys if k]))
+
+def setup_engine(args):
+    eng = current_engine()
+    eng.script_args_global = args 
     
-    available_api_keys = list(dict.fromkeys([k for k in keys if k]))
-    if not available_api_keys:
+    if args.full_context_sample and not args.enable_file_context:
+        args.full_context_sample = False
+    if args.context_window:
+        eng.context_window_deque = deque(maxlen=args.context_window)
+
+    eng.fuzzy_indexes.clear()
+    if isinstance(eng.translation_cache, SQLiteCacheStore) and not eng.shared_cache:
+        eng.translation_cache.close()
+        eng.translation_cache = {}
+    eng.active_cache_file = args.cache_file if args.cache_file else DEFAULT_CACHE_FILE
+    eng.cache_journal = None
+    # Una cache condivisa tra motori viene aperta e salvata da chi l'ha creata
+    if args.persistent_cache and not eng.shared_cache:
+        loaded_cache, eng.active_cache_file = _open_cache(args)
+        if loaded_cache is not None: eng.translation_cache = loaded_cache
+        if not isinstance(eng.translation_cache, SQLiteCacheStore):
+            eng.cache_journal = CacheJournal(eng.active_cache_file + CACHE_JOURNAL_SUFFIX)
+    eng.context_tier = ContextKeyTier(getattr(args, 'context_tier_size', None) or CONTEXT_TIER_ENTRIES)
+    if args.persistent_cache and not eng.shared_cache:
+        eng.context_tier.load(eng.active_cache_file + CONTEXT_TIER_SUFFIX)
+        if getattr(args, 'import_cache', None):
+            if isinstance(eng.translation_cache, SQLiteCacheStore): import_json_cache(args.import_cache, eng.translation_cache)
+            else: log_msg("⚠️ --import-cache richiede --cache-backend sqlite o tiered.", style="yellow")
+        _migrate_context_entries()
+
+    eng.glossary_terms = _load_glossary_dict(args.glossary)
+    if eng.glossary_terms: log_msg(f"📚 Glossario caricato: {len(eng.glossary_terms)} termini.", style="green")
+    eng.glossary_index = None
+    if eng.glossary_terms and getattr(args, 'glossary_filter', False):
+        eng.glossary_index = GlossaryIndex(eng.glossary_terms)
+        log_msg("🔎 Filtro glossario attivo: ogni richiesta riceve solo i termini presenti nel batch.", style="green")
+
+    eng.available_api_keys = _load_api_keys(args)
+    if not eng.available_api_keys:
         log_msg("🛑 ERRORE: Nessuna API Key valida trovata.", style="bold red")
         return False
 
-    for k in available_api_keys: api_call_counts[k] = 0
-    full_system_instruction = _build_system_instruction_text(args, glossary_terms)
+    for k in eng.available_api_keys: eng.api_call_counts[k] = 0
+    eng.current_api_key_index = 0
+    eng.key_models.clear()
+    eng.key_async_models.clear()
+    eng.key_clients.clear()
+    full_system_instruction = _build_system_instruction_text(args, eng.glossary_terms)
+    eng.system_instruction = full_system_instruction
+    _release_context_cache()
+    provider = CONTEXT_CACHE_PROVIDERS.get(getattr(args, 'context_cache', None))
+    if provider:
+        est_tokens = int(len(full_system_instruction) / ESTIMATED_CHARS_PER_TOKEN)
+        if est_tokens >= provider.min_tokens:
+            eng.context_cache = provider()
+            log_msg(f"🧠 Context cache attivo: system instruction (~{est_tokens} token) caricata una volta per chiave.", style="cyan")
+        else:
+            log_msg(f"ℹ️ Context cache non usato: system instruction troppo corta (~{est_tokens} < {provider.min_tokens} token).", style="dim")
 
     try:
-        genai.configure(api_key=available_api_keys[0])
+        genai.configure(api_key=eng.available_api_keys[0])
         clean_model_name = args.model_name.split(' |')[0].strip()
-        model = genai.GenerativeModel(clean_model_name, system_instruction=full_system_instruction)
+        eng.model = genai.GenerativeModel(clean_model_name, system_instruction=full_system_instruction)
         log_msg(f"✅ Motore Alumen Inizializzato ({clean_model_name})", style="bold cyan")
     except Exception as e:
         log_msg(f"🛑 Errore Init AI: {e}", style="bold red")
         return False
     
-    if args.rpm and args.rpm > 0: rpm_limit = args.rpm
+    eng.rpm_limit = args.rpm if args.rpm and args.rpm > 0 else None
+    tpm_limit = args.tpm if getattr(args, 'tpm', None) and args.tpm > 0 else None
+    eng.rate_limiter = RateLimiter(eng.rpm_limit, tpm_limit) if (eng.rpm_limit or tpm_limit) else None
     return True
 
 # --- RUNTIME LOGIC ---
+def _migrate_context_entries():
+    """
+    Sposta nel livello di contesto le voci qualificate dal contesto dinamico salvate nella cache
+    principale dalle versioni precedenti (chiavi JSON a 4 elementi con contesto non vuoto), che le
+    nuove ricerche non raggiungerebbero più. La cache JSON viene ripulita alla prima compattazione.
+    """
+    eng = current_engine()
+    cache = eng.translation_cache
+    if isinstance(cache, SQLiteCacheStore): items = cache.pop_context_entries()
+    else:
+        items = []
+        # Pre-filtro economico: solo le chiavi con almeno 4 elementi vengono decodificate
+        for key in [k for k in cache if k.count('", "') >= 3]:
+            try: parts = json.loads(key)
+            except ValueError: continue
+            if len(parts) == 4 and parts[3]: items.append((parts, cache.pop(key)))
+    if not items: return 0
+    for (text, src, tgt, ctx), value in items: eng.context_tier.put(ContextKeyTier.key(text, src, tgt, ctx), value)
+    try: eng.context_tier.save(eng.active_cache_file + CONTEXT_TIER_SUFFIX)
+    except OSError as e: log_msg(f"⚠️ Errore salvataggio cache di contesto: {e}", style="yellow")
+    log_msg(f"🧩 Spostate {len(items)} voci legate al contesto nella cache di contesto.", style="cyan")
+    return len(items)
+
 def check_and_save_cache(args, force=False):
-    global last_cache_save_time
+    """
+    Rende persistenti le nuove traduzioni.
+    SQLite: upsert incrementale. JSON: accoda le nuove voci al journal (fsync) e compatta
+    il journal nel file principale ogni CACHE_COMPACT_INTERVAL secondi, quando supera
+    CACHE_COMPACT_JOURNAL_BYTES o se force=True. I motori con compact_cache=False (lingue di
+    --target-langs) si limitano al journal: compatta solo il motore principale.
+    """
+    eng = current_engine()
+    write_metrics(args, force=force)
     if not args.persistent_cache: return
+    if force and eng.context_tier and eng.compact_cache:
+        try: eng.context_tier.save(eng.active_cache_file + CONTEXT_TIER_SUFFIX)
+        except OSError as e: log_msg(f"⚠️ Errore salvataggio cache di contesto: {e}", style="yellow")
+    if isinstance(eng.translation_cache, SQLiteCacheStore):
+        # Upsert incrementale delle sole voci nuove: economico, si può fare a ogni batch
+        try: eng.translation_cache.flush()
+        except Exception as e: log_msg(f"⚠️ Errore salvataggio cache SQLite: {e}", style="yellow")
+        return
+    if eng.cache_journal:
+        try: eng.cache_journal.commit()
+        except Exception as e: log_msg(f"⚠️ Errore scrittura journal cache: {e}", style="yellow")
+    if not eng.compact_cache: return
     now = time.time()
-    if force or (now - last_cache_save_time > 300):
+    journal_too_big = eng.cache_journal is not None and eng.cache_journal.size() > CACHE_COMPACT_JOURNAL_BYTES
+    if force or journal_too_big or (now - eng.last_cache_save_time > CACHE_COMPACT_INTERVAL):
         try:
-            with open(active_cache_file, 'w', encoding='utf-8') as f:
-                json.dump(translation_cache, f, ensure_ascii=False, indent=4)
-            last_cache_save_time = now
+            # Scrittura atomica: il journal viene svuotato solo dopo che il nuovo file è al suo posto
+            tmp_path = eng.active_cache_file + ".tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(eng.translation_cache, f, ensure_ascii=False, indent=4)
+            os.replace(tmp_path, eng.active_cache_file)
+            if eng.cache_journal: eng.cache_journal.truncate()
+            eng.last_cache_save_time = now
             if force: log_msg("💾 Cache salvata.", style="dim")
         except: pass
 
-def rotate_key(args):
-    global current_api_key_index, model
-    if not available_api_keys: return
-    blacklisted_keys.add(available_api_keys[current_api_key_index])
-    current_api_key_index = (current_api_key_index + 1) % len(available_api_keys)
-    new_key = available_api_keys[current_api_key_index]
+def _cache_put(key, value):
+    """Scrive una voce nella cache registrandola nel journal (se attivo)."""
+    eng = current_engine()
+    eng.translation_cache[key] = value
+    if eng.cache_journal: eng.cache_journal.record(key, value)
+
+def rotate_key(args, failed_key=None):
+    eng = current_engine()
+    if not eng.available_api_keys: return
+    if failed_key and failed_key != eng.available_api_keys[eng.current_api_key_index]:
+        # L'errore arriva da una chiave scelta dal rate limiter: basta escluderla
+        eng.blacklisted_keys.add(failed_key)
+        return
+    eng.blacklisted_keys.add(eng.available_api_keys[eng.current_api_key_index])
+    eng.telemetry.inc('key_rotations_total')
+    eng.current_api_key_index = (eng.current_api_key_index + 1) % len(eng.available_api_keys)
+    new_key = eng.available_api_keys[eng.current_api_key_index]
     log_msg(f"🔄 Rotazione API Key -> ...{new_key[-4:]}", style="yellow")
     try:
         genai.configure(api_key=new_key)
-        sys_instr = model._system_instruction if hasattr(model, '_system_instruction') else None
-        clean_model_name = args.model_name.split(' |')[0].strip()
-        model = genai.GenerativeModel(clean_model_name, system_instruction=sys_instr)
+        eng.model = _get_model_for_key(new_key, args)
     except: pass
 
-@retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=2, max=10))
+def _record_request(latency, usage):
+    """Registra latenza e token reali di una richiesta riuscita."""
+    telemetry = current_engine().telemetry
+    tokens_in = getattr(usage, 'prompt_token_count', 0) or 0
+    tokens_out = getattr(usage, 'candidates_token_count', 0) or 0
+    telemetry.observe('request_latency_seconds', latency)
+    telemetry.observe('request_tokens_in', tokens_in)
+    telemetry.observe('request_tokens_out', tokens_out)
+    telemetry.inc('requests_total')
+    telemetry.inc('tokens_in_total', tokens_in)
+    telemetry.inc('tokens_out_total', tokens_out)
+
+def _generate(prompt, args):
+    """Singola chiamata all'AI: sceglie la chiave tramite il rate limiter e aggiorna i contatori."""
+    eng = current_engine()
+    est_tokens = int(len(prompt) / ESTIMATED_CHARS_PER_TOKEN) * 2 # Input + output stimato
+    if eng.rate_limiter:
+        with eng.telemetry.timer('rate_limit_wait_seconds'): key = eng.rate_limiter.acquire(_candidate_keys(), est_tokens)
+    else: key = eng.available_api_keys[eng.current_api_key_index]
+    with eng.stats_lock: eng.api_call_counts[key] += 1
+    start = time.perf_counter()
+    try:
+        try: response = _get_model_for_key(key, args).generate_content(prompt)
+        except Exception as e:
+            if not _drop_expired_context_cache(e, key): raise
+            response = _plain_model_for_key(key, args).generate_content(prompt)
+    except Exception as e:
+        eng.telemetry.inc('request_errors_total')
+        e.alumen_api_key = key
+        raise
+    usage = getattr(response, 'usage_metadata', None)
+    _record_request(time.perf_counter() - start, usage)
+    if eng.rate_limiter: eng.rate_limiter.settle(key, est_tokens, getattr(usage, 'total_token_count', None))
+    if eng.context_cache:
+        with eng.stats_lock: eng.context_cache_tokens += getattr(usage, 'cached_content_token_count', 0) or 0
+    text = response.text.strip()
+    # Token reali della chiamata, letti dal thread chiamante (es. per il batch adattivo)
+    call_usage.output_tokens = getattr(call_usage, 'output_tokens', 0) + (getattr(usage, 'candidates_token_count', 0) or 0)
+    call_usage.output_chars = getattr(call_usage, 'output_chars', 0) + len(text)
+    return text
+
+@retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=2, max=10), before_sleep=_count_retry)
 def call_ai_raw(prompt, args):
-    if global_pause_event and not global_pause_event.is_set():
+    eng = current_engine()
+    if eng.global_pause_event and not eng.global_pause_event.is_set():
         log_msg("⏳ Pausa. Attendo...", style="yellow")
-        global_pause_event.wait()
+        eng.global_pause_event.wait()
 
-    if global_skip_api_event and global_skip_api_event.is_set():
+    if eng.global_skip_api_event and eng.global_skip_api_event.is_set():
         log_msg("🔄 Rotazione API Key richiesta dall'utente...", style="yellow")
         rotate_key(args)
-        global_skip_api_event.clear()
+        eng.global_skip_api_event.clear()
 
-    if rpm_limit:
-        while True:
-            with rpm_lock:
-                now = time.time()
-                global rpm_request_timestamps
-                rpm_request_timestamps = [t for t in rpm_request_timestamps if t > now - 60]
-                if len(rpm_request_timestamps) < rpm_limit:
-                    rpm_request_timestamps.append(now)
-                    break
-            time.sleep(1)
-    
-    time.sleep(0.5)
-    current_key = available_api_keys[current_api_key_index]
     try:
-        log_msg(f"[dim]➡️  INPUT AI:\n{prompt}[/dim]", style="dim")
-        api_call_counts[current_key] += 1
-        response_text = model.generate_content(prompt).text.strip()
+        log_msg(lambda: f"[dim]➡️  INPUT AI:\n{prompt}[/dim]", style="dim", level=LOG_DEBUG)
+        response_text = _generate(prompt, args)
         if args.reflect:
-            log_msg("[dim]🤔 Riflessione AI in corso...[/dim]", style="dim")
-            response_text = model.generate_content(f"Sei un revisore di traduzioni esperto. Rivedi, correggi e migliora la seguente traduzione, mantenendo il formato JSON array:\n{response_text}").text.strip()
-        log_msg(f"[dim]⬅️  OUTPUT AI:\n{response_text}[/dim]", style="dim")
+            log_msg("[dim]🤔 Riflessione AI in corso...[/dim]", style="dim", level=LOG_DEBUG)
+            response_text = _generate(f"Sei un revisore di traduzioni esperto. Rivedi, correggi e migliora la seguente traduzione, mantenendo il formato JSON array:\n{response_text}", args)
+        log_msg(lambda: f"[dim]⬅️  OUTPUT AI:\n{response_text}[/dim]", style="dim", level=LOG_DEBUG)
         return response_text
     except Exception as e:
+        failed_key = getattr(e, 'alumen_api_key', None)
         if args.server and ("429" in str(e) or "500" in str(e)):
              time.sleep(60); raise e
         if "header" in str(e).lower() or "metadata" in str(e).lower() or "400" in str(e):
-            if len(available_api_keys) > 1: rotate_key(args); raise e 
+            if len(eng.available_api_keys) > 1: rotate_key(args, failed_key); raise e 
             else: return "ERROR_API_KEY"
         if args.rotate_on_limit_or_error and not args.server:
-            rotate_key(args); raise e
+            rotate_key(args, failed_key); raise e
         raise e
 
 def generate_file_context(sample_texts, file_name, args):
@@ -348,7 +1697,7 @@ def _translate_single_entry_legacy(entry, args, file_context=None):
     Replica esatta della vecchia logica di traduzione singola da AlumenOld.py.
     Usa un prompt semplice e una gestione degli errori/cache dedicata.
     """
-    global total_entries_translated, cache_hit_count
+    eng = current_engine()
     text = entry['text']
 
     if text.strip() in BLACKLIST_TERMS:
@@ -359,32 +1708,29 @@ def _translate_single_entry_legacy(entry, args, file_context=None):
     context_parts = []
     if file_context:
         context_parts.append(f"Contesto generale del file: '{file_context}'")
-    if args.context_window and context_window_deque:
-        context_lines = [f"Ecco le {len(context_window_deque)} traduzioni più recenti. Usale per coerenza:"]
-        for src, trans in context_window_deque:
+    if args.context_window and eng.context_window_deque:
+        context_lines = [f"Ecco le {len(eng.context_window_deque)} traduzioni più recenti. Usale per coerenza:"]
+        for src, trans in eng.context_window_deque:
             context_lines.append(f'- "{src}" -> "{trans}"')
         context_parts.append("\n".join(context_lines))
     dynamic_context_str = "\n".join(context_parts)
 
-    # Logica di cache a 2 passi (identica a AlumenOld)
-    context_key = json.dumps((text, args.source_lang, args.target_lang, dynamic_context_str), ensure_ascii=False)
-    if context_key in translation_cache:
-        cached_translation = translation_cache[context_key]
+    # Logica di cache a 2 passi: le voci legate al contesto dinamico vivono nel livello separato e limitato
+    if dynamic_context_str:
+        context_key = eng.context_tier.key(text, args.source_lang, args.target_lang, dynamic_context_str)
+        cached_translation = eng.context_tier.get(context_key)
+        if cached_translation is None:
+            # Fallback sulla voce generica, senza promozione: occuperebbe posto nel livello limitato
+            cached_translation = eng.translation_cache.get(json.dumps((text, args.source_lang, args.target_lang, ""), ensure_ascii=False))
+    else:
+        context_key = json.dumps((text, args.source_lang, args.target_lang, ""), ensure_ascii=False)
+        cached_translation = eng.translation_cache.get(context_key)
+    if cached_translation is not None:
         entry['callback'](apply_wrapping(cached_translation, args))
-        total_entries_translated += 1
-        cache_hit_count += 1
+        eng.total_entries_translated += 1
+        eng.cache_hit_count += 1
         return
 
-    if dynamic_context_str:
-        generic_key = json.dumps((text, args.source_lang, args.target_lang, ""), ensure_ascii=False)
-        if generic_key in translation_cache:
-            cached_translation = translation_cache[generic_key]
-            translation_cache[context_key] = cached_translation # Promozione cache
-            entry['callback'](apply_wrapping(cached_translation, args))
-            total_entries_translated += 1
-            cache_hit_count += 1
-            return
-
     # Costruzione del prompt (identico a AlumenOld)
     blacklist_str_prompt = ", ".join(BLACKLIST_TERMS)
     prompt_lines = [
@@ -399,6 +1745,8 @@ def _translate_single_entry_legacy(entry, args, file_context=None):
     prompt_base = " ".join(prompt_lines)
     if args.prompt_context: prompt_base += f"\nIstruzione aggiuntiva: {args.prompt_context}."
     if dynamic_context_str: prompt_base += f"\n{dynamic_context_str}"
+    glossary_str = _glossary_block([text])
+    if glossary_str: prompt_base += f"\n{glossary_str.rstrip()}"
     prompt_base += "\nRispondi solo con la traduzione diretta."
     prompt_text = f"{prompt_base}\nTesto originale:\n{text}\n\nTraduzione in {args.target_lang}:"
 
@@ -406,14 +1754,15 @@ def _translate_single_entry_legacy(entry, args, file_context=None):
     try:
         translated_text = call_ai_raw(prompt_text, args)
         if translated_text == "ERROR_API_KEY":
-            if global_stop_event: global_stop_event.set()
+            if eng.global_stop_event: eng.global_stop_event.set()
             return
 
         final_text = apply_wrapping(translated_text, args)
         entry['callback'](final_text)
-        total_entries_translated += 1
-        translation_cache[context_key] = translated_text
-        if args.context_window: context_window_deque.append((text, translated_text))
+        eng.total_entries_translated += 1
+        if dynamic_context_str: eng.context_tier.put(context_key, translated_text)
+        else: _cache_put(context_key, translated_text)
+        if args.context_window: eng.context_window_deque.append((text, translated_text))
         check_and_save_cache(args)
     except Exception as e:
         log_msg(f"    ❌ Errore riga (legacy mode): {e}", style="red")
@@ -423,37 +1772,34 @@ def _translate_single_entry(entry, args, file_context=None):
     Logica per tradurre una singola entry, costruendo il contesto.
     Usato sia come fallback che per la modalità batch_size=0.
     """
-    global total_entries_translated
+    eng = current_engine()
     text = entry['text']
     
     # Costruzione contesto per la singola chiamata
     context_parts = []
     if file_context:
         context_parts.append(f"Contesto generale del file: '{file_context}'")
-    if args.context_window and context_window_deque:
-        context_lines = [f"Ecco le {len(context_window_deque)} traduzioni più recenti. Usale per coerenza:"]
-        for src, trans in context_window_deque:
+    if args.context_window and eng.context_window_deque:
+        context_lines = [f"Ecco le {len(eng.context_window_deque)} traduzioni più recenti. Usale per coerenza:"]
+        for src, trans in eng.context_window_deque:
             context_lines.append(f'- "{src}" -> "{trans}"')
         context_parts.append("\n".join(context_lines))
     ctx_str = "\n".join(context_parts)
     
-    prompt = f"{ctx_str}\nTraduci da {args.source_lang} a {args.target_lang}: {text}"
+    prompt = f"{_glossary_block([text])}{ctx_str}\nTraduci da {args.source_lang} a {args.target_lang}: {text}"
     translated_text = call_ai_raw(prompt, args)
     
     entry['callback'](apply_wrapping(translated_text, args))
-    total_entries_translated += 1
-    if args.context_window: context_window_deque.append((text, translated_text))
-    exact_ck = json.dumps((text, args.source_lang, args.target_lang), ensure_ascii=False)
-    translation_cache[exact_ck] = translated_text
+    eng.total_entries_translated += 1
+    if args.context_window: eng.context_window_deque.append((text, translated_text))
+    _store_translation(text, translated_text, args)
 
-def translate_batch(entries, args, stop_event, file_context=None):
-    global total_entries_translated, context_window_deque
-    batches = []
-    current_batch = []
-    current_tokens = 0
+def translate_batch(entries, args, stop_event, file_context=None, reset_context=True):
+    eng = current_engine()
+    pending_entries = []
 
-    # Pulisce la deque per ogni nuovo file
-    if args.context_window: context_window_deque.clear()
+    # Pulisce la deque per ogni nuovo file (non tra i blocchi successivi di uno stesso file in streaming)
+    if args.context_window and reset_context: eng.context_window_deque.clear()
 
     # --- LOGICA PER BATCH_SIZE = 0 ---
     if args.batch_size == 0:
@@ -471,105 +1817,795 @@ def translate_batch(entries, args, stop_event, file_context=None):
             _translate_single_entry_legacy(entry, args, file_context)
         return
     
+    pending_entries = _resolve_from_cache(entries, args)
+    if getattr(args, 'async_engine', False):
+        return run_async(translate_entries(pending_entries, args, stop_event, file_context, check_cache=False))
+    batcher = AdaptiveBatcher(pending_entries, args, adaptive=args.adaptive_batch)
+    _dispatch_batches(batcher, args, stop_event, file_context)
+
+@_timed('cache_lookup_seconds')
+def _resolve_from_cache(entries, args):
+    """Applica le traduzioni già presenti in cache (esatte o fuzzy) e restituisce le entry da inviare."""
+    eng = current_engine()
+    pending_entries = []
     for entry in entries:
         text = entry['text']
         
-        cached_translation = None
         exact_cache_key = json.dumps((text, args.source_lang, args.target_lang), ensure_ascii=False)
         
-        # 1. Controllo cache esatta
-        if exact_cache_key in translation_cache:
-            cached_translation = translation_cache[exact_cache_key]
+        # 1. Controllo cache esatta (una sola lettura: con la cache a livelli ogni accesso conta)
+        cached_translation = eng.translation_cache.get(exact_cache_key)
         
         # 2. Controllo cache fuzzy (se abilitato e libreria presente)
-        elif args.fuzzy_match and fuzz:
-            lang_tuple_part = f', "{args.source_lang}", "{args.target_lang}"]'
-            for key, value in translation_cache.items():
-                if key.endswith(lang_tuple_part):
-                    try:
-                        cached_text = json.loads(key)[0]
-                        similarity = fuzz.ratio(text, cached_text)
-                        if similarity >= args.fuzzy_threshold:
-                            cached_translation = value
-                            log_msg(f"    [dim]Fuzzy match ({similarity}%): '{text[:30]}...' -> '{cached_text[:30]}...'[/]", style="dim")
-                            break
-                    except: continue
+        if cached_translation is None and args.fuzzy_match and fuzz:
+            cached_text, similarity = _get_fuzzy_index(args).best_match(text)
+            if cached_text is not None:
+                cached_key = json.dumps((cached_text, args.source_lang, args.target_lang), ensure_ascii=False)
+                cached_translation = eng.translation_cache.get(cached_key)
+                if cached_translation is not None:
+                    log_msg(f"    [dim]Fuzzy match ({similarity}%): '{text[:30]}...' -> '{cached_text[:30]}...'[/]", style="dim")
         
         if cached_translation is not None:
             final_txt = apply_wrapping(cached_translation, args)
             entry['callback'](final_txt)
-            total_entries_translated += 1
+            eng.total_entries_translated += 1
             continue
 
-        toks = len(text) // ESTIMATED_CHARS_PER_TOKEN
-        if (len(current_batch) >= args.batch_size) or (current_tokens + toks > 3000):
-            batches.append(current_batch); current_batch = []; current_tokens = 0
-        current_batch.append(entry); current_tokens += toks
-    if current_batch: batches.append(current_batch)
+        pending_entries.append(entry)
 
-    for i, batch in enumerate(batches):
-        if stop_event.is_set(): return
-        if global_skip_event and global_skip_event.is_set(): return
-        
-        texts = [entry['text'] for entry in batch]
-        log_msg(f"    ☁️  Batch {i+1}/{len(batches)} ({len(texts)} righe)...", style="dim")
-        
-        # --- COSTRUZIONE CONTESTO DINAMICO (Logica migrata da AlumenOld) ---
-        context_parts = []
-        if file_context:
-            context_parts.append(f"Contesto generale del file: '{file_context}'")
-        
-        if args.context_window and context_window_deque:
-            context_lines = [f"Ecco le {len(context_window_deque)} traduzioni più recenti. Usale per coerenza:"]
-            for src, trans in context_window_deque:
-                context_lines.append(f'- "{src}" -> "{trans}"')
-            context_parts.append("\n".join(context_lines))
-        ctx_str = "\n".join(context_parts)
-        
-        prompt = f"{ctx_str}TRADUZIONE JSON ARRAY.\nDa: {args.source_lang} | A: {args.target_lang}\nINPUT:\n{json.dumps(texts, ensure_ascii=False)}"
-        
-        try:
-            resp = call_ai_raw(prompt, args)
-            if resp == "ERROR_API_KEY": stop_event.set(); return
-            if args.reflect:
-                resp = call_ai_raw(f"Sei un revisore. Correggi la traduzione seguente:\n{resp}", args)
-            clean = re.sub(r'^```json\s*|\s*```$', '', resp, flags=re.MULTILINE)
-            trads = json.loads(clean)
-            if len(trads) != len(texts): raise ValueError("Length mismatch")
-            
-            for idx, t in enumerate(trads):
-                orig = texts[idx]
-                if args.context_window: context_window_deque.append((orig, t))
-                exact_ck = json.dumps((orig, args.source_lang, args.target_lang), ensure_ascii=False)
-                translation_cache[exact_ck] = t
-                batch[idx]['callback'](apply_wrapping(t, args))
-                total_entries_translated += 1
-            check_and_save_cache(args)
+    return pending_entries
+
+def _build_batch_context(file_context, args):
+    eng = current_engine()
+    context_parts = []
+    if file_context:
+        context_parts.append(f"Contesto generale del file: '{file_context}'")
+    
+    if args.context_window and eng.context_window_deque:
+        context_lines = [f"Ecco le {len(eng.context_window_deque)} traduzioni più recenti. Usale per coerenza:"]
+        for src, trans in eng.context_window_deque:
+            context_lines.append(f'- "{src}" -> "{trans}"')
+        context_parts.append("\n".join(context_lines))
+    return "\n".join(context_parts)
+
+def _request_batch(texts, args, ctx_str):
+    """
+    Invia un singolo batch all'AI e restituisce la lista di traduzioni.
+    Non tocca cache né callback: può girare in un thread worker.
+    """
+    resp = call_ai_raw(_batch_prompt(texts, args, ctx_str), args)
+    if resp == "ERROR_API_KEY": return resp
+    if args.reflect:
+        resp = call_ai_raw(f"Sei un revisore. Correggi la traduzione seguente:\n{resp}", args)
+    return _parse_batch_response(resp, texts)
+
+def _batch_prompt(texts, args, ctx_str):
+    return f"{_glossary_block(texts)}{ctx_str}TRADUZIONE JSON ARRAY.\nDa: {args.source_lang} | A: {args.target_lang}\nINPUT:\n{json.dumps(texts, ensure_ascii=False)}"
+
+@_timed('response_parse_seconds')
+def _parse_batch_response(resp, texts):
+    clean = re.sub(r'^```json\s*|\s*```$', '', resp, flags=re.MULTILINE)
+    trads = json.loads(clean)
+    if len(trads) != len(texts): raise ValueError("Length mismatch")
+    return trads
+
+def _apply_batch_result(batch, trads, args):
+    eng = current_engine()
+    for idx, t in enumerate(trads):
+        orig = batch[idx]['text']
+        if args.context_window: eng.context_window_deque.append((orig, t))
+        _store_translation(orig, t, args)
+        batch[idx]['callback'](apply_wrapping(t, args))
+        eng.total_entries_translated += 1
+    check_and_save_cache(args)
+
+class AdaptiveBatcher:
+    """
+    Forma i batch a partire dalle entry non in cache.
+    In modalità fissa usa --batch-size e il tetto di BATCH_TOKEN_LIMIT token stimati.
+    Con --adaptive-batch la dimensione cresce finché la latenza resta sotto
+    ADAPTIVE_TARGET_LATENCY, cala se le risposte rallentano e si dimezza a ogni risposta
+    non valida; il rapporto caratteri/token viene calibrato sui token reali restituiti
+    dall'API. Lo stato appreso è condiviso tra i file che usano lo stesso modello.
+    """
+    def __init__(self, entries, args, adaptive=False):
+        eng = current_engine()
+        self.pending = deque(entries)
+        self.adaptive = adaptive
+        self.model_name = args.model_name.split(' |')[0].strip()
+        state = eng.adaptive_batch_state.get(self.model_name, {}) if adaptive else {}
+        self.size = max(1, state.get('size', args.batch_size))
+        self.chars_per_token = state.get('chars_per_token', ESTIMATED_CHARS_PER_TOKEN)
+        self.failures = 0
+
+    def has_pending(self):
+        return bool(self.pending)
+
+    def next_batch(self):
+        batch, tokens = [], 0
+        while self.pending:
+            toks = len(self.pending[0]['text']) // self.chars_per_token
+            if batch and (len(batch) >= self.size or tokens + toks > BATCH_TOKEN_LIMIT): break
+            batch.append(self.pending.popleft()); tokens += toks
+        return batch
+
+    def record(self, batch_len, result):
+        eng = current_engine()
+        if not self.adaptive: return
+        old_size = self.size
+        if result['error'] is not None:
+            self.failures += 1
+            self.size = max(1, min(self.size, batch_len) // 2)
+        elif result['latency'] > ADAPTIVE_TARGET_LATENCY:
+            self.size = max(1, int(self.size * 0.75))
+        elif result['latency'] < ADAPTIVE_TARGET_LATENCY / 2 and batch_len >= self.size:
+            self.size = min(ADAPTIVE_MAX_BATCH_SIZE, self.size + max(1, self.size // 4))
+        if result['output_tokens'] and result['output_chars']:
+            observed = result['output_chars'] / result['output_tokens']
+            self.chars_per_token = 0.8 * self.chars_per_token + 0.2 * observed
+        if self.size != old_size:
+            log_msg(f"    📐 Batch adattivo: {old_size} -> {self.size} righe (latenza {result['latency']:.1f}s)", style="dim")
+        eng.adaptive_batch_state[self.model_name] = {'size': self.size, 'chars_per_token': self.chars_per_token}
+
+def _record_batch(size, result):
+    telemetry = current_engine().telemetry
+    telemetry.observe('batch_size', size)
+    telemetry.observe('batch_latency_seconds', result['latency'])
+    if result['error'] is not None: telemetry.inc('batch_errors_total')
+
+def _run_batch_request(texts, args, ctx_str):
+    """Esegue _request_batch misurando latenza e token reali; non solleva eccezioni."""
+    call_usage.output_tokens = 0
+    call_usage.output_chars = 0
+    start = time.time()
+    result = {'trads': None, 'error': None}
+    try: result['trads'] = _request_batch(texts, args, ctx_str)
+    except Exception as e: result['error'] = e
+    result['latency'] = time.time() - start
+    _record_batch(len(texts), result)
+    result['output_tokens'] = getattr(call_usage, 'output_tokens', 0)
+    result['output_chars'] = getattr(call_usage, 'output_chars', 0)
+    return result
+
+def _parse_id_response(resp, valid_ids):
+    """
+    Estrae le coppie {id: traduzione} da una risposta con ID stabili, anche se il JSON
+    è troncato o malformato: le coppie leggibili vengono salvate, le altre scartate.
+    """
+    clean = re.sub(r'^```json\s*|\s*```$', '', resp, flags=re.MULTILINE).strip()
+    try:
+        data = json.loads(clean)
+        if isinstance(data, dict):
+            return {str(k): v for k, v in data.items() if str(k) in valid_ids and isinstance(v, str)}
+    except ValueError: pass
+    salvaged = {}
+    for m in re.finditer(r'"(\d+)"\s*:\s*("(?:[^"\\]|\\.)*")', clean):
+        if m.group(1) not in valid_ids: continue
+        try: salvaged[m.group(1)] = json.loads(m.group(2))
+        except ValueError: continue
+    return salvaged
+
+def _request_batch_with_ids(id_texts, args, ctx_str):
+    """Richiede la traduzione di un oggetto {id: testo} e restituisce le coppie valide recuperate."""
+    prompt = (f"{_glossary_block(id_texts.values())}{ctx_str}TRADUZIONE JSON OBJECT.\nDa: {args.source_lang} | A: {args.target_lang}\n"
+              "Rispondi con un oggetto JSON con le STESSE chiavi (ID) dell'input e come valori le traduzioni.\n"
+              f"INPUT:\n{json.dumps(id_texts, ensure_ascii=False)}")
+    resp = call_ai_raw(prompt, args)
+    if resp == "ERROR_API_KEY": return resp
+    return _parse_id_response(resp, set(id_texts))
+
+def _recover_failed_batch(batch, args, stop_event, file_context, batcher):
+    """
+    Recupero di un batch la cui risposta non era allineabile (JSON non valido o lunghezza diversa).
+    Le righe vengono reinviate con ID stabili: le traduzioni valide vengono salvate e solo le
+    righe mancanti vengono reinviate, in un batch più piccolo. Se una richiesta non recupera
+    nulla il gruppo viene diviso a metà una sola volta; una metà che non recupera nulla passa
+    riga per riga a _translate_single_entry, così nel caso peggiore servono n+3 chiamate.
+    """
+    eng = current_engine()
+    eng.recovery_stats['batches'] += 1
+    eng.recovery_stats['rows'] += len(batch)
+    calls_before = eng.recovery_stats['calls']
+    _recover_entries(batch, args, stop_event, file_context, batcher)
+    used = eng.recovery_stats['calls'] - calls_before
+    log_msg(f"    ♻️  Recupero batch: {len(batch)} righe con {used} chiamate (risparmiate {max(0, len(batch) - used)} rispetto alla traduzione riga per riga).", style="dim")
+
+def _recover_entries(batch, args, stop_event, file_context, batcher, can_split=True):
+    eng = current_engine()
+    if stop_event.is_set(): return
+    if len(batch) == 1:
+        eng.recovery_stats['calls'] += 1
+        try: _translate_single_entry(batch[0], args, file_context)
+        except Exception as ex: log_msg(f"    ❌ Errore riga (fallback): {ex}", style="red")
+        return
+
+    id_texts = {str(i): entry['text'] for i, entry in enumerate(batch)}
+    start = time.time()
+    eng.recovery_stats['calls'] += 1
+    try: salvaged = _request_batch_with_ids(id_texts, args, _build_batch_context(file_context, args))
+    except Exception as e:
+        log_msg(f"    ⚠️ Recupero fallito: {e}", style="yellow")
+        salvaged = {}
+    if salvaged == "ERROR_API_KEY": stop_event.set(); return
+    if batcher:
+        batcher.record(len(batch), {'error': None if salvaged else ValueError("Nessuna voce recuperata"),
+                                    'latency': time.time() - start, 'output_tokens': 0, 'output_chars': 0})
+
+    ok_ids = [i for i in id_texts if i in salvaged]
+    if ok_ids:
+        eng.recovery_stats['salvaged'] += len(ok_ids)
+        _apply_batch_result([batch[int(i)] for i in ok_ids], [salvaged[i] for i in ok_ids], args)
+    missing = [batch[int(i)] for i in id_texts if i not in salvaged]
+    if not missing: return
+    if ok_ids:
+        log_msg(f"    🧩 Recuperate {len(ok_ids)}/{len(batch)} righe, reinvio le {len(missing)} mancanti.", style="yellow")
+        _recover_entries(missing, args, stop_event, file_context, batcher, can_split)
+    elif can_split:
+        mid = len(missing) // 2
+        log_msg(f"    ✂️  Nessuna riga recuperata: divido il gruppo ({len(missing)} righe) in {mid} + {len(missing) - mid}.", style="yellow")
+        _recover_entries(missing[:mid], args, stop_event, file_context, batcher, False)
+        _recover_entries(missing[mid:], args, stop_event, file_context, batcher, False)
+    else:
+        # Dopo una divisione senza esito altre divisioni costerebbero più della traduzione riga per riga
+        log_msg(f"    ✂️  Nessuna riga recuperata: traduco le {len(missing)} righe singolarmente.", style="yellow")
+        for entry in missing: _recover_entries([entry], args, stop_event, file_context, batcher)
+
+def _dispatch_batches(batcher, args, stop_event, file_context=None):
+    """
+    Invia i batch tenendone fino a --concurrency in volo contemporaneamente.
+    Le risposte vengono applicate (callback, cache, context window) nel thread
+    chiamante e sempre nell'ordine originale dei batch, indipendentemente
+    dall'ordine di arrivo. I batch vengono formati al momento dell'invio, così
+    la dimensione adattiva tiene conto delle risposte già ricevute.
+    """
+    eng = current_engine()
+    workers = max(1, args.concurrency or 1)
+    in_flight = {}
+    completed = {}
+    batches = {}
+    next_submit = 0
+    next_apply = 0
+
+    # Un pool condiviso tra motori non va chiuso alla fine del file
+    with (nullcontext(eng.executor) if eng.executor else ThreadPoolExecutor(max_workers=workers)) as executor:
+        while batcher.has_pending() or next_apply < next_submit:
+            if stop_event.is_set() or (eng.global_skip_event and eng.global_skip_event.is_set()):
+                for fut in in_flight: fut.cancel()
+                return
+
+            while batcher.has_pending() and len(in_flight) < workers:
+                batch = batcher.next_batch()
+                texts = [entry['text'] for entry in batch]
+                log_msg(f"    ☁️  Batch {next_submit+1} ({len(texts)} righe, {len(batcher.pending)} in coda)...", style="dim")
+                # Il contesto dinamico viene fotografato all'invio (con concurrency > 1 non include i batch ancora in volo)
+                ctx_str = _build_batch_context(file_context, args)
+                in_flight[executor.submit(_bind_engine(_run_batch_request), texts, args, ctx_str)] = next_submit
+                batches[next_submit] = batch
+                next_submit += 1
+
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for fut in done: completed[in_flight.pop(fut)] = fut.result()
+
+            while next_apply in completed:
+                batch = batches.pop(next_apply)
+                result = completed.pop(next_apply)
+                next_apply += 1
+                batcher.record(len(batch), result)
+                if result['trads'] == "ERROR_API_KEY":
+                    stop_event.set()
+                    for pending in in_flight: pending.cancel()
+                    return
+                if result['error'] is None:
+                    _apply_batch_result(batch, result['trads'], args)
+                else:
+                    log_msg(f"⚠️ Batch fallito ({result['error']}). Recupero parziale con ID.", style="yellow")
+                    _recover_failed_batch(batch, args, stop_event, file_context, batcher if batcher.adaptive else None)
+                    check_and_save_cache(args)
+
+# --- MOTORE ASYNC ---
+def _get_async_loop():
+    """Event loop persistente del motore async, in un thread dedicato: i client per chiave sopravvivono tra file e batch."""
+    global async_loop
+    with async_loop_lock:
+        if async_loop is None or async_loop.is_closed():
+            async_loop = asyncio.new_event_loop()
+            threading.Thread(target=async_loop.run_forever, daemon=True, name="alumen-async").start()
+        return async_loop
+
+def run_async(coro):
+    """Esegue una coroutine sull'event loop del motore e ne attende il risultato dal thread chiamante."""
+    return asyncio.run_coroutine_threadsafe(coro, _get_async_loop()).result()
+
+async def _generate_async(prompt, args):
+    """Versione asincrona di _generate: restituisce (testo, token di output)."""
+    eng = current_engine()
+    est_tokens = int(len(prompt) / ESTIMATED_CHARS_PER_TOKEN) * 2
+    if eng.rate_limiter:
+        wait_start = time.perf_counter()
+        key = await eng.rate_limiter.acquire_async(_candidate_keys(), est_tokens)
+        eng.telemetry.observe('rate_limit_wait_seconds', time.perf_counter() - wait_start)
+    else: key = eng.available_api_keys[eng.current_api_key_index]
+    with eng.stats_lock: eng.api_call_counts[key] += 1
+    start = time.perf_counter()
+    try:
+        try: response = await _get_async_model_for_key(key, args).generate_content_async(prompt)
         except Exception as e:
-            log_msg(f"⚠️ Batch fallito. Fallback a traduzione singola per questo batch.", style="yellow")
-            for entry in batch:
-                try: _translate_single_entry(entry, args, file_context)
-                except Exception as ex: log_msg(f"    ❌ Errore riga (fallback): {ex}", style="red")
+            if not _drop_expired_context_cache(e, key): raise
+            response = await _plain_model_for_key(key, args, 'generative_async').generate_content_async(prompt)
+    except Exception as e:
+        eng.telemetry.inc('request_errors_total')
+        e.alumen_api_key = key
+        raise
+    usage = getattr(response, 'usage_metadata', None)
+    _record_request(time.perf_counter() - start, usage)
+    if eng.rate_limiter: eng.rate_limiter.settle(key, est_tokens, getattr(usage, 'total_token_count', None))
+    if eng.context_cache:
+        with eng.stats_lock: eng.context_cache_tokens += getattr(usage, 'cached_content_token_count', 0) or 0
+    return response.text.strip(), (getattr(usage, 'candidates_token_count', 0) or 0)
+
+@retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=2, max=10), before_sleep=_count_retry)
+async def call_ai_raw_async(prompt, args):
+    """Come call_ai_raw ma senza bloccare l'event loop. Restituisce (testo, token di output)."""
+    eng = current_engine()
+    if eng.global_pause_event and not eng.global_pause_event.is_set():
+        log_msg("⏳ Pausa. Attendo...", style="yellow")
+        await asyncio.to_thread(eng.global_pause_event.wait)
+
+    if eng.global_skip_api_event and eng.global_skip_api_event.is_set():
+        log_msg("🔄 Rotazione API Key richiesta dall'utente...", style="yellow")
+        rotate_key(args)
+        eng.global_skip_api_event.clear()
+
+    try:
+        log_msg(lambda: f"[dim]➡️  INPUT AI:\n{prompt}[/dim]", style="dim", level=LOG_DEBUG)
+        response_text, output_tokens = await _generate_async(prompt, args)
+        if args.reflect:
+            log_msg("[dim]🤔 Riflessione AI in corso...[/dim]", style="dim", level=LOG_DEBUG)
+            response_text, reflect_tokens = await _generate_async(f"Sei un revisore di traduzioni esperto. Rivedi, correggi e migliora la seguente traduzione, mantenendo il formato JSON array:\n{response_text}", args)
+            output_tokens += reflect_tokens
+        log_msg(lambda: f"[dim]⬅️  OUTPUT AI:\n{response_text}[/dim]", style="dim", level=LOG_DEBUG)
+        return response_text, output_tokens
+    except Exception as e:
+        failed_key = getattr(e, 'alumen_api_key', None)
+        if args.server and ("429" in str(e) or "500" in str(e)):
+             await asyncio.sleep(60); raise e
+        if "header" in str(e).lower() or "metadata" in str(e).lower() or "400" in str(e):
+            if len(eng.available_api_keys) > 1: rotate_key(args, failed_key); raise e
+            else: return "ERROR_API_KEY", 0
+        if args.rotate_on_limit_or_error and not args.server:
+            rotate_key(args, failed_key); raise e
+        raise e
+
+async def _run_batch_request_async(texts, args, ctx_str):
+    """Equivalente asincrono di _run_batch_request: stesso dizionario di risultato, non solleva eccezioni."""
+    start = time.time()
+    result = {'trads': None, 'error': None, 'output_tokens': 0, 'output_chars': 0}
+    try:
+        resp, tokens = await call_ai_raw_async(_batch_prompt(texts, args, ctx_str), args)
+        result['output_tokens'] += tokens
+        result['output_chars'] += len(resp)
+        if resp == "ERROR_API_KEY": result['trads'] = resp
+        else:
+            if args.reflect:
+                resp, tokens = await call_ai_raw_async(f"Sei un revisore. Correggi la traduzione seguente:\n{resp}", args)
+                result['output_tokens'] += tokens
+                result['output_chars'] += len(resp)
+            result['trads'] = _parse_batch_response(resp, texts)
+    except Exception as e: result['error'] = e
+    result['latency'] = time.time() - start
+    _record_batch(len(texts), result)
+    return result
+
+async def translate_entries(entries, args, stop_event, file_context=None, check_cache=True):
+    """
+    API asincrona del motore (--async-engine): stessa semantica di translate_batch, ma i batch
+    (fino a --concurrency in volo) sono coroutine su un unico event loop con un client
+    persistente per API key, senza thread per richiesta né genai.configure globale.
+    Le risposte vengono applicate nell'ordine originale dei batch.
+    """
+    eng = current_engine()
+    pending_entries = _resolve_from_cache(entries, args) if check_cache else entries
+    batcher = AdaptiveBatcher(pending_entries, args, adaptive=args.adaptive_batch)
+    limit = max(1, args.concurrency or 1)
+    in_flight = {}
+    completed = {}
+    batches = {}
+    next_submit = 0
+    next_apply = 0
+    try:
+        while batcher.has_pending() or next_apply < next_submit:
+            if stop_event.is_set() or (eng.global_skip_event and eng.global_skip_event.is_set()): return
+
+            while batcher.has_pending() and len(in_flight) < limit:
+                batch = batcher.next_batch()
+                texts = [entry['text'] for entry in batch]
+                log_msg(f"    ☁️  Batch {next_submit+1} ({len(texts)} righe, {len(batcher.pending)} in coda)...", style="dim")
+                ctx_str = _build_batch_context(file_context, args)
+                in_flight[asyncio.ensure_future(_run_batch_request_async(texts, args, ctx_str))] = next_submit
+                batches[next_submit] = batch
+                next_submit += 1
+
+            done, _ = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+            for task in done: completed[in_flight.pop(task)] = task.result()
+
+            while next_apply in completed:
+                batch = batches.pop(next_apply)
+                result = completed.pop(next_apply)
+                next_apply += 1
+                batcher.record(len(batch), result)
+                if result['trads'] == "ERROR_API_KEY":
+                    stop_event.set()
+                    return
+                if result['error'] is None:
+                    _apply_batch_result(batch, result['trads'], args)
+                else:
+                    log_msg(f"⚠️ Batch fallito ({result['error']}). Recupero parziale con ID.", style="yellow")
+                    # Il recupero usa il percorso sincrono in un thread, senza fermare i batch in volo
+                    await asyncio.to_thread(_recover_failed_batch, batch, args, stop_event, file_context, batcher if batcher.adaptive else None)
+                    check_and_save_cache(args)
+    finally:
+        for task in in_flight: task.cancel()
+
+def _format_duration(seconds):
+    """Durata in HH:MM:SS, con ore oltre le 24."""
+    seconds = int(max(0, seconds))
+    return f"{seconds // 3600:02d}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+
+def _model_pricing(model_name):
+    """Prezzi (input, output) in USD per milione di token: voce più specifica che prefissa il nome del modello."""
+    name = model_name.split(' |')[0].strip().lower().removeprefix("models/")
+    matches = [m for m in MODEL_PRICING if name.startswith(m)]
+    return MODEL_PRICING[max(matches, key=len)] if matches else None
+
+def _setup_dry_run(args):
+    """Setup minimo per il preventivo: cache in sola lettura, glossario e system instruction; le API key sono facoltative."""
+    eng = current_engine()
+    eng.script_args_global = args
+    eng.fuzzy_indexes.clear()
+    if args.persistent_cache and not eng.shared_cache:
+        loaded_cache, eng.active_cache_file = _open_cache(args)
+        if loaded_cache is not None: eng.translation_cache = loaded_cache
+    eng.glossary_terms = _load_glossary_dict(args.glossary)
+    eng.glossary_index = GlossaryIndex(eng.glossary_terms) if eng.glossary_terms and getattr(args, 'glossary_filter', False) else None
+    eng.system_instruction = _build_system_instruction_text(args, eng.glossary_terms)
+    eng.available_api_keys = _load_api_keys(args)
+    eng.key_models.clear()
+
+def _measure_chars_per_token(sample, args):
+    """
+    Rapporto caratteri/token misurato con count_tokens (gratuito) sulla prima API key, system
+    instruction compresa. Senza chiavi o in caso di errore resta la stima ESTIMATED_CHARS_PER_TOKEN.
+    """
+    eng = current_engine()
+    if not eng.available_api_keys or not sample: return ESTIMATED_CHARS_PER_TOKEN, False
+    try:
+        tokens = _get_model_for_key(eng.available_api_keys[0], args).count_tokens(sample).total_tokens
+        return (len(eng.system_instruction) + len(sample)) / tokens, True
+    except Exception as e:
+        log_msg(f"⚠️ Conteggio token non disponibile ({e}): uso la stima.", style="yellow")
+        return ESTIMATED_CHARS_PER_TOKEN, False
+
+def _dry_run_pending(entries, args, seen):
+    """Separa le voci già in cache (esatte, fuzzy o tradotte da un file precedente) da quelle da inviare."""
+    eng = current_engine()
+    dedup = getattr(args, 'global_dedup', False)
+    pending, hits = [], 0
+    for e in entries:
+        text = e['text']
+        cached = text in seen or json.dumps((text, args.source_lang, args.target_lang), ensure_ascii=False) in eng.translation_cache
+        if not cached and args.fuzzy_match and fuzz:
+            cached_text, _ = _get_fuzzy_index(args).best_match(text)
+            cached = cached_text is not None
+        if cached: hits += 1
+        else: pending.append(text)
+        # Con --global-dedup anche i duplicati nello stesso file vengono tradotti una volta sola
+        if dedup: seen.add(text)
+    if not dedup: seen.update(pending)
+    return hits, pending
+
+def _dry_run_requests(pending, args, cpt, use_file_context):
+    """
+    Forma i batch come AdaptiveBatcher e conta richieste e token di ogni prompt (system instruction,
+    contesto e revisione compresi). Restituisce (richieste, token input, di cui system instruction, token output).
+    """
+    eng = current_engine()
+    sys_tokens = len(eng.system_instruction) / cpt
+    requests, tokens_in, tokens_out = 0, 0.0, 0.0
+    def request(prompt_chars, output_chars):
+        nonlocal requests, tokens_in, tokens_out
+        # Come call_ai_raw: con --reflect ogni risposta passa anche da una chiamata di revisione
+        calls = [prompt_chars, output_chars + 120] if args.reflect else [prompt_chars]
+        for chars in calls:
+            requests += 1
+            tokens_in += sys_tokens + chars / cpt
+            tokens_out += output_chars / cpt
+
+    file_ctx = ""
+    if pending and use_file_context:
+        request(len("\n".join(pending[:FILE_CONTEXT_SAMPLE_SIZE])) + 150, DRY_RUN_FILE_CONTEXT_CHARS)
+        file_ctx = f"Contesto generale del file: '{'x' * DRY_RUN_FILE_CONTEXT_CHARS}'"
+    recent = deque(maxlen=args.context_window or 1)
+    def ctx_str():
+        # Il contesto dinamico contiene le ultime coppie originale -> traduzione (stimate di pari lunghezza)
+        window = "".join(f'- "{t}" -> "{t}"\n' for t in recent) if args.context_window else ""
+        return f"{file_ctx}\n{window}" if window else file_ctx
+
+    if args.batch_size == 0:
+        for text in pending:
+            request(len(f"{_glossary_block([text])}{ctx_str()}\nTraduci da {args.source_lang} a {args.target_lang}: {text}") + 700, len(text))
+            recent.append(text)
+    else:
+        batcher = AdaptiveBatcher([{'text': t} for t in pending], args, adaptive=False)
+        batcher.chars_per_token = cpt
+        while batcher.has_pending():
+            texts = [e['text'] for e in batcher.next_batch()]
+            output_chars = len(json.dumps(texts, ensure_ascii=False))
+            request(len(_batch_prompt(texts, args, ctx_str())), output_chars)
+            if args.reflect: request(output_chars + 60, output_chars)
+            recent.extend(texts)
+    return requests, tokens_in, requests * sys_tokens, tokens_out
+
+def _dry_run_cost(pricing, tokens_in, sys_tokens, tokens_out, args):
+    price_in, price_out = pricing
+    # Con il context cache di Gemini la system instruction è fatturata a tariffa ridotta
+    if getattr(args, 'context_cache', None) == 'gemini': tokens_in -= sys_tokens * (1 - CONTEXT_CACHE_PRICE_RATIO)
+    return (tokens_in * price_in + tokens_out * price_out) / 1_000_000
 
 def do_dry_run(files, args):
+    """
+    Preventivo: estrae con i veri handler le sole voci traducibili, scarta quelle già in cache e
+    simula il batcher per stimare richieste, token (system instruction e revisione comprese),
+    costo per file e tempo totale con i limiti --rpm/--tpm e la --concurrency impostati.
+    """
+    eng = current_engine()
     log_msg("🔎 DRY RUN...", style="bold yellow")
-    total_chars = 0
-    for f in files:
-        try:
-            with open(f, 'r', encoding=args.encoding, errors='ignore') as fp: total_chars += len(fp.read())
-        except: pass
-    toks = int(total_chars / ESTIMATED_CHARS_PER_TOKEN)
-    cost = (toks / 1_000_000) * 0.35 
-    log_msg(f"📊 File: {len(files)} | Caratteri: {total_chars:,} | Token: {toks:,} | Costo: ~${cost:.4f}")
+    _setup_dry_run(args)
+    base_out = args.output_dir if args.output_dir else "output"
+
+    prepared_files = []
+    for fpath in files:
+        out = os.path.join(base_out, os.path.relpath(fpath, args.input))
+        prepared = _prepare_file(fpath, out, args)
+        entries = prepared[0] if prepared else []
+        if args.max_entries and len(entries) > args.max_entries: entries = []
+        prepared_files.append((fpath, entries))
+
+    sample = "\n".join(e['text'] for _, entries in prepared_files for e in entries[:50])[:20000]
+    cpt, measured = _measure_chars_per_token(sample, args)
+    log_msg(f"🔢 Caratteri per token: {cpt:.2f} ({'misurato con count_tokens' if measured else 'stima'})", style="dim")
+
+    pricing = _model_pricing(args.model_name)
+    if pricing is None:
+        log_msg(f"⚠️ Prezzi sconosciuti per '{args.model_name}': uso quelli di {DEFAULT_MODEL_NAME}.", style="yellow")
+        pricing = MODEL_PRICING[DEFAULT_MODEL_NAME]
+
+    def report(label, n, hits, requests, tokens_in, sys_tokens, tokens_out):
+        cost = _dry_run_cost(pricing, tokens_in, sys_tokens, tokens_out, args)
+        log_msg(f"  📄 {label}: {n} voci, {hits} da cache, {requests} richieste, ~{int(tokens_in):,} token in / ~{int(tokens_out):,} out, ~${cost:.4f}")
+
+    # Con --global-dedup le stringhe uniche di tutti i file partono in un'unica sequenza di batch densi
+    dedup = getattr(args, 'global_dedup', False)
+    use_file_context = args.file_type in ('csv', 'json') and args.enable_file_context and not dedup
+    seen, unique = set(), []
+    totals = [0, 0, 0, 0.0, 0.0, 0.0]
+    for fpath, entries in prepared_files:
+        hits, pending = _dry_run_pending(entries, args, seen)
+        stats = (0, 0.0, 0.0, 0.0) if dedup else _dry_run_requests(pending, args, cpt, use_file_context)
+        unique.extend(pending if dedup else [])
+        report(os.path.relpath(fpath, args.input), len(entries), hits, *stats)
+        for k, v in enumerate((len(entries), hits) + stats): totals[k] += v
+    if dedup:
+        stats = _dry_run_requests(unique, args, cpt, False)
+        report("deduplica globale", len(unique), 0, *stats)
+        for k, v in enumerate(stats): totals[k + 2] += v
+    n_entries, hits, requests, tokens_in, sys_tokens, tokens_out = totals
+
+    concurrency = max(1, args.concurrency or 1)
+    wall = requests * DRY_RUN_AVG_LATENCY / concurrency
+    if args.rpm and args.rpm > 0: wall = max(wall, requests / args.rpm * 60)
+    if getattr(args, 'tpm', None) and args.tpm > 0: wall = max(wall, (tokens_in + tokens_out) / args.tpm * 60)
+
+    log_msg(f"📊 File: {len(files)} | Voci: {n_entries:,} | Da cache: {hits:,} | Richieste: {requests:,} | "
+            f"Token: ~{int(tokens_in):,} in / ~{int(tokens_out):,} out", style="bold")
+    log_msg(f"💰 Costo stimato ({args.model_name.split(' |')[0].strip()}): ~${_dry_run_cost(pricing, tokens_in, sys_tokens, tokens_out, args):.4f}", style="bold green")
+    log_msg(f"⏱️ Tempo stimato: ~{_format_duration(wall)} (concorrenza {concurrency}{f', {args.rpm} RPM' if args.rpm else ''})", style="bold")
+    log_msg("💲 Costo per modello (USD per 1M token input / output):", style="cyan")
+    for model_name, model_pricing in MODEL_PRICING.items():
+        log_msg(f"   {model_name:<24} {model_pricing[0]:>6.3f} / {model_pricing[1]:>6.3f}  ->  ~${_dry_run_cost(model_pricing, tokens_in, sys_tokens, tokens_out, args):.4f}")
+    if isinstance(eng.translation_cache, SQLiteCacheStore) and not eng.shared_cache: eng.translation_cache.close()
 
 # --- HANDLERS ---
-def process_csv(fpath, outpath, args, stop_event):
+def _translate_prepared(prepared, fpath, args, stop_event, use_file_context=False):
+    """
+    Parte comune dei gestori non-streaming: i _prepare_* leggono il file e restituiscono
+    (entry, write) oppure None per saltarlo; qui si applicano --max-entries e il contesto file
+    e si traduce. Restituisce la funzione di scrittura, o None se il file va saltato.
+    """
+    if prepared is None: return None
+    entries, write = prepared
+    if args.max_entries and len(entries) > args.max_entries:
+        log_msg(f"⏭️ SKIP: File '{os.path.basename(fpath)}' ha troppe entry ({len(entries)} > {args.max_entries})", style="yellow")
+        return None
+
+    file_ctx = None
+    # Con la deduplica globale le stringhe sono già in cache: il contesto costerebbe solo una chiamata
+    if use_file_context and args.enable_file_context and not getattr(args, 'global_dedup', False):
+        samples = [e['text'] for e in entries[:FILE_CONTEXT_SAMPLE_SIZE]]
+        if samples: file_ctx = generate_file_context(samples, os.path.basename(fpath), args)
+    translate_batch(entries, args, stop_event, file_ctx)
+    return write
+
+def _process_prepared(prepared, fpath, args, stop_event, use_file_context=False):
+    write = _translate_prepared(prepared, fpath, args, stop_event, use_file_context)
+    if write: write()
+
+def _stream_producer(source, q, abort_event):
+    """
+    Thread produttore per le modalità streaming: mette in una coda limitata i blocchi
+    prodotti da source(), poi None. Le eccezioni vengono passate al consumatore.
+    """
+    def _put(item):
+        while not abort_event.is_set():
+            try:
+                q.put(item, timeout=0.5)
+                return True
+            except queue.Full: continue
+        return False
+    try:
+        for chunk in source():
+            if not _put(chunk): return
+    except Exception as e:
+        _put(e)
+    _put(None)
+
+def _iter_stream_chunks(source, abort_event):
+    """Consuma i blocchi del produttore attraverso una coda limitata (back-pressure sulla lettura)."""
+    q = queue.Queue(maxsize=STREAM_QUEUE_CHUNKS)
+    threading.Thread(target=_bind_engine(_stream_producer), args=(source, q, abort_event), daemon=True).start()
+    while True:
+        item = q.get()
+        if item is None: return
+        if isinstance(item, Exception): raise item
+        yield item
+
+def _load_stream_progress(progress_path):
+    try:
+        with open(progress_path, 'r', encoding='utf-8') as f: return json.load(f)
+    except: return None
+
+def _save_stream_progress(progress_path, progress):
+    tmp_path = progress_path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f: json.dump(progress, f)
+    os.replace(tmp_path, progress_path)
+
+def process_csv_stream(fpath, outpath, args, stop_event):
+    """
+    Variante streaming di process_csv (--stream): legge le righe a blocchi da un thread
+    produttore, traduce un blocco alla volta e lo accoda subito all'output, così la memoria
+    resta costante qualunque sia la dimensione del file. Dopo ogni blocco salva in
+    '<output>.progress' la riga raggiunta e la dimensione dell'output: con --resume si
+    riparte da lì troncando eventuali scritture parziali. Il file di avanzamento viene creato
+    prima dell'output e rimosso solo a file completato.
+    """
+    eng = current_engine()
+    target_path = outpath + ".txt" if args.translation_only_output else outpath
+    progress_path = target_path + ".progress"
+    start_row, out_bytes = 0, 0
+    if args.resume and os.path.exists(target_path):
+        progress = _load_stream_progress(progress_path)
+        if progress:
+            start_row, out_bytes = progress['rows'], progress['bytes']
+            os.truncate(target_path, out_bytes)
+            log_msg(f"  ↳ Resume: Riprendo dalla riga {start_row}.", style="cyan")
+        elif os.path.getsize(target_path):
+            log_msg("⏭️ Resume: File CSV già completo. Salto.", style="yellow")
+            return
+        else: log_msg("  ↳ Resume: Output vuoto senza avanzamento, riparto dall'inizio.", style="cyan")
+
+    def is_candidate(row_idx, row):
+        if row_idx == 0: return False # Intestazione
+        if args.max_cols and len(row) > args.max_cols: return False
+        return len(row) > args.translate_col and determine_if_translatable(row[args.translate_col])
+
+    if args.max_entries:
+        with open(fpath, 'r', encoding=args.encoding, newline='') as f:
+            count = sum(1 for i, row in enumerate(csv.reader(f, delimiter=args.delimiter)) if i >= start_row and is_candidate(i, row))
+        if count > args.max_entries:
+            log_msg(f"⏭️ SKIP: File ha troppe entry da tradurre ({count} > {args.max_entries})", style="yellow")
+            return
+
+    def read_chunks():
+        with open(fpath, 'r', encoding=args.encoding, newline='') as f:
+            chunk = []
+            for row_idx, row in enumerate(csv.reader(f, delimiter=args.delimiter)):
+                if row_idx < start_row: continue
+                chunk.append((row_idx, row))
+                if len(chunk) >= STREAM_CHUNK_ROWS:
+                    yield chunk
+                    chunk = []
+            if chunk: yield chunk
+
+    # Un solo encoder incrementale per tutto il file: il BOM (utf-8-sig, utf-16) va scritto una volta.
+    # Nel resume l'output contiene già il BOM, quindi si porta l'encoder oltre l'intestazione.
+    encoder = codecs.getincrementalencoder(args.encoding)()
+    if out_bytes: encoder.encode("")
+
+    abort_event = Event()
+    file_ctx = None
+    first_chunk = True
+    completed = True
+    # Avanzamento iniziale prima di creare l'output: un'interruzione nel primo blocco non lascia un file "completo"
+    if not start_row: _save_stream_progress(progress_path, {'rows': 0, 'bytes': 0})
+    try:
+        with open(target_path, 'ab' if start_row else 'wb') as out_f:
+            for chunk in _iter_stream_chunks(read_chunks, abort_event):
+                entries = []
+                for row_idx, row in chunk:
+                    if not is_candidate(row_idx, row): continue
+                    def cb(t, r=row, c=args.output_col):
+                        while len(r) <= c: r.append('')
+                        r[c] = t
+                    entries.append({'text': row[args.translate_col], 'callback': cb, 'row': row})
+
+                if first_chunk and args.enable_file_context:
+                    samples = [e['text'] for e in entries[:FILE_CONTEXT_SAMPLE_SIZE]]
+                    if samples: file_ctx = generate_file_context(samples, os.path.basename(fpath), args)
+                translate_batch(entries, args, stop_event, file_ctx, reset_context=first_chunk)
+                first_chunk = False
+                if stop_event.is_set() or (eng.global_skip_event and eng.global_skip_event.is_set()):
+                    completed = False
+                    break
+
+                buf = io.StringIO()
+                if args.translation_only_output:
+                    texts = [e['row'][args.output_col] for e in entries if len(e['row']) > args.output_col]
+                    if texts: buf.write(("\n" if out_f.tell() else "") + "\n".join(texts))
+                else:
+                    csv.writer(buf, delimiter=args.delimiter).writerows(row for _, row in chunk)
+                out_f.write(encoder.encode(buf.getvalue()))
+                out_f.flush()
+                _save_stream_progress(progress_path, {'rows': chunk[-1][0] + 1, 'bytes': out_f.tell()})
+            if completed: out_f.write(encoder.encode("", final=True))
+    finally:
+        abort_event.set()
+    if completed and os.path.exists(progress_path): os.remove(progress_path)
+
+# --- CALLBACK E SCRITTURA DEI _prepare_* ---
+# Funzioni di modulo legate con functools.partial invece di lambda: (callback, write) si serializza con
+# pickle, così con --parse-workers il documento letto dal worker torna a un worker per la scrittura.
+def _set_row_cell(row, col, fill, t):
+    while len(row) <= col: row.append(fill)
+    row[col] = t
+
+def _write_csv_rows(output_rows, data_rows, indices, outpath, opts, path=None):
+    path = path or outpath
+    if opts['translation_only']:
+        indices = set(indices)
+        translated_texts = [row[opts['output_col']] for i, row in enumerate(data_rows) if i in indices and len(row) > opts['output_col']]
+        with open(path + ".txt", 'w', encoding=opts['encoding']) as f: f.write("\n".join(translated_texts))
+    else:
+        with open(path, 'w', encoding=opts['encoding'], newline='') as f: csv.writer(f, delimiter=opts['delimiter']).writerows(output_rows)
+
+def _write_json_data(data, outpath, encoding, path=None):
+    with open(path or outpath, 'w', encoding=encoding) as f: json.dump(data, f, indent=4, ensure_ascii=False)
+
+def _write_srt_blocks(blocks, outpath, encoding, path=None):
+    with open(path or outpath, 'w', encoding=encoding) as f:
+        for b in blocks:
+            f.write(f"{b['i']}\n{b['t']}\n{b['txt']}\n\n")
+
+def _save_document(doc, outpath, path=None):
+    """PO (polib) e XLSX (openpyxl): il documento si salva da sé."""
+    doc.save(path or outpath)
+
+@_timed('file_parse_seconds')
+def _prepare_csv(fpath, outpath, args):
     try:
         with open(fpath, 'r', encoding=args.encoding, newline='') as f:
             rows = list(csv.reader(f, delimiter=args.delimiter))
     except Exception as e:
         log_msg(f"❌ Errore lettura CSV {fpath}: {e}", style="red")
-        return
+        return None
 
     entries = []
     output_rows = [r[:] for r in rows]
@@ -604,41 +2640,129 @@ def process_csv(fpath, outpath, args, stop_event):
         if needs_translation and not is_already_translated:
             rows_to_translate_indices.append(i)
 
-    if args.max_entries and len(rows_to_translate_indices) > args.max_entries:
-        log_msg(f"⏭️ SKIP: File ha troppe entry da tradurre ({len(rows_to_translate_indices)} > {args.max_entries})", style="yellow")
-        return
+    for i in rows_to_translate_indices:
+        row = data_rows[i]
+        entries.append({'text': row[args.translate_col], 'callback': functools.partial(_set_row_cell, row, args.output_col, '')})
+
+    csv_opts = {'encoding': args.encoding, 'delimiter': args.delimiter, 'output_col': args.output_col, 'translation_only': args.translation_only_output}
+    return entries, functools.partial(_write_csv_rows, output_rows, data_rows, rows_to_translate_indices, outpath, csv_opts)
+
+def process_csv(fpath, outpath, args, stop_event):
+    if getattr(args, 'stream', False): return process_csv_stream(fpath, outpath, args, stop_event)
+    _process_prepared(_prepare_csv(fpath, outpath, args), fpath, args, stop_event, use_file_context=True)
+
+_JSON_TOKEN_RE = re.compile(r'\s*(?:([{}\[\],:])|("(?:[^"\\]|\\.)*")|([^\s{}\[\],:"]+))')
+
+def _scan_json_strings(fpath, args, keys):
+    """
+    Scanner JSON incrementale e iterativo (nessuna ricorsione, nessun albero in memoria).
+    Legge il file a blocchi e restituisce (inizio, fine, valore) per ogni stringa che
+    process_json tradurrebbe: stesse regole di --json-keys / --match-full-json-path.
+    Gli offset sono in caratteri del testo decodificato.
+    """
+    stack = [] # Frame: [tipo, path, chiave_corrente, indice, attende_chiave]
+    buf, base, eof = "", 0, False
+    with open(fpath, 'r', encoding=args.encoding, newline='') as f:
+        pos = 0
+        while True:
+            m = _JSON_TOKEN_RE.match(buf, pos)
+            # Token assente o che arriva a fine buffer: potrebbe continuare nel blocco successivo
+            if not eof and (m is None or m.end() >= len(buf)):
+                chunk = f.read(STREAM_READ_CHARS)
+                if not chunk: eof = True
+                buf, base, pos = buf[pos:] + chunk, base + pos, 0
+                continue
+            if m is None:
+                if buf[pos:].strip(): raise ValueError(f"JSON non valido vicino al carattere {base + pos}")
+                return
+            pos = m.end()
+            punct, string, _ = m.groups()
+            top = stack[-1] if stack else None
+
+            if string is not None:
+                if top and top[0] == 'obj' and top[4]:
+                    top[2] = json.loads(string)
+                    continue
+                if top and top[0] == 'obj':
+                    k = top[2]
+                    curr = f"{top[1]}.{k}" if top[1] else k
+                    if (curr in keys) if args.match_full_json_path else (k in keys):
+                        value = json.loads(string)
+                        if determine_if_translatable(value): yield (base + m.start(2), base + m.end(2), value)
+                continue
+            if punct is None: continue # Numero, true, false, null: valore non traducibile
+            if punct in '{[':
+                if top is None: child_path = ""
+                elif top[0] == 'obj': child_path = f"{top[1]}.{top[2]}" if top[1] else top[2]
+                else: child_path = f"{top[1]}[{top[3]}]"
+                stack.append(['obj' if punct == '{' else 'arr', child_path, None, 0, punct == '{'])
+            elif punct in '}]':
+                if stack: stack.pop()
+            elif punct == ':':
+                if top: top[4] = False
+            elif punct == ',':
+                if top and top[0] == 'obj': top[4] = True
+                elif top: top[3] += 1
+
+def process_json_stream(fpath, outpath, args, stop_event):
+    """
+    Variante streaming di process_json (--stream), per file JSON enormi o molto annidati.
+    Primo passaggio: _scan_json_strings individua le stringhe da tradurre senza caricare l'albero.
+    Secondo passaggio: il file viene ricopiato a blocchi sostituendo solo quelle stringhe,
+    quindi la formattazione originale resta invariata.
+    """
+    eng = current_engine()
+    keys = set(args.json_keys.split(',')) if args.json_keys else set()
+    spans = []
+    entries = []
+    for start, end, value in _scan_json_strings(fpath, args, keys):
+        if stop_event.is_set(): return
+        slot = [None]
+        spans.append((start, end, slot))
+        entries.append({'text': value, 'callback': lambda t, sl=slot: sl.__setitem__(0, t)})
+        if args.max_entries and len(entries) > args.max_entries:
+            log_msg(f"⏭️ SKIP: File '{os.path.basename(fpath)}' ha troppe entry (> {args.max_entries})", style="yellow")
+            return
 
     file_ctx = None
     if args.enable_file_context:
-        # Campionamento migliorato (da AlumenOld)
-        samples = [data_rows[i][args.translate_col] for i in rows_to_translate_indices[:FILE_CONTEXT_SAMPLE_SIZE]]
+        samples = [e['text'] for e in entries[:FILE_CONTEXT_SAMPLE_SIZE]]
         if samples: file_ctx = generate_file_context(samples, os.path.basename(fpath), args)
-
-    for i in rows_to_translate_indices:
-        row = data_rows[i]
-        txt = row[args.translate_col]
-        def cb(t, r=row, c=args.output_col):
-            while len(r) <= c: r.append('')
-            r[c] = t
-        entries.append({'text': txt, 'callback': cb})
-
     translate_batch(entries, args, stop_event, file_ctx)
-    
-    if args.translation_only_output:
-        translated_texts = [row[args.output_col] for i, row in enumerate(data_rows) if i in rows_to_translate_indices and len(row) > args.output_col]
-        with open(outpath + ".txt", 'w', encoding=args.encoding) as f: f.write("\n".join(translated_texts))
-    else:
-        with open(outpath, 'w', encoding=args.encoding, newline='') as f: csv.writer(f, delimiter=args.delimiter).writerows(output_rows)
-
-def process_json(fpath, outpath, args, stop_event):
-    if args.resume and os.path.exists(outpath):
-        log_msg(f"⏭️ Resume: File JSON esistente. Salto.", style="yellow")
-        return
+    entries.clear()
+    # Con --resume un output esistente vale come completo: se interrotto non va scritto
+    if stop_event.is_set() or (eng.global_skip_event and eng.global_skip_event.is_set()): return
+
+    # newline='': i fine riga (anche CRLF) vengono ricopiati così come sono.
+    # Si scrive su un file temporaneo rinominato alla fine, come process_xlsx_stream.
+    tmp_path = outpath + ".tmp"
+    with open(fpath, 'r', encoding=args.encoding, newline='') as src, open(tmp_path, 'w', encoding=args.encoding, newline='') as out:
+        offset = 0
+        for start, end, slot in spans:
+            if slot[0] is None: continue # Non tradotta: resta il testo originale
+            remaining = start - offset
+            while remaining > 0:
+                chunk = src.read(min(remaining, STREAM_READ_CHARS))
+                if not chunk: break
+                out.write(chunk)
+                remaining -= len(chunk)
+            src.read(end - start)
+            out.write(json.dumps(slot[0], ensure_ascii=False))
+            offset = end
+        while True:
+            chunk = src.read(STREAM_READ_CHARS)
+            if not chunk: break
+            out.write(chunk)
+    os.replace(tmp_path, outpath)
+
+@_timed('file_parse_seconds')
+def _prepare_json(fpath, outpath, args):
+    eng = current_engine()
     with open(fpath, 'r', encoding=args.encoding) as f: data = json.load(f)
     entries = []
     keys = set(args.json_keys.split(',')) if args.json_keys else set()
     def traverse(obj, path=""):
-        if global_stop_event and global_stop_event.is_set(): return
+        if eng.global_stop_event and eng.global_stop_event.is_set(): return
         if len(entries) > (args.max_entries or float('inf')): return
 
         if isinstance(obj, dict):
@@ -646,28 +2770,27 @@ def process_json(fpath, outpath, args, stop_event):
                 curr = f"{path}.{k}" if path else k
                 match = (curr in keys) if args.match_full_json_path else (k in keys)
                 if match and isinstance(v, str) and determine_if_translatable(v):
-                     entries.append({'text': v, 'callback': lambda t, o=obj, key=k: o.__setitem__(key, t)})
+                     entries.append({'text': v, 'callback': functools.partial(operator.setitem, obj, k)})
                 traverse(v, curr)
         elif isinstance(obj, list):
             for i, x in enumerate(obj): traverse(x, f"{path}[{i}]")
     traverse(data)
-    if args.max_entries and len(entries) > args.max_entries:
-        log_msg(f"⏭️ SKIP: File '{os.path.basename(fpath)}' ha troppe entry ({len(entries)} > {args.max_entries})", style="yellow")
-        return
+    return entries, functools.partial(_write_json_data, data, outpath, args.encoding)
 
-    file_ctx = None
-    if args.enable_file_context:
-        samples = [e['text'] for e in entries[:FILE_CONTEXT_SAMPLE_SIZE]]
-        file_ctx = generate_file_context(samples, os.path.basename(fpath), args)
-    translate_batch(entries, args, stop_event, file_ctx)
-    with open(outpath, 'w', encoding=args.encoding) as f: json.dump(data, f, indent=4, ensure_ascii=False)
+def process_json(fpath, outpath, args, stop_event):
+    if args.resume and os.path.exists(outpath):
+        log_msg("⏭️ Resume: File JSON esistente. Salto.", style="yellow")
+        return
+    if getattr(args, 'stream', False): return process_json_stream(fpath, outpath, args, stop_event)
+    _process_prepared(_prepare_json(fpath, outpath, args), fpath, args, stop_event, use_file_context=True)
 
-def process_po(fpath, outpath, args, stop_event):
+@_timed('file_parse_seconds')
+def _prepare_po(fpath, outpath, args):
     try:
         po = polib.pofile(fpath, encoding=args.encoding)
     except Exception as e:
         log_msg(f"❌ Errore lettura file PO {fpath}: {e}", style="red")
-        return
+        return None
 
     entries = []
     
@@ -692,45 +2815,116 @@ def process_po(fpath, outpath, args, stop_event):
     for entry in entries_to_process:
         # Se il msgctxt è testo traducibile, lo aggiunge alla coda
         if should_translate_msgctxt(entry.msgctxt):
-            entries.append({'text': entry.msgctxt, 'callback': lambda t, e=entry: setattr(e, 'msgctxt', t)})
+            entries.append({'text': entry.msgctxt, 'callback': functools.partial(setattr, entry, 'msgctxt')})
         
         # Aggiunge il msgid se è traducibile
         if determine_if_translatable(entry.msgid):
-            entries.append({'text': entry.msgid, 'callback': lambda t, e=entry: setattr(e, 'msgstr', t)})
+            entries.append({'text': entry.msgid, 'callback': functools.partial(setattr, entry, 'msgstr')})
         elif entry.msgid:
             # Se non è traducibile, copia l'originale per non lasciare il campo vuoto
             entry.msgstr = entry.msgid
 
-    if args.max_entries and len(entries) > args.max_entries:
-        log_msg(f"⏭️ SKIP: File '{os.path.basename(fpath)}' ha troppe entry ({len(entries)} > {args.max_entries})", style="yellow")
-        return
-    translate_batch(entries, args, stop_event)
-    po.save(outpath)
+    return entries, functools.partial(_save_document, po, outpath)
 
-def process_xlsx(fpath, outpath, args, stop_event):
-    if not openpyxl: return
-    if args.resume and os.path.exists(outpath): return
+def process_po(fpath, outpath, args, stop_event):
+    _process_prepared(_prepare_po(fpath, outpath, args), fpath, args, stop_event)
+
+def process_xlsx_stream(fpath, outpath, args, stop_event):
+    """
+    Variante streaming di process_xlsx (--stream): legge tutti i fogli in modalità read-only
+    e scrive le righe tradotte in un workbook write-only, un blocco alla volta, così la
+    memoria resta costante. L'output contiene solo i valori (niente stili/celle unite) e
+    viene salvato su file temporaneo e rinominato solo a traduzione completata.
+    """
+    eng = current_engine()
+    src_col_idx = _excel_col_to_index(args.xlsx_source_col)
+    tgt_col_idx = _excel_col_to_index(args.xlsx_target_col)
+
+    def is_candidate(row):
+        if len(row) <= src_col_idx: return False
+        v = row[src_col_idx]
+        return bool(v) and isinstance(v, str) and determine_if_translatable(v)
+
+    def open_source():
+        wb = openpyxl.load_workbook(fpath, read_only=True, data_only=False)
+        for ws in wb.worksheets: ws.reset_dimensions()
+        return wb
+
+    if args.max_entries:
+        wb_in = open_source()
+        try: count = sum(1 for ws in wb_in.worksheets for row in ws.iter_rows(values_only=True) if is_candidate(row))
+        finally: wb_in.close()
+        if count > args.max_entries:
+            log_msg(f"⏭️ SKIP: File '{os.path.basename(fpath)}' ha troppe entry ({count} > {args.max_entries})", style="yellow")
+            return
+
+    def read_chunks():
+        wb_in = open_source()
+        try:
+            for ws in wb_in.worksheets:
+                chunk = []
+                for row in ws.iter_rows(values_only=True):
+                    chunk.append(list(row))
+                    if len(chunk) >= STREAM_CHUNK_ROWS:
+                        yield ws.title, chunk
+                        chunk = []
+                yield ws.title, chunk # Anche vuoto: il foglio va creato comunque
+        finally: wb_in.close()
+
+    wb_out = openpyxl.Workbook(write_only=True)
+    sheets_out = {}
+    abort_event = Event()
+    file_ctx = None
+    first_chunk = True
+    try:
+        for title, chunk in _iter_stream_chunks(read_chunks, abort_event):
+            if title not in sheets_out: sheets_out[title] = wb_out.create_sheet(title)
+            entries = []
+            for row in chunk:
+                if not is_candidate(row): continue
+                def cb(t, r=row):
+                    while len(r) <= tgt_col_idx: r.append(None)
+                    r[tgt_col_idx] = t
+                entries.append({'text': row[src_col_idx], 'callback': cb})
+
+            if first_chunk and entries and args.enable_file_context:
+                samples = [e['text'] for e in entries[:FILE_CONTEXT_SAMPLE_SIZE]]
+                file_ctx = generate_file_context(samples, os.path.basename(fpath), args)
+            translate_batch(entries, args, stop_event, file_ctx, reset_context=first_chunk)
+            if entries: first_chunk = False
+            if stop_event.is_set() or (eng.global_skip_event and eng.global_skip_event.is_set()): return
+            for row in chunk: sheets_out[title].append(row)
+    finally:
+        abort_event.set()
+
+    tmp_path = outpath + ".tmp"
+    wb_out.save(tmp_path)
+    os.replace(tmp_path, outpath)
+
+@_timed('file_parse_seconds')
+def _prepare_xlsx(fpath, outpath, args):
     wb = openpyxl.load_workbook(fpath)
-    ws = wb.active
     entries = []
     src_col_idx = _excel_col_to_index(args.xlsx_source_col)
     tgt_col_idx = _excel_col_to_index(args.xlsx_target_col)
-    for row in ws.iter_rows():
-        if len(row) > src_col_idx:
-            c = row[src_col_idx]
-            if c.value and isinstance(c.value, str) and determine_if_translatable(c.value):
-                tgt = ws.cell(row=c.row, column=tgt_col_idx + 1)
-                entries.append({'text': c.value, 'callback': lambda t, cell=tgt: setattr(cell, 'value', t)})
+    for ws in wb.worksheets:
+        for row in ws.iter_rows():
+            if len(row) > src_col_idx:
+                c = row[src_col_idx]
+                if c.value and isinstance(c.value, str) and determine_if_translatable(c.value):
+                    tgt = ws.cell(row=c.row, column=tgt_col_idx + 1)
+                    entries.append({'text': c.value, 'callback': functools.partial(setattr, tgt, 'value')})
     
-    if args.max_entries and len(entries) > args.max_entries:
-        log_msg(f"⏭️ SKIP: File '{os.path.basename(fpath)}' ha troppe entry ({len(entries)} > {args.max_entries})", style="yellow")
-        return
+    return entries, functools.partial(_save_document, wb, outpath)
 
-    translate_batch(entries, args, stop_event)
-    wb.save(outpath)
-
-def process_srt(fpath, outpath, args, stop_event):
+def process_xlsx(fpath, outpath, args, stop_event):
+    if not openpyxl: return
     if args.resume and os.path.exists(outpath): return
+    if getattr(args, 'stream', False): return process_xlsx_stream(fpath, outpath, args, stop_event)
+    _process_prepared(_prepare_xlsx(fpath, outpath, args), fpath, args, stop_event)
+
+@_timed('file_parse_seconds')
+def _prepare_srt(fpath, outpath, args):
     with open(fpath, 'r', encoding=args.encoding) as f: content = f.read()
     pattern = re.compile(r'(\d+)\s*\n(\d{2}:\d{2}:\d{2},\d{3}\s*-->\s*\d{2}:\d{2}:\d{2},\d{3})\s*\n(.*?)(?=\n\s*\n|\Z)', re.DOTALL)
     matches = list(pattern.finditer(content))
@@ -740,38 +2934,298 @@ def process_srt(fpath, outpath, args, stop_event):
         b = {'i': m.group(1), 't': m.group(2), 'txt': m.group(3)}
         blocks.append(b)
         if determine_if_translatable(b['txt']):
-            entries.append({'text': b['txt'], 'callback': lambda t, blk=b: blk.update({'txt': t})})
-    
-    if args.max_entries and len(entries) > args.max_entries:
-        log_msg(f"⏭️ SKIP: File '{os.path.basename(fpath)}' ha troppe entry ({len(entries)} > {args.max_entries})", style="yellow")
-        return
-
-    translate_batch(entries, args, stop_event)
-    with open(outpath, 'w', encoding=args.encoding) as f:
-        for b in blocks:
-            f.write(f"{b['i']}\n{b['t']}\n{b['txt']}\n\n")
+            entries.append({'text': b['txt'], 'callback': functools.partial(operator.setitem, b, 'txt')})
+    return entries, functools.partial(_write_srt_blocks, blocks, outpath, args.encoding)
 
 def process_srt(fpath, outpath, args, stop_event):
     if args.resume and os.path.exists(outpath): return
-    with open(fpath, 'r', encoding=args.encoding) as f: content = f.read()
-    pattern = re.compile(r'(\d+)\s*\n(\d{2}:\d{2}:\d{2},\d{3}\s*-->\s*\d{2}:\d{2}:\d{2},\d{3})\s*\n(.*?)(?=\n\s*\n|\Z)', re.DOTALL)
-    matches = list(pattern.finditer(content))
-    entries = []
-    blocks = []
-    for m in matches:
-        b = {'i': m.group(1), 't': m.group(2), 'txt': m.group(3)}
-        blocks.append(b)
-        if determine_if_translatable(b['txt']):
-            entries.append({'text': b['txt'], 'callback': lambda t, blk=b: blk.update({'txt': t})})
-    
-    if args.max_entries and len(entries) > args.max_entries:
-        log_msg(f"⏭️ SKIP: File '{os.path.basename(fpath)}' ha troppe entry ({len(entries)} > {args.max_entries})", style="yellow")
+    _process_prepared(_prepare_srt(fpath, outpath, args), fpath, args, stop_event)
+
+# --- DEDUPLICA GLOBALE E PIPELINE ---
+_PREPARERS = {'csv': _prepare_csv, 'json': _prepare_json, 'po': _prepare_po, 'xlsx': _prepare_xlsx, 'srt': _prepare_srt}
+
+def _prepare_file(fpath, out, args):
+    """Legge un file con il _prepare_* del formato, applicando gli stessi salti di process_*."""
+    if args.file_type == 'xlsx' and not openpyxl: return None
+    # Questi formati con --resume saltano l'intero file se l'output esiste già
+    if args.resume and args.file_type in ('json', 'xlsx', 'srt') and os.path.exists(out): return None
+    return _PREPARERS[args.file_type](fpath, out, args)
+
+def _make_parse_pool(args):
+    """Pool di processi per --parse-workers (spawn: sicuro anche con thread attivi e su Windows)."""
+    workers = getattr(args, 'parse_workers', 0) or 0
+    if workers <= 0: return None, args
+    # L'oggetto Args della GUI è una classe locale non serializzabile: si passa un Namespace
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')), argparse.Namespace(**vars(args))
+
+def _callback_slots(entries):
+    # I callback dei _prepare_* sono partial di funzioni di modulo: come (funzione, argomenti) si serializzano
+    # in una frazione del tempo dei partial e il documento a cui puntano viene condiviso dal memo di pickle
+    return [(e['callback'].func, e['callback'].args) for e in entries]
+
+def _pool_extract(fpath, out, args):
+    """
+    Eseguita in un processo figlio: legge il file e restituisce i testi e il documento letto (slot dei
+    callback e write) già serializzato. Il processo principale non lo deserializza: lo rimanda così
+    com'è a _pool_write, che quindi non rilegge il file. Eccezione: i formati in POOL_REPARSE_FORMATS.
+    """
+    prepared = _prepare_file(fpath, out, args)
+    if prepared is None: return None
+    entries, write = prepared
+    texts = [e['text'] for e in entries]
+    if args.file_type in POOL_REPARSE_FORMATS: return texts, None
+    return texts, pickle.dumps((_callback_slots(entries), write), pickle.HIGHEST_PROTOCOL)
+
+def _scan_texts(fpath, out, args):
+    """Testi di un file per la deduplica globale (anche in un processo figlio): il documento non viene serializzato."""
+    prepared = _prepare_file(fpath, out, args)
+    return None if prepared is None else [e['text'] for e in prepared[0]]
+
+def _pool_write(payload, translations, fpath, out, args):
+    """Eseguita in un processo figlio: applica le traduzioni per indice al documento e lo serializza."""
+    if payload is None:
+        entries, write = _prepare_file(fpath, out, args)
+        slots = _callback_slots(entries)
+    else:
+        slots, write = pickle.loads(payload)
+    for (func, func_args), t in zip(slots, translations):
+        if t is not None: func(*func_args, t)
+    write()
+
+def _pool_prepared(extracted, fpath, out, args, pool):
+    """Ricostruisce (entry, write) nel processo principale dai testi estratti da un worker."""
+    if extracted is None: return None
+    texts, payload = extracted
+    results = [None] * len(texts)
+    entries = [{'text': t, 'callback': lambda x, i=i: results.__setitem__(i, x)} for i, t in enumerate(texts)]
+    return entries, lambda: pool.submit(_pool_write, payload, results, fpath, out, args).result()
+
+def run_global_dedup(files, base_out, args, stop_event):
+    """
+    Pre-scansione di --global-dedup: estrae le stringhe da tutti i file, le conta e traduce
+    ogni stringa unica una sola volta, in batch densi. Le traduzioni finiscono in cache,
+    da cui il passaggio per file le distribuisce senza ulteriori chiamate API.
+    """
+    if getattr(args, 'stream', False):
+        log_msg("⚠️ Deduplica globale non disponibile con --stream: i file verranno letti solo una volta.", style="yellow")
         return
 
-    translate_batch(entries, args, stop_event)
-    with open(outpath, 'w', encoding=args.encoding) as f:
-        for b in blocks:
-            f.write(f"{b['i']}\n{b['t']}\n{b['txt']}\n\n")
+    counts = _collect_unique_texts(files, base_out, args, stop_event)
+    if counts: _translate_unique(counts, args, stop_event)
+
+def _collect_unique_texts(files, base_out, args, stop_event):
+    """Scansione di tutti i file: restituisce {testo: occorrenze} in ordine di prima apparizione."""
+    log_msg(f"🔎 Deduplica globale: scansione di {len(files)} file...", style="cyan")
+    outputs = [os.path.join(base_out, os.path.relpath(fpath, args.input)) for fpath in files]
+    pool, pool_args = _make_parse_pool(args)
+    if pool: scans = [pool.submit(_scan_texts, fpath, out, pool_args) for fpath, out in zip(files, outputs)]
+    counts = {} # Testo -> occorrenze, in ordine di prima apparizione
+    try:
+        for k, fpath in enumerate(files):
+            if stop_event.is_set(): return None
+            try:
+                if pool: texts = scans[k].result()
+                else: texts = _scan_texts(fpath, outputs[k], args)
+            except Exception as e:
+                log_msg(f"  ⚠️ Scansione {os.path.basename(fpath)} fallita: {e}", style="yellow")
+                continue
+            if texts is None: continue
+            if args.max_entries and len(texts) > args.max_entries: continue
+            for t in texts: counts[t] = counts.get(t, 0) + 1
+    finally:
+        if pool: pool.shutdown(wait=True, cancel_futures=True)
+    return counts
+
+def _translate_unique(counts, args, stop_event):
+    """Traduce una sola volta le stringhe uniche non ancora in cache."""
+    eng = current_engine()
+    occurrences = sum(counts.values())
+    pending = [t for t in counts if json.dumps((t, args.source_lang, args.target_lang), ensure_ascii=False) not in eng.translation_cache]
+    log_msg(f"  ↳ {occurrences} occorrenze, {len(counts)} stringhe uniche, {len(pending)} da tradurre.", style="cyan")
+    if not pending: return
+
+    # Le voci vengono conteggiate per occorrenza nel passaggio per file, non qui
+    translated_before = eng.total_entries_translated
+    translate_batch([{'text': t, 'callback': lambda _t: None} for t in pending], args, stop_event)
+    eng.total_entries_translated = translated_before
+    check_and_save_cache(args, force=True)
+
+def run_pipeline(files, base_out, args, stop_event):
+    """
+    Scheduler a stadi di --pipeline: la lettura dei file successivi (fino a PIPELINE_PREFETCH_FILES
+    in anticipo) e la scrittura di quelli già tradotti avvengono in thread separati, mentre la
+    traduzione resta in ordine nel thread principale. Le code limitate fanno da back-pressure:
+    la lettura si ferma se la traduzione è indietro, la traduzione attende se le scritture si accumulano.
+    Con --parse-workers lettura e serializzazione girano in processi separati: tra i processi
+    viaggiano solo le liste di testi, mentre cache e chiamate API restano nel processo principale.
+    """
+    eng = current_engine()
+    use_file_context = args.file_type in ('csv', 'json')
+    outputs = []
+    for fpath in files:
+        out = os.path.join(base_out, os.path.relpath(fpath, args.input))
+        os.makedirs(os.path.dirname(out), exist_ok=True)
+        outputs.append(out)
+
+    def drain_writes(limit):
+        while len(pending_writes) > limit:
+            fname, future, skipped = pending_writes.popleft()
+            try:
+                future.result()
+                if not skipped: eng.total_files_translated += 1
+            except Exception as e:
+                log_msg(f"❌ Errore {fname}: {e}", style="bold red")
+
+    pending_writes = deque()
+    process_pool, pool_args = _make_parse_pool(args)
+    prefetch = max(PIPELINE_PREFETCH_FILES, getattr(args, 'parse_workers', 0) or 0)
+    if process_pool: parse_pool = process_pool
+    else: parse_pool = ThreadPoolExecutor(max_workers=PIPELINE_PREFETCH_FILES)
+    write_pool = ThreadPoolExecutor(max_workers=max(PIPELINE_WRITE_WORKERS, getattr(args, 'parse_workers', 0) or 0))
+    parsed = deque()
+    next_to_parse = 0
+    try:
+        for i, fpath in enumerate(files):
+            while next_to_parse < len(files) and next_to_parse <= i + prefetch:
+                k = next_to_parse
+                if process_pool: parsed.append(process_pool.submit(_pool_extract, files[k], outputs[k], pool_args))
+                else: parsed.append(parse_pool.submit(_bind_engine(_prepare_file), files[k], outputs[k], args))
+                next_to_parse += 1
+            future = parsed.popleft()
+            if stop_event.is_set():
+                future.cancel()
+                log_msg("🛑 Stop.", style="red"); break
+            if eng.global_skip_event: eng.global_skip_event.clear()
+
+            fname = os.path.basename(fpath)
+            log_msg(f"📄 [{i+1}/{len(files)}] {fname}")
+            try:
+                prepared = future.result()
+                if process_pool: prepared = _pool_prepared(prepared, fpath, outputs[i], pool_args, process_pool)
+                write = _translate_prepared(prepared, fpath, args, stop_event, use_file_context)
+            except Exception as e:
+                log_msg(f"❌ Errore {fname}: {e}", style="bold red")
+                continue
+            skipped = bool(eng.global_skip_event and eng.global_skip_event.is_set())
+            if write:
+                pending_writes.append((fname, write_pool.submit(_bind_engine(write)), skipped))
+            elif not skipped:
+                eng.total_files_translated += 1
+            check_and_save_cache(args)
+            drain_writes(PIPELINE_WRITE_WORKERS)
+    finally:
+        # Le letture in coda non servono più: la chiusura del pool non deve attenderle
+        for future in parsed: future.cancel()
+        drain_writes(0)
+        write_pool.shutdown(wait=True)
+        parse_pool.shutdown(wait=True, cancel_futures=True)
+
+def _process_file(fpath, out, args, stop_event):
+    if args.file_type == 'csv': process_csv(fpath, out, args, stop_event)
+    elif args.file_type == 'json': process_json(fpath, out, args, stop_event)
+    elif args.file_type == 'po': process_po(fpath, out, args, stop_event)
+    elif args.file_type == 'xlsx': process_xlsx(fpath, out, args, stop_event)
+    elif args.file_type == 'srt': process_srt(fpath, out, args, stop_event)
+
+# --- MULTI-LINGUA ---
+def _setup_language_engine(largs, parent):
+    """
+    Eseguita nel motore di una lingua di --target-langs: crea il modello con la system instruction
+    della lingua e condivide con il motore principale chiavi, rate limiter, journal ed eventi.
+    """
+    eng = current_engine()
+    if not setup_engine(largs): return False
+    eng.rate_limiter = parent.rate_limiter
+    eng.api_call_counts = parent.api_call_counts
+    eng.blacklisted_keys = parent.blacklisted_keys
+    eng.cache_journal = parent.cache_journal
+    eng.active_cache_file = parent.active_cache_file
+    # La compattazione della cache JSON (e il salvataggio della cache di contesto) resta al motore
+    # principale, tra un file e l'altro: nessun dump del dizionario mentre le altre lingue vi scrivono
+    eng.compact_cache = False
+    eng.gui_log_queue = parent.gui_log_queue
+    eng.telemetry = parent.telemetry
+    eng.log_level = parent.log_level
+    eng.context_tier = parent.context_tier
+    eng.global_stop_event, eng.global_pause_event = parent.global_stop_event, parent.global_pause_event
+    eng.global_skip_event, eng.global_skip_api_event = parent.global_skip_event, parent.global_skip_api_event
+    return True
+
+def run_multi_target(files, base_out, args, stop_event):
+    """
+    --target-langs: ogni file viene letto una volta sola e le sue stringhe vengono tradotte in
+    parallelo in tutte le lingue, ciascuna con il proprio motore (system instruction dedicata)
+    ma con cache, chiavi e rate limiter condivisi. Il contesto del file viene generato una volta.
+    L'output di ogni lingua va in <output>/<lingua>/; le voci non tradotte restano in lingua originale.
+    """
+    eng = current_engine()
+    langs = list(dict.fromkeys(l.strip() for l in args.target_langs.split(',') if l.strip()))
+    lang_args, lang_engines = {}, {}
+    for lang in langs:
+        largs = copy.copy(args)
+        largs.target_lang, largs.target_langs = lang, None
+        le = AlumenEngine(cache=eng.translation_cache, executor=eng.executor)
+        if not le.call(_setup_language_engine, largs, eng): return
+        lang_args[lang], lang_engines[lang] = largs, le
+    log_msg(f"🌍 Lingue di destinazione: {', '.join(langs)}", style="cyan")
+    streaming = getattr(args, 'stream', False)
+
+    with ThreadPoolExecutor(max_workers=len(langs)) as lang_pool:
+        if getattr(args, 'global_dedup', False) and not streaming:
+            counts = _collect_unique_texts(files, base_out, args, stop_event)
+            if counts: list(lang_pool.map(lambda l: lang_engines[l].call(_translate_unique, counts, lang_args[l], stop_event), langs))
+
+        # La lettura è condivisa: il resume granulare per riga dipende dalla lingua, quindi si salta solo a livello di file
+        scan_args = copy.copy(args)
+        scan_args.resume = False
+        for i, fpath in enumerate(files):
+            if stop_event.is_set(): log_msg("🛑 Stop.", style="red"); break
+            if eng.global_skip_event: eng.global_skip_event.clear()
+            fname = os.path.basename(fpath)
+            log_msg(f"📄 [{i+1}/{len(files)}] {fname}")
+            rel = os.path.relpath(fpath, args.input)
+            outs = {lang: os.path.join(base_out, lang, rel) for lang in langs}
+            for out in outs.values(): os.makedirs(os.path.dirname(out), exist_ok=True)
+
+            try:
+                if streaming:
+                    # Con --stream ogni lingua rilegge il file a blocchi (memoria costante)
+                    for lang in langs: lang_engines[lang].call(_process_file, fpath, outs[lang], lang_args[lang], stop_event)
+                elif args.resume and all(os.path.exists(out) for out in outs.values()):
+                    log_msg("⏭️ Resume: Output già presente per tutte le lingue. Salto.", style="yellow")
+                else:
+                    prepared = _prepare_file(fpath, outs[langs[0]], scan_args)
+                    entries, write = prepared if prepared is not None else ([], None)
+                    if args.max_entries and len(entries) > args.max_entries:
+                        log_msg(f"⏭️ SKIP: File '{fname}' ha troppe entry ({len(entries)} > {args.max_entries})", style="yellow")
+                        write = None
+                    if write:
+                        file_ctx = None
+                        if args.file_type in ('csv', 'json') and args.enable_file_context and not getattr(args, 'global_dedup', False):
+                            samples = [e['text'] for e in entries[:FILE_CONTEXT_SAMPLE_SIZE]]
+                            if samples: file_ctx = generate_file_context(samples, fname, args)
+                        results = {lang: [None] * len(entries) for lang in langs}
+                        def translate_lang(lang):
+                            lang_entries = [{'text': e['text'], 'callback': lambda t, r=results[lang], k=k: r.__setitem__(k, t)} for k, e in enumerate(entries)]
+                            lang_engines[lang].call(translate_batch, lang_entries, lang_args[lang], stop_event, file_ctx)
+                        list(lang_pool.map(translate_lang, langs))
+                        # La struttura letta è una sola: per ogni lingua si applicano le traduzioni e si scrive
+                        for lang in langs:
+                            for e, t in zip(entries, results[lang]): e['callback'](t if t is not None else e['text'])
+                            write(outs[lang])
+
+                if not (eng.global_skip_event and eng.global_skip_event.is_set()):
+                    eng.total_files_translated += 1
+                check_and_save_cache(args)
+            except Exception as e:
+                log_msg(f"❌ Errore {fname}: {e}", style="bold red")
+
+    for le in lang_engines.values():
+        le.call(_release_context_cache)
+        eng.context_cache_tokens += le.context_cache_tokens
+        eng.total_entries_translated += le.total_entries_translated
+        eng.cache_hit_count += le.cache_hit_count
+        for k, v in le.recovery_stats.items(): eng.recovery_stats[k] += v
 
 # --- TOOLS UTILITY FUNCTIONS (NEW - Integrated) ---
 def run_cache_extractor(source_dir, target_dir, file_type, src_col, tgt_col, encoding, json_keys=None):
@@ -851,6 +3305,7 @@ def run_cache_extractor(source_dir, target_dir, file_type, src_col, tgt_col, enc
         log_msg("⚠️ Nessuna voce trovata.", style="yellow")
 
 def run_term_scanner(input_dir, file_type, encoding):
+    eng = current_engine()
     log_msg("🕵️ Avvio Scansione Termini...", style="bold yellow")
     text_blob = ""
     # Collect samples
@@ -867,9 +3322,9 @@ def run_term_scanner(input_dir, file_type, encoding):
     
     try:
         prompt = f"Estrai una lista di Nomi Propri, Luoghi e Oggetti Unici da questo testo. Restituisci JSON array.\nTESTO:\n{text_blob[:30000]}"
-        if not available_api_keys: return "Errore: Manca API Key"
+        if not eng.available_api_keys: return "Errore: Manca API Key"
         
-        genai.configure(api_key=available_api_keys[0]) 
+        genai.configure(api_key=eng.available_api_keys[0]) 
         model = genai.GenerativeModel("gemini-1.5-flash")
         resp = model.generate_content(prompt).text
         clean = re.sub(r'^```json\s*|\s*```$', '', resp, flags=re.MULTILINE)
@@ -879,9 +3334,17 @@ def run_term_scanner(input_dir, file_type, encoding):
 
 # --- RUNNER ---
 def run_core_process(args, log_queue=None, stop_event=None, pause_event=None, skip_event=None, skip_api_event=None):
-    global gui_log_queue, total_files_translated, total_entries_translated, context_window_deque, global_stop_event, global_pause_event, global_skip_event, global_skip_api_event, interactive_commands_thread
-    gui_log_queue = log_queue
-    global_stop_event, global_pause_event, global_skip_event, global_skip_api_event = stop_event, pause_event, skip_event, skip_api_event
+    eng = current_engine()
+    eng.log_level = LOG_LEVELS.get(getattr(args, 'log_level', None) or 'info', LOG_INFO)
+    try: return _run_core_process(args, log_queue, stop_event, pause_event, skip_event, skip_api_event)
+    finally: flush_logs()
+
+def _run_core_process(args, log_queue, stop_event, pause_event, skip_event, skip_api_event):
+    global interactive_commands_thread
+    eng = current_engine()
+    eng.gui_log_queue = log_queue
+    eng.global_stop_event, eng.global_pause_event, eng.global_skip_event, eng.global_skip_api_event = stop_event, pause_event, skip_event, skip_api_event
+    eng.telemetry = Telemetry()
     
     if stop_event is None: stop_event = Event()
     if pause_event is None: pause_event = Event(); pause_event.set()
@@ -891,7 +3354,7 @@ def run_core_process(args, log_queue=None, stop_event=None, pause_event=None, sk
 
     # Avvio del thread per i comandi interattivi se richiesto
     if args.interactive:
-        interactive_commands_thread = threading.Thread(target=command_input_thread, daemon=True)
+        interactive_commands_thread = threading.Thread(target=_bind_engine(command_input_thread), daemon=True)
         interactive_commands_thread.start()
 
     if args.dry_run:
@@ -905,56 +3368,97 @@ def run_core_process(args, log_queue=None, stop_event=None, pause_event=None, sk
         return
 
     files = [os.path.join(r, f) for r, _, fs in os.walk(args.input) for f in fs if f.lower().endswith(f".{args.file_type}")]
+    eng.files_total = len(files)
     base_out = args.output_dir if args.output_dir else "output"
     if not os.path.exists(base_out): os.makedirs(base_out)
     
     log_msg(f"🚀 Avvio Alumen (Mode: {args.model_name})", style="bold green")
+    multi_target = bool(getattr(args, 'target_langs', None))
+    if getattr(args, 'global_dedup', False) and not multi_target: run_global_dedup(files, base_out, args, stop_event)
     
-    for i, fpath in enumerate(files):
-        if stop_event.is_set(): log_msg("🛑 Stop.", style="red"); break
-        if global_skip_event: global_skip_event.clear()
+    # --parse-workers usa la pipeline. Con --stream ogni file è già letto, tradotto e scritto a blocchi: la pipeline non si applica
+    if multi_target:
+        run_multi_target(files, base_out, args, stop_event)
+    elif (getattr(args, 'pipeline', False) or getattr(args, 'parse_workers', 0)) and not getattr(args, 'stream', False):
+        run_pipeline(files, base_out, args, stop_event)
+    else:
+        for i, fpath in enumerate(files):
+            if stop_event.is_set(): log_msg("🛑 Stop.", style="red"); break
+            if eng.global_skip_event: eng.global_skip_event.clear()
         
-        fname = os.path.basename(fpath)
-        log_msg(f"📄 [{i+1}/{len(files)}] {fname}")
-        rel = os.path.relpath(fpath, args.input)
-        out = os.path.join(base_out, rel)
-        os.makedirs(os.path.dirname(out), exist_ok=True)
+            fname = os.path.basename(fpath)
+            log_msg(f"📄 [{i+1}/{len(files)}] {fname}")
+            rel = os.path.relpath(fpath, args.input)
+            out = os.path.join(base_out, rel)
+            os.makedirs(os.path.dirname(out), exist_ok=True)
         
-        try:
-            if args.file_type == 'csv': process_csv(fpath, out, args, stop_event)
-            elif args.file_type == 'json': process_json(fpath, out, args, stop_event)
-            elif args.file_type == 'po': process_po(fpath, out, args, stop_event)
-            elif args.file_type == 'xlsx': process_xlsx(fpath, out, args, stop_event)
-            elif args.file_type == 'srt': process_srt(fpath, out, args, stop_event)
+            try:
+                _process_file(fpath, out, args, stop_event)
             
-            if not (global_skip_event and global_skip_event.is_set()):
-                total_files_translated += 1
-            check_and_save_cache(args, force=True)
-        except Exception as e:
-            log_msg(f"❌ Errore {fname}: {e}", style="bold red")
+                if not (eng.global_skip_event and eng.global_skip_event.is_set()):
+                    eng.total_files_translated += 1
+                # Il journal rende già durevoli le nuove voci: la compattazione completa resta periodica
+                check_and_save_cache(args)
+            except Exception as e:
+                log_msg(f"❌ Errore {fname}: {e}", style="bold red")
 
-    log_msg(f"✅ Finito. {total_files_translated} file tradotti.", style="bold green")
+    check_and_save_cache(args, force=True)
+    _release_context_cache()
+    log_msg(f"✅ Finito. {eng.total_files_translated} file tradotti.", style="bold green")
     if tg_app: telegram_bot.stop_bot()
 
+TELEMETRY_LABELS = {
+    'request_latency_seconds': "Latenza richiesta",
+    'batch_latency_seconds': "Latenza batch",
+    'rate_limit_wait_seconds': "Attesa rate limiter",
+    'cache_lookup_seconds': "Lookup cache",
+    'response_parse_seconds': "Parsing risposta",
+    'file_parse_seconds': "Lettura file",
+    'batch_size': "Righe per batch",
+    'request_tokens_in': "Token input/richiesta",
+    'request_tokens_out': "Token output/richiesta",
+}
+
+def _format_metric(name, value):
+    if not name.endswith('_seconds'): return f"{value:.0f}"
+    if value < 0.01: return f"{value * 1000:.1f} ms"
+    return f"{value * 1000:.0f} ms" if value < 1 else f"{value:.2f} s"
+
 def _get_full_stats_text(is_telegram=False, for_gui=False):
     """Genera il testo o la tabella per le statistiche complete."""
+    eng = current_engine()
     end_time = time.time()
-    global cache_hit_count # Dichiarazione mancante
-    total_time = end_time - (script_args_global.start_time if hasattr(script_args_global, 'start_time') else end_time)
-    total_api_calls = sum(api_call_counts.values())
-    avg_time_per_file = (total_time / total_files_translated) if total_files_translated > 0 else 0
+    total_time = end_time - (eng.script_args_global.start_time if hasattr(eng.script_args_global, 'start_time') else end_time)
+    total_api_calls = sum(eng.api_call_counts.values())
+    avg_time_per_file = (total_time / eng.total_files_translated) if eng.total_files_translated > 0 else 0
+    snapshot = eng.telemetry.snapshot()
+    histograms = [(name, snapshot['histograms'][name]) for name in TELEMETRY_LABELS if snapshot['histograms'][name]['count']]
+    counters = snapshot['counters']
+    entries_per_min = eng.total_entries_translated / total_time * 60 if total_time > 0 else 0
 
     if is_telegram:
         lines = ["*📊 STATISTICHE COMPLETE*"]
-        lines.append(f"⏳ *Tempo trascorso:* `{datetime.fromtimestamp(total_time).strftime('%H:%M:%S')}`")
-        lines.append(f"✅ *File tradotti:* `{total_files_translated}`")
-        lines.append(f"✅ *Voci tradotte:* `{total_entries_translated}`")
-        lines.append(f"💾 *Cache Hits:* `{cache_hit_count}`")
+        lines.append(f"⏳ *Tempo trascorso:* `{_format_duration(total_time)}`")
+        lines.append(f"✅ *File tradotti:* `{eng.total_files_translated}`")
+        lines.append(f"✅ *Voci tradotte:* `{eng.total_entries_translated}`")
+        lines.append(f"💾 *Cache Hits:* `{eng.cache_hit_count}`")
         lines.append(f"📞 *Chiamate API totali:* `{total_api_calls}`")
+        if isinstance(eng.translation_cache, TieredCacheStore):
+            cs = eng.translation_cache.stats
+            lines.append(f"🔥 *Cache a livelli:* hit `{cs['hot_hits']}` LRU / `{cs['cold_hits']}` disco, miss `{cs['bloom_misses']}` Bloom / `{cs['cold_misses']}` disco, evizioni `{cs['evictions']}`")
+        if eng.context_cache_tokens: lines.append(f"🧠 *Token dal context cache:* `{eng.context_cache_tokens}`")
+        if eng.recovery_stats['batches']:
+            lines.append(f"♻️ *Batch recuperati:* `{eng.recovery_stats['batches']}` (chiamate risparmiate: `{max(0, eng.recovery_stats['rows'] - eng.recovery_stats['calls'])}`)")
+        lines.append(f"🚀 *Voci al minuto:* `{entries_per_min:.1f}`")
+        if counters.get('retries_total'): lines.append(f"🔁 *Retry:* `{counters['retries_total']}`")
+        if histograms:
+            lines.append("\n*⏱️ Telemetria (p50 / p90 / p99):*")
+            for name, h in histograms:
+                lines.append(f"{TELEMETRY_LABELS[name]}: `{_format_metric(name, h['p50'])}` / `{_format_metric(name, h['p90'])}` / `{_format_metric(name, h['p99'])}`")
         lines.append("\n*🔑 Stato Chiavi API:*")
-        for i, key in enumerate(available_api_keys):
-            status = "✅ ATTIVA" if i == current_api_key_index else ("❌ BLACKLIST" if key in blacklisted_keys else " standby")
-            lines.append(f"`...{key[-4:]}`: `{api_call_counts.get(key, 0)}` chiamate ({status})")
+        for i, key in enumerate(eng.available_api_keys):
+            status = "✅ ATTIVA" if i == eng.current_api_key_index else ("❌ BLACKLIST" if key in eng.blacklisted_keys else " standby")
+            lines.append(f"`...{key[-4:]}`: `{eng.api_call_counts.get(key, 0)}` chiamate ({status})")
         return "\n".join(lines)
     else:
         from io import StringIO
@@ -962,62 +3466,88 @@ def _get_full_stats_text(is_telegram=False, for_gui=False):
         main_table = Table(title="📊 STATISTICHE DI ESECUZIONE", show_header=False, header_style="bold magenta")
         main_table.add_column("Parametro", style="cyan")
         main_table.add_column("Valore", style="bold")
-        main_table.add_row("⏳ Tempo trascorso", datetime.fromtimestamp(total_time).strftime('%H:%M:%S'))
-        main_table.add_row("✅ File tradotti", str(total_files_translated))
-        main_table.add_row("✅ Voci tradotte", str(total_entries_translated))
-        if total_files_translated > 0: main_table.add_row("⏱️ Tempo medio per file", datetime.fromtimestamp(avg_time_per_file).strftime('%H:%M:%S'))
+        main_table.add_row("⏳ Tempo trascorso", _format_duration(total_time))
+        main_table.add_row("✅ File tradotti", str(eng.total_files_translated))
+        main_table.add_row("✅ Voci tradotte", str(eng.total_entries_translated))
+        if eng.total_files_translated > 0: main_table.add_row("⏱️ Tempo medio per file", _format_duration(avg_time_per_file))
+        main_table.add_row("🚀 Voci al minuto", f"{entries_per_min:.1f}")
+        main_table.add_row("🔤 Token output/s", f"{snapshot['throughput']['tokens_out_per_second']:.1f}")
         main_table.add_section()
-        main_table.add_row("💾 Traduzioni da cache", str(cache_hit_count))
+        main_table.add_row("💾 Traduzioni da cache", str(eng.cache_hit_count))
         main_table.add_row("📞 Chiamate API totali", str(total_api_calls))
+        if isinstance(eng.translation_cache, TieredCacheStore):
+            cs = eng.translation_cache.stats
+            main_table.add_row("🔥 Cache: hit LRU / disco", f"{cs['hot_hits']} / {cs['cold_hits']}")
+            main_table.add_row("🌸 Cache: miss (Bloom / disco)", f"{cs['bloom_misses']} / {cs['cold_misses']}")
+            main_table.add_row("♻️ Cache: evizioni LRU", str(cs['evictions']))
+        if eng.context_tier: main_table.add_row("🧩 Cache di contesto (voci / evizioni)", f"{len(eng.context_tier)} / {eng.context_tier.evictions}")
+        if eng.context_cache_tokens: main_table.add_row("🧠 Token letti dal context cache", str(eng.context_cache_tokens))
+        if eng.recovery_stats['batches']:
+            main_table.add_row("♻️ Batch recuperati", str(eng.recovery_stats['batches']))
+            main_table.add_row("🧩 Righe salvate da risposte parziali", str(eng.recovery_stats['salvaged']))
+            main_table.add_row("💸 Chiamate risparmiate", str(max(0, eng.recovery_stats['rows'] - eng.recovery_stats['calls'])))
+        if counters.get('retries_total') or counters.get('request_errors_total') or counters.get('key_rotations_total'):
+            main_table.add_section()
+            main_table.add_row("🔁 Retry", str(counters.get('retries_total', 0)))
+            main_table.add_row("⚠️ Richieste fallite", str(counters.get('request_errors_total', 0)))
+            main_table.add_row("🔄 Rotazioni chiave", str(counters.get('key_rotations_total', 0)))
+
+        telemetry_table = Table(title="⏱️ Telemetria", show_header=True, header_style="bold magenta")
+        for col in ("Metrica", "N", "p50", "p90", "p99", "Max"): telemetry_table.add_column(col, justify="left" if col == "Metrica" else "right")
+        for name, h in histograms:
+            telemetry_table.add_row(TELEMETRY_LABELS[name], str(h['count']), *(_format_metric(name, h[k]) for k in ('p50', 'p90', 'p99', 'max')))
 
         keys_table = Table(title="🔑 Stato Chiavi API", show_header=True, header_style="bold magenta")
         keys_table.add_column("Chiave", style="green"); keys_table.add_column("Stato", justify="right"); keys_table.add_column("Chiamate", justify="right")
-        for key in available_api_keys:
-            status_text = "✅ ATTIVA" if key == available_api_keys[current_api_key_index] else ("❌ BLACKLIST" if key in blacklisted_keys else "standby")
-            keys_table.add_row(f"...{key[-4:]}", status_text, str(api_call_counts.get(key, 0)))
+        for key in eng.available_api_keys:
+            status_text = "✅ ATTIVA" if key == eng.available_api_keys[eng.current_api_key_index] else ("❌ BLACKLIST" if key in eng.blacklisted_keys else "standby")
+            keys_table.add_row(f"...{key[-4:]}", status_text, str(eng.api_call_counts.get(key, 0)))
 
         capture = StringIO()
         temp_console = Console(file=capture, force_terminal=not for_gui)
         temp_console.print(main_table)
+        if histograms: temp_console.print(telemetry_table)
         temp_console.print(keys_table)
         return capture.getvalue()
 
 # --- Interactive Mode Logic (from AlumenOld) ---
 def process_command(command_line):
+    eng = current_engine()
     cmd_parts = command_line.split(maxsplit=1)
     cmd = cmd_parts[0].lower() if cmd_parts else ""
     
     if cmd == "stop":
-        if global_stop_event: global_stop_event.set()
+        if eng.global_stop_event: eng.global_stop_event.set()
         log_msg("🛑 Stop richiesto. Uscita in corso...")
     elif cmd == "pause":
-        if global_pause_event: global_pause_event.clear()
+        if eng.global_pause_event: eng.global_pause_event.clear()
         log_msg("⏸️ Pausa.")
     elif cmd == "resume":
-        if global_pause_event: global_pause_event.set()
+        if eng.global_pause_event: eng.global_pause_event.set()
         log_msg("▶️ Ripresa.")
     elif cmd == "skip":
         sub_cmd = cmd_parts[1].lower() if len(cmd_parts) > 1 else ""
         if sub_cmd == "file":
-            if global_skip_event: global_skip_event.set()
+            if eng.global_skip_event: eng.global_skip_event.set()
             log_msg("⏭️ Salto del file corrente richiesto...")
         elif sub_cmd == "api":
             log_msg("🔄 Rotazione API Key richiesta dall'utente...")
-            rotate_key(script_args_global)
+            rotate_key(eng.script_args_global)
         else:
             log_msg("Comando non riconosciuto: usa 'skip file' o 'skip api'")
     elif cmd == "stats":
         # Mostra statistiche complete
         end_time = time.time()
-        total_time = end_time - script_args_global.start_time
+        total_time = end_time - eng.script_args_global.start_time
         console.print(_get_full_stats_text(is_telegram=False)) # Placeholder, la logica completa è complessa
-        log_msg(f"File: {total_files_translated}, Voci: {total_entries_translated}, Cache: {len(translation_cache)}, Chiamate API: {sum(api_call_counts.values())}")
+        log_msg(f"File: {eng.total_files_translated}, Voci: {eng.total_entries_translated}, Cache: {len(eng.translation_cache)}, Chiamate API: {sum(eng.api_call_counts.values())}")
     else:
         log_msg(f"Comando non riconosciuto: {cmd}")
 
 def command_input_thread():
+    eng = current_engine()
     log_msg("ℹ️ Modalità interattiva. Comandi: stop, pause, resume, skip, stats", style="yellow")
-    while not (global_stop_event and global_stop_event.is_set()):
+    while not (eng.global_stop_event and eng.global_stop_event.is_set()):
         process_command(input())
 
 def get_cli_args():
@@ -1040,11 +3570,16 @@ def get_cli_args():
     p.add_argument("--game-name", default="un videogioco generico")
     p.add_argument("--source-lang", default="inglese")
     p.add_argument("--target-lang", default="italiano")
+    p.add_argument("--target-langs", default=None)
     p.add_argument("--prompt-context")
     p.add_argument("--custom-prompt")
     p.add_argument("--translation-only-output", action="store_true")
     p.add_argument("--style-guide")
     p.add_argument("--rpm", type=int)
+    p.add_argument("--tpm", type=int)
+    p.add_argument("--concurrency", type=int, default=1)
+    p.add_argument("--batch-size", type=int, default=30)
+    p.add_argument("--adaptive-batch", action="store_true")
     p.add_argument("--enable-file-context", action="store_true")
     p.add_argument("--full-context-sample", action="store_true")
     p.add_argument("--context-window", type=int, default=0)
@@ -1053,9 +3588,22 @@ def get_cli_args():
     p.add_argument("--enable-file-log", action="store_true")
     p.add_argument("--telegram", action="store_true")
     p.add_argument("--resume", action="store_true")
+    p.add_argument("--stream", action="store_true")
+    p.add_argument("--global-dedup", action="store_true")
+    p.add_argument("--pipeline", action="store_true")
+    p.add_argument("--parse-workers", type=int, default=0)
+    p.add_argument("--async-engine", action="store_true")
+    p.add_argument("--glossary-filter", action="store_true")
+    p.add_argument("--metrics-file", default=None)
+    p.add_argument("--log-level", choices=list(LOG_LEVELS), default="info")
+    p.add_argument("--context-cache", choices=list(CONTEXT_CACHE_PROVIDERS), default=None)
     p.add_argument("--rotate-on-limit-or-error", action="store_true")
     p.add_argument("--persistent-cache", action="store_true")
     p.add_argument("--cache-file")
+    p.add_argument("--cache-backend", choices=["json", "sqlite", "tiered"], default="json")
+    p.add_argument("--cache-hot-size", type=int, default=CACHE_HOT_ENTRIES)
+    p.add_argument("--context-tier-size", type=int, default=CONTEXT_TIER_ENTRIES)
+    p.add_argument("--import-cache")
     p.add_argument("--glossary")
     p.add_argument("--server", action="store_true")
     p.add_argument("--dry-run", action="store_true")
@@ -1,8 +1,10 @@
 # --- START OF FILE AlumenGUI.py ---
 import tkinter as tk
 from tkinter import ttk, filedialog, scrolledtext, messagebox
+import tkinter.font as tkfont
 import threading
 import queue
+import bisect
 import os
 import json
 import AlumenCore
@@ -29,6 +31,13 @@ FONT_NORMAL = ("Segoe UI", 10)
 FONT_SIDEBAR = ("Segoe UI", 11)
 FONT_STATS = ("Segoe UI", 12, "bold")
 
+# --- LOG ---
+GUI_LOG_MAX_LINES = 200000   # righe tenute in memoria dalla vista del log
+GUI_LOG_DRAIN_MAX = 5000     # messaggi prelevati dalla coda per ogni tick
+GUI_LOG_POLL_MS = 100
+GUI_LOG_FILTERS = {"Tutti": AlumenCore.LOG_DEBUG, "Info": AlumenCore.LOG_INFO, "Avvisi": AlumenCore.LOG_WARNING, "Errori": AlumenCore.LOG_ERROR}
+GUI_LOG_TAGS = {AlumenCore.LOG_DEBUG: "debug", AlumenCore.LOG_WARNING: "warning", AlumenCore.LOG_ERROR: "error"}
+
 class ToolTip:
     def __init__(self, widget, text):
         self.widget = widget
@@ -80,6 +89,98 @@ class PlaceholderEntry(ttk.Entry):
         self.insert(0, text)
         self.is_active = True
 
+class LogView(tk.Frame):
+    """
+    Log virtualizzato: le righe restano in un buffer limitato (le più vecchie vengono scartate) e il
+    widget Text contiene solo quelle visibili, quindi ridisegnare costa uguale dopo cento o un milione di righe.
+    """
+    def __init__(self, parent, max_lines=GUI_LOG_MAX_LINES, **text_opts):
+        super().__init__(parent, bg=text_opts.get("bg"))
+        self.max_lines = max_lines
+        self.lines = []        # (livello, testo)
+        self.view = None       # indici delle righe che passano il filtro; None = nessun filtro
+        self.min_level = AlumenCore.LOG_DEBUG
+        self.top = 0
+        self.rows = 1
+        self.follow = True     # segue la coda finché l'utente non scorre verso l'alto
+        self.dirty = False
+        self.font = tkfont.Font(font=text_opts.get("font"))
+        self.vsb = ttk.Scrollbar(self, orient="vertical", command=self._on_scrollbar)
+        self.vsb.pack(side="right", fill="y")
+        self.hsb = ttk.Scrollbar(self, orient="horizontal")
+        self.hsb.pack(side="bottom", fill="x")
+        self.text = tk.Text(self, wrap="none", state="disabled", xscrollcommand=self.hsb.set, **text_opts)
+        self.text.pack(side="left", fill="both", expand=True)
+        self.hsb.config(command=self.text.xview)
+        self.text.tag_configure("debug", foreground="#7f8c8d")
+        self.text.tag_configure("warning", foreground="#f39c12")
+        self.text.tag_configure("error", foreground="#e74c3c")
+        self.text.bind("<Configure>", self._on_resize)
+        for seq in ("<MouseWheel>", "<Button-4>", "<Button-5>"): self.text.bind(seq, self._on_wheel)
+    def _count(self):
+        return len(self.lines) if self.view is None else len(self.view)
+    def _rebuild_view(self):
+        if self.min_level <= AlumenCore.LOG_DEBUG: self.view = None
+        else: self.view = [i for i, (level, _) in enumerate(self.lines) if level >= self.min_level]
+    def append(self, items):
+        """Aggiunge una serie di messaggi (livello, testo); quelli su più righe vengono spezzati."""
+        for level, msg in items:
+            for line in msg.split("\n"):
+                if self.view is not None and level >= self.min_level: self.view.append(len(self.lines))
+                self.lines.append((level, line))
+        # Taglio a blocchi: un del ogni max_lines/4 righe invece di uno per riga
+        excess = len(self.lines) - self.max_lines
+        if excess > self.max_lines // 4:
+            removed = excess if self.view is None else bisect.bisect_left(self.view, excess)
+            del self.lines[:excess]
+            self._rebuild_view()
+            self.top = max(0, self.top - removed)
+        self.dirty = True
+    def clear(self):
+        self.lines = []
+        self._rebuild_view()
+        self.top, self.follow, self.dirty = 0, True, True
+        self.render()
+    def set_filter(self, min_level):
+        self.min_level = min_level
+        self._rebuild_view()
+        self.follow, self.dirty = True, True
+        self.render()
+    def render(self):
+        if not self.dirty: return
+        self.dirty = False
+        total = self._count()
+        max_top = max(0, total - self.rows)
+        self.top = max_top if self.follow else min(self.top, max_top)
+        idx = range(self.top, min(total, self.top + self.rows))
+        if self.view is not None: idx = [self.view[i] for i in idx]
+        self.text.configure(state="normal")
+        self.text.delete("1.0", tk.END)
+        for i in idx:
+            level, line = self.lines[i]
+            self.text.insert(tk.END, line + "\n", GUI_LOG_TAGS.get(level, ()))
+        self.text.configure(state="disabled")
+        self.text.yview_moveto(0)
+        if total: self.vsb.set(self.top / total, (self.top + len(idx)) / total)
+        else: self.vsb.set(0, 1)
+    def _scroll_to(self, top):
+        max_top = max(0, self._count() - self.rows)
+        self.top = max(0, min(int(top), max_top))
+        self.follow = self.top >= max_top
+        self.dirty = True
+        self.render()
+    def _on_scrollbar(self, action, value, unit=None):
+        if action == "moveto": self._scroll_to(float(value) * self._count())
+        else: self._scroll_to(self.top + int(value) * (self.rows if unit == "pages" else 1))
+    def _on_wheel(self, event):
+        self._scroll_to(self.top + (-3 if event.num == 4 or event.delta > 0 else 3))
+        return "break"
+    def _on_resize(self, event):
+        pad = 2 * (int(self.text.cget("pady")) + int(self.text.cget("highlightthickness")) + int(self.text.cget("bd")))
+        self.rows = max(1, (event.height - pad) // self.font.metrics("linespace"))
+        self.dirty = True
+        self.render()
+
 class AlumenGUI:
     def __init__(self, root):
         self.root = root
@@ -104,7 +205,7 @@ class AlumenGUI:
         if os.path.exists("api_key.txt"):
             self._load_api_file_internal("api_key.txt")
         
-        self.root.after(100, self._poll_log_queue)
+        self.root.after(GUI_LOG_POLL_MS, self._poll_log_queue)
         self.root.after(1000, self._update_stats)
         self.root.after(2000, self._check_update_thread)
         
@@ -375,6 +476,14 @@ class AlumenGUI:
         self.var_filelog = tk.BooleanVar(value=False)
         self.var_reflect = tk.BooleanVar(value=False)
         self.var_fuzzy = tk.BooleanVar(value=False)
+        self.var_adaptive = tk.BooleanVar(value=False)
+        self.var_stream = tk.BooleanVar(value=False)
+        self.var_global_dedup = tk.BooleanVar(value=False)
+        self.var_pipeline = tk.BooleanVar(value=False)
+        self.var_async = tk.BooleanVar(value=False)
+        self.var_context_cache = tk.BooleanVar(value=False)
+        self.var_glossary_filter = tk.BooleanVar(value=False)
+        self.var_debug_log = tk.BooleanVar(value=False)
         
         c1 = ttk.Checkbutton(f_chk, text="Salva Cache", variable=self.var_cache, style="Card.TCheckbutton", command=self._update_ui_states)
         c1.grid(row=0, column=0, padx=10, sticky="w")
@@ -410,6 +519,32 @@ class AlumenGUI:
         self.ent_fuzzy_threshold.grid(row=2, column=3, padx=(5,0), sticky="w")
         ToolTip(self.ent_fuzzy_threshold, "Percentuale di similarità (basata su distanza di Levenshtein). Valore 0-100.")
         
+        c11 = ttk.Checkbutton(f_chk, text="Batch Adattivo", variable=self.var_adaptive, style="Card.TCheckbutton")
+        c11.grid(row=3, column=0, padx=10, pady=5, sticky="w")
+        ToolTip(c11, "Adatta la dimensione dei batch in base a latenza, errori e token reali. In caso di errore divide il batch a metà invece di tradurre riga per riga.")
+        
+        c12 = ttk.Checkbutton(f_chk, text="Streaming (File Enormi)", variable=self.var_stream, style="Card.TCheckbutton")
+        c12.grid(row=3, column=1, padx=10, pady=5, sticky="w")
+        ToolTip(c12, "Legge, traduce e scrive i file a blocchi con memoria costante. Con Resume riprende dall'ultimo blocco completato.")
+
+        c13 = ttk.Checkbutton(f_chk, text="Deduplica Globale", variable=self.var_global_dedup, style="Card.TCheckbutton")
+        c13.grid(row=3, column=2, columnspan=2, padx=10, pady=5, sticky="w")
+        ToolTip(c13, "Prima di tradurre scansiona tutti i file e traduce una sola volta ogni stringa ripetuta tra file diversi.")
+
+        c14 = ttk.Checkbutton(f_chk, text="Pipeline Multi-File", variable=self.var_pipeline, style="Card.TCheckbutton")
+        c14.grid(row=4, column=0, padx=10, pady=5, sticky="w")
+        ToolTip(c14, "Legge i file successivi e scrive quelli già tradotti mentre si attendono le risposte API.")
+
+        c15 = ttk.Checkbutton(f_chk, text="Motore Async", variable=self.var_async, style="Card.TCheckbutton")
+        c15.grid(row=4, column=1, padx=10, pady=5, sticky="w")
+        ToolTip(c15, "Invia i batch come richieste asincrone con una connessione persistente per API key. Usare con una Concorrenza alta (es. 16).")
+        c16 = ttk.Checkbutton(f_chk, text="Context Cache", variable=self.var_context_cache, style="Card.TCheckbutton")
+        c16.grid(row=4, column=2, padx=10, pady=5, sticky="w")
+        ToolTip(c16, "Carica una volta per API key la system instruction (glossario e guida di stile) nel context cache di Gemini. Conviene con glossari grandi.")
+        c17 = ttk.Checkbutton(f_chk, text="Log Debug (Prompt AI)", variable=self.var_debug_log, style="Card.TCheckbutton")
+        c17.grid(row=5, column=0, padx=10, pady=5, sticky="w")
+        ToolTip(c17, "Mostra nel log anche i prompt inviati e le risposte ricevute. Rallenta le traduzioni con batch grandi.")
+        
         f_num = ttk.Frame(lf_perf, style='Card.TFrame')
         f_num.pack(fill="x", pady=(0, 15))
         ttk.Label(f_num, text="Batch Size:", style='Card.TLabel').pack(side="left")
@@ -418,6 +553,22 @@ class AlumenGUI:
         ttk.Label(f_num, text="RPM:", style='Card.TLabel').pack(side="left")
         self.ent_rpm = PlaceholderEntry(f_num, "Max", width=5)
         self.ent_rpm.pack(side="left", padx=(5, 15))
+        ToolTip(self.ent_rpm, "Richieste al minuto consentite per ciascuna API key. Con più chiavi il limite totale si somma.")
+
+        ttk.Label(f_num, text="TPM:", style='Card.TLabel').pack(side="left")
+        self.ent_tpm = PlaceholderEntry(f_num, "Max", width=7)
+        self.ent_tpm.pack(side="left", padx=(5, 15))
+        ToolTip(self.ent_tpm, "Token al minuto consentiti per ciascuna API key (input + output).")
+
+        ttk.Label(f_num, text="Concorrenza:", style='Card.TLabel').pack(side="left")
+        self.ent_concurrency = PlaceholderEntry(f_num, "1", width=4)
+        self.ent_concurrency.pack(side="left", padx=(5, 15))
+        ToolTip(self.ent_concurrency, "Numero di batch inviati in parallelo all'API. Rispetta comunque il limite RPM. (Default: 1)")
+
+        ttk.Label(f_num, text="Processi:", style='Card.TLabel').pack(side="left")
+        self.ent_parse_workers = PlaceholderEntry(f_num, "0", width=4)
+        self.ent_parse_workers.pack(side="left", padx=(5, 15))
+        ToolTip(self.ent_parse_workers, "Processi dedicati a lettura e scrittura dei file (PO, XLSX, SRT pesanti). Attiva la pipeline multi-file. (Default: 0 = disattivato)")
 
         ttk.Label(f_num, text="Max Entries:", style='Card.TLabel').pack(side="left")
         self.ent_maxentr = PlaceholderEntry(f_num, "None", width=8)
@@ -448,6 +599,9 @@ class AlumenGUI:
         btn_browse_gloss = ttk.Button(f_glo, text="...", width=4, command=lambda: self._browse_file(self.ent_gloss))
         btn_browse_gloss.pack(side="left")
         ToolTip(btn_browse_gloss, "Sfoglia file")
+        chk_gloss_filter = ttk.Checkbutton(f_glo, text="Solo termini presenti", variable=self.var_glossary_filter, style="Card.TCheckbutton")
+        chk_gloss_filter.pack(side="left", padx=(10, 0))
+        ToolTip(chk_gloss_filter, "Invia in ogni richiesta solo i termini del glossario presenti nel batch invece dell'intero glossario. Consigliato per glossari con migliaia di voci.")
         
         f_cache = ttk.Frame(lf_perf, style='Card.TFrame')
         f_cache.pack(fill="x")
@@ -459,6 +613,11 @@ class AlumenGUI:
         self.btn_cache_browse = ttk.Button(f_cache, text="...", width=4, command=lambda: self._browse_file(self.ent_cache_file))
         self.btn_cache_browse.pack(side="left")
         ToolTip(self.btn_cache_browse, "Sfoglia file")
+        ttk.Label(f_cache, text="Backend:", style='Card.TLabel').pack(side="left", padx=(15, 0))
+        self.cmb_cache_backend = ttk.Combobox(f_cache, values=["json", "sqlite", "tiered"], width=7, state="readonly")
+        self.cmb_cache_backend.current(0)
+        self.cmb_cache_backend.pack(side="left", padx=5)
+        ToolTip(self.cmb_cache_backend, "json: file unico caricato in memoria. sqlite: database su disco con salvataggi incrementali (consigliato per cache molto grandi). tiered: database SQLite con LRU in memoria e filtro di Bloom, per translation memory da milioni di voci su macchine con poca RAM. Un file .json indicato con backend sqlite viene importato automaticamente.")
 
     # --- PAGE TOOLS ---
     def _build_page_tools(self, parent):
@@ -536,6 +695,11 @@ class AlumenGUI:
         
         self.btn_show_stats = ttk.Button(f_head, text="📊 MOSTRA STATS", command=self._show_stats_window)
         self.btn_show_stats.pack(side="right", padx=(0, 10))
+        self.cmb_log_level = ttk.Combobox(f_head, values=list(GUI_LOG_FILTERS), width=8, state="readonly")
+        self.cmb_log_level.current(0)
+        self.cmb_log_level.bind("<<ComboboxSelected>>", lambda e: self.log_view.set_filter(GUI_LOG_FILTERS[self.cmb_log_level.get()]))
+        ToolTip(self.cmb_log_level, "Mostra solo i messaggi del livello scelto o più gravi.")
+        self.cmb_log_level.pack(side="right", padx=(0, 10))
         self.btn_save_cache = ttk.Button(f_head, text="💾 Salva Cache", command=self._force_save_cache)
         ToolTip(self.btn_save_cache, "Forza il salvataggio immediato della cache su disco.")        
         self.btn_save_cache.pack(side="right")
@@ -549,9 +713,8 @@ class AlumenGUI:
         self.lbl_stats_cache.pack(side="left", padx=20)
         frame_log = tk.Frame(container, bg="#bdc3c7", bd=1)
         frame_log.pack(fill="both", expand=True)
-        self.txt_log = scrolledtext.ScrolledText(frame_log, state='disabled', font=("Consolas", 10), 
-                                                 bg="#1e272e", fg="#ecf0f1", relief="flat", padx=10, pady=10)
-        self.txt_log.pack(fill="both", expand=True)
+        self.log_view = LogView(frame_log, font=("Consolas", 10), bg="#1e272e", fg="#ecf0f1", relief="flat", padx=10, pady=10)
+        self.log_view.pack(fill="both", expand=True)
         f_act = tk.Frame(container, bg=COLOR_BG_MAIN, pady=20)
         f_act.pack(fill="x")
         self.btn_run = ttk.Button(f_act, text="▶  AVVIA", style='Action.TButton', command=self._start_process)
@@ -576,6 +739,7 @@ class AlumenGUI:
         state_cache = 'normal' if self.var_cache.get() else 'disabled'
         self.ent_cache_file.config(state=state_cache)
         self.btn_cache_browse.config(state=state_cache)
+        self.cmb_cache_backend.config(state='readonly' if self.var_cache.get() else 'disabled')
         self.btn_save_cache.config(state=state_cache)
         
         if self.var_file_ctx.get(): self.cb_full_sample.config(state='normal')
@@ -676,13 +840,17 @@ class AlumenGUI:
             if isinstance(entry_field, PlaceholderEntry): entry_field.set_text(f)
             else: entry_field.delete(0, tk.END); entry_field.insert(0, f)
     def _poll_log_queue(self):
-        while not self.log_queue.empty():
-            msg = self.log_queue.get_nowait()
-            self.txt_log.configure(state='normal')
-            self.txt_log.insert(tk.END, msg + "\n")
-            self.txt_log.see(tk.END)
-            self.txt_log.configure(state='disabled')
-        self.root.after(100, self._poll_log_queue)
+        # Svuota la coda a blocchi e ridisegna una volta sola per tick; se resta arretrato riparte subito
+        items = []
+        try:
+            while len(items) < GUI_LOG_DRAIN_MAX:
+                msg = self.log_queue.get_nowait()
+                items.append(msg if isinstance(msg, tuple) else (AlumenCore.LOG_INFO, msg))
+        except queue.Empty: pass
+        if items:
+            self.log_view.append(items)
+            self.log_view.render()
+        self.root.after(1 if len(items) >= GUI_LOG_DRAIN_MAX else GUI_LOG_POLL_MS, self._poll_log_queue)
     def _update_stats(self):
         files = AlumenCore.total_files_translated
         entries = AlumenCore.total_entries_translated
@@ -764,7 +932,10 @@ class AlumenGUI:
         a.output_dir = self.ent_output.get()
         a.file_type = self.cmb_fmt.get()
         a.source_lang = self.ent_src.get()
-        a.target_lang = self.ent_tgt.get()
+        # Più lingue separate da virgola: una cartella di output per lingua (--target-langs)
+        tgt = self.ent_tgt.get()
+        a.target_langs = tgt if ',' in tgt else None
+        a.target_lang = tgt.split(',')[0].strip()
         val = self.ent_encoding.get_valid_value()
         a.encoding = val if val else "utf-8"
         a.game_name = self.ent_gamename.get_valid_value()
@@ -777,7 +948,10 @@ class AlumenGUI:
         a.json_keys = self.ent_jkeys.get_valid_value()
         a.match_full_json_path = self.var_jmatch.get()
         a.glossary = self.ent_gloss.get()
+        a.glossary_filter = self.var_glossary_filter.get()
         a.cache_file = self.ent_cache_file.get()
+        a.cache_backend = self.cmb_cache_backend.get()
+        a.import_cache = None
         a.custom_prompt = self.ent_prompt.get_valid_value()
         a.prompt_context = self.ent_pctx.get_valid_value()
         val_nl = self.ent_newline.get_valid_value()
@@ -786,6 +960,12 @@ class AlumenGUI:
         except: a.batch_size = 30
         try: a.rpm = int(self.ent_rpm.get_valid_value())
         except: a.rpm = None
+        try: a.tpm = int(self.ent_tpm.get_valid_value())
+        except: a.tpm = None
+        try: a.concurrency = int(self.ent_concurrency.get_valid_value())
+        except: a.concurrency = 1
+        try: a.parse_workers = int(self.ent_parse_workers.get_valid_value())
+        except: a.parse_workers = 0
         try: a.wrap_at = int(self.ent_wrap.get_valid_value())
         except: a.wrap_at = None
         try: a.context_window = int(self.ent_ctxwin.get_valid_value())
@@ -803,10 +983,17 @@ class AlumenGUI:
         a.telegram = self.var_tg_enabled.get()
         a.resume = self.var_resume.get()
         a.enable_file_log = self.var_filelog.get()
+        a.log_level = "debug" if self.var_debug_log.get() else "info"
         a.enable_file_context = self.var_file_ctx.get()
         a.full_context_sample = self.var_full_sample.get()
         a.reflect = self.var_reflect.get()
         a.fuzzy_match = self.var_fuzzy.get()
+        a.adaptive_batch = self.var_adaptive.get()
+        a.stream = self.var_stream.get()
+        a.global_dedup = self.var_global_dedup.get()
+        a.pipeline = self.var_pipeline.get()
+        a.async_engine = self.var_async.get()
+        a.context_cache = 'gemini' if self.var_context_cache.get() else None
         try: a.fuzzy_threshold = int(self.ent_fuzzy_threshold.get_valid_value())
         except: a.fuzzy_threshold = 90
         a.interactive = False # La GUI non è interattiva in senso CLI
@@ -825,9 +1012,7 @@ class AlumenGUI:
         self.btn_pause.config(state='normal', text="⏸ PAUSA", style='Warn.TButton')
         self.btn_skip_file.config(state='normal')
         self.btn_skip_api.config(state='normal')
-        self.txt_log.configure(state='normal')
-        self.txt_log.delete(1.0, tk.END)
-        self.txt_log.configure(state='disabled')
+        self.log_view.clear()
         self._show_frame("log")
         t = threading.Thread(target=AlumenCore.run_core_process, args=(a, self.log_queue, self.stop_event, self.pause_event, self.skip_event, self.skip_api_event), daemon=True)
         t.start()
@@ -838,10 +1023,11 @@ class AlumenGUI:
         a = Args()
         a.game_name = self.ent_gamename.get_valid_value() if self.ent_gamename.get_valid_value() else "un videogioco generico"
         a.source_lang = self.ent_src.get()
-        a.target_lang = self.ent_tgt.get()
+        a.target_lang = self.ent_tgt.get().split(',')[0].strip()
         a.custom_prompt = self.ent_prompt.get_valid_value()
         a.prompt_context = self.ent_pctx.get_valid_value()
         a.glossary = self.ent_gloss.get()
+        a.glossary_filter = self.var_glossary_filter.get()
         a.enable_file_context = self.var_file_ctx.get()
         try: a.context_window = int(self.ent_ctxwin.get_valid_value())
         except: a.context_window = 0
@@ -863,7 +1049,7 @@ class AlumenGUI:
         stats_text = AlumenCore._get_full_stats_text(is_telegram=False, for_gui=True)
         top = tk.Toplevel(self.root)
         top.title("Statistiche Dettagliate")
-        top.geometry("700x500")
+        top.geometry("760x720")
         top.configure(bg="#1e272e")
         st = scrolledtext.ScrolledText(top, bg="#1e272e", fg="#fafafa", font=("Consolas", 10), padx=15, pady=15, relief="flat")
         st.pack(fill="both", expand=True)
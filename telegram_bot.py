@@ -3,6 +3,9 @@ import json
 import threading
 import asyncio
 import sys
+import re
+import time
+from collections import deque
 from telegram import Update
 from telegram.ext import Application, MessageHandler, filters, ContextTypes, JobQueue
 
@@ -16,6 +19,118 @@ except ImportError:
 # --- Globali ---
 bot_app = None
 CHAT_ID = None
+notifier = None
+
+TELEGRAM_DIGEST_INTERVAL = 60   # secondi tra due riepiloghi
+TELEGRAM_MIN_INTERVAL = 3       # distanza minima tra due messaggi (Telegram limita i messaggi per chat)
+TELEGRAM_DIGEST_EVENTS = 8      # eventi più recenti riportati nel riepilogo
+TELEGRAM_MAX_MESSAGE = 4000     # il limite di Telegram è 4096 caratteri
+MARKUP_RE = re.compile(r"\[/?[a-z][a-z #0-9]*\]")
+
+# --- Notifiche ---
+class TelegramNotifier:
+    """
+    Raccoglie gli eventi del log e li invia come riepiloghi periodici (avanzamento, velocità, ETA,
+    errori e ultimi eventi rilevanti). notify() si limita ad aggiornare contatori sotto lock, l'invio
+    avviene in un thread dedicato con al massimo un messaggio ogni TELEGRAM_MIN_INTERVAL secondi.
+    Uno stop (🛑) anticipa il riepilogo.
+    """
+    def __init__(self, engine, digest_interval=TELEGRAM_DIGEST_INTERVAL, min_interval=TELEGRAM_MIN_INTERVAL):
+        self.engine = engine
+        self.digest_interval = digest_interval
+        self.min_interval = min_interval
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.closed = False
+        self.events = deque(maxlen=TELEGRAM_DIGEST_EVENTS)
+        self.problems = deque(maxlen=TELEGRAM_DIGEST_EVENTS)   # errori e avvisi: hanno la precedenza nel riepilogo
+        self.outbox = deque()
+        self.new_events = self.errors = self.warnings = 0
+        self.total_errors = self.total_warnings = 0
+        self.urgent = False
+        self.start_time = self.last_digest = time.time()
+        self.last_send = 0
+        self.last_files = self.last_entries = 0
+        self.thread = threading.Thread(target=self._run, name="alumen-telegram", daemon=True)
+        self.thread.start()
+
+    def notify(self, message, level=None, notable=False):
+        """Registra un messaggio di log: errori e avvisi vengono contati, i messaggi rilevanti finiscono nel riepilogo."""
+        if level is None: level = AlumenCore.LOG_INFO
+        if not (notable or level >= AlumenCore.LOG_WARNING or "🛑" in message or "✅" in message): return
+        with self.lock:
+            if level >= AlumenCore.LOG_ERROR: self.errors += 1; self.total_errors += 1
+            elif level >= AlumenCore.LOG_WARNING: self.warnings += 1; self.total_warnings += 1
+            (self.problems if level >= AlumenCore.LOG_WARNING else self.events).append(MARKUP_RE.sub("", message).strip())
+            self.new_events += 1
+            if "🛑" in message: self.urgent = True
+        if self.urgent: self.wake.set()
+
+    def send(self, text):
+        """Accoda un messaggio diretto: i messaggi in attesa vengono uniti in un solo invio."""
+        with self.lock: self.outbox.append(text)
+        self.wake.set()
+
+    def _run(self):
+        while not self.closed:
+            self.wake.wait(max(0, self.last_digest + self.digest_interval - time.time()))
+            self.wake.clear()
+            # Limite di frequenza: eventi arrivati durante l'attesa confluiscono nello stesso messaggio
+            while not self.closed and time.time() - self.last_send < self.min_interval: time.sleep(0.2)
+            if self.closed: break
+            text = self._collect(force_digest=time.time() - self.last_digest >= self.digest_interval)
+            if text: self._deliver(text)
+
+    def _collect(self, force_digest=False):
+        with self.lock:
+            parts = list(self.outbox)
+            self.outbox.clear()
+            if force_digest or self.urgent:
+                digest = self._digest()
+                if digest: parts.append(digest)
+        return "\n\n".join(parts)[:TELEGRAM_MAX_MESSAGE]
+
+    def _digest(self):
+        """Riepilogo dall'ultimo invio; None se non è cambiato nulla."""
+        eng, now = self.engine, time.time()
+        files, entries = eng.total_files_translated, eng.total_entries_translated
+        d_files, d_entries = files - self.last_files, entries - self.last_entries
+        if not (d_files or d_entries or self.new_events):
+            # Anche senza novità il prossimo riepilogo slitta di un intervallo, altrimenti _run non attende più
+            self.last_digest = now
+            return None
+        span = max(1e-9, now - self.last_digest)
+        lines = [f"📬 *Riepilogo Alumen* (ultimi {AlumenCore._format_duration(span)})"]
+        files_total = getattr(eng, 'files_total', 0)
+        lines.append(f"📄 File: `{files}{f'/{files_total}' if files_total else ''}` (+{d_files}) | Voci: `{entries:,}` (+{d_entries:,})")
+        lines.append(f"⚡ Velocità: `{d_entries / span * 60:,.0f}` voci/min | `{d_files / span * 60:.1f}` file/min")
+        elapsed = now - self.start_time
+        if files_total and 0 < files < files_total:
+            lines.append(f"⏳ ETA: `{AlumenCore._format_duration((files_total - files) * elapsed / files)}`")
+        lines.append(f"❌ Errori: `{self.errors}` (totale {self.total_errors}) | ⚠️ Avvisi: `{self.warnings}` (totale {self.total_warnings})")
+        shown = list(self.problems) + list(self.events)[len(self.problems):]
+        if shown:
+            recent = "\n".join(e.replace("```", "'''") for e in shown)
+            lines.append(f"```\n{recent}\n```")
+            if self.new_events > len(shown): lines.append(f"_(+{self.new_events - len(shown)} eventi non mostrati)_")
+        self.events.clear()
+        self.problems.clear()
+        self.new_events = self.errors = self.warnings = 0
+        self.urgent = False
+        self.last_digest, self.last_files, self.last_entries = now, files, entries
+        return "\n".join(lines)
+
+    def _deliver(self, text):
+        self.last_send = time.time()
+        if bot_app and bot_app.job_queue:
+            bot_app.job_queue.run_once(lambda c: c.bot.send_message(chat_id=CHAT_ID, text=text, parse_mode="Markdown"), 0)
+
+    def close(self):
+        """Ferma il thread e restituisce l'ultimo riepilogo ancora da inviare."""
+        self.closed = True
+        self.wake.set()
+        self.thread.join(timeout=2)
+        return self._collect(force_digest=True)
 
 # --- Log Handler ---
 class TelegramLogHandler(logging.Handler):
@@ -26,9 +141,8 @@ class TelegramLogHandler(logging.Handler):
 
     def emit(self, record):
         if any(x in record.name for x in ["httpx", "telegram", "apscheduler"]): return
-        msg = self.format(record)
-        if self.app.job_queue:
-            self.app.job_queue.run_once(lambda c: c.bot.send_message(chat_id=self.cid, text=msg), 0)
+        # I record di logging confluiscono nei riepiloghi come eventi rilevanti
+        if notifier: notifier.notify(self.format(record), record.levelno, notable=True)
 
 # --- Command Processor Interno ---
 def execute_core_command(command: str):
@@ -92,11 +206,14 @@ async def generic_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 # --- Public API ---
 def send_telegram_notification(msg):
-    if bot_app and bot_app.job_queue:
-        bot_app.job_queue.run_once(lambda c: c.bot.send_message(chat_id=CHAT_ID, text=msg, parse_mode="Markdown"), 0)
+    if notifier: notifier.send(msg)
+
+def notify(message, level=None):
+    """Chiamata dal thread di log di AlumenCore per ogni messaggio: non invia nulla direttamente."""
+    if notifier: notifier.notify(message, level)
 
 def start_bot():
-    global bot_app, CHAT_ID
+    global bot_app, CHAT_ID, notifier
     try:
         with open("telegram_config.json", "r") as f:
             cfg = json.load(f)
@@ -110,6 +227,7 @@ def start_bot():
 
     jq = JobQueue()
     bot_app = Application.builder().token(token).job_queue(jq).build()
+    notifier = TelegramNotifier(AlumenCore.current_engine())
 
     # Log redirection
     h = TelegramLogHandler(bot_app, CHAT_ID)
@@ -126,13 +244,18 @@ def start_bot():
     return bot_app
 
 def stop_bot():
-    global bot_app
+    global bot_app, notifier
     if not bot_app: return
     print("Arresto Telegram...")
+    # L'ultimo riepilogo include i messaggi ancora in coda nel thread di log
+    AlumenCore.flush_logs()
+    final = notifier.close() if notifier else ""
+    notifier = None
     
     loop = bot_app.loop
     if loop and loop.is_running():
         async def bye():
+            if final: await bot_app.bot.send_message(chat_id=CHAT_ID, text=final, parse_mode="Markdown")
             await bot_app.bot.send_message(chat_id=CHAT_ID, text="🏁 Script Terminato.")
             await bot_app.shutdown()
         try:
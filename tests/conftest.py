@@ -0,0 +1,35 @@
+import os
+import sys
+import time
+import warnings
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+warnings.filterwarnings("ignore", category=FutureWarning)
+
+import AlumenCore
+
+
+@pytest.fixture
+def make_args(monkeypatch):
+    """Argomenti CLI di default, con gli override passati come keyword."""
+    def build(**overrides):
+        monkeypatch.setattr(sys, "argv", ["AlumenCore.py"])
+        args = AlumenCore.get_cli_args()
+        args.start_time = time.time()
+        for k, v in overrides.items(): setattr(args, k, v)
+        return args
+    return build
+
+
+@pytest.fixture
+def fake_translate(monkeypatch):
+    """Sostituisce translate_batch: ogni testo diventa 'IT:<testo>'. Restituisce la lista dei testi ricevuti."""
+    seen = []
+    def translate_batch(entries, args, stop_event, file_context=None, reset_context=True):
+        for e in entries:
+            seen.append(e['text'])
+            e['callback']("IT:" + e['text'])
+    monkeypatch.setattr(AlumenCore, "translate_batch", translate_batch)
+    return seen
@@ -0,0 +1,85 @@
+import pytest
+
+import AlumenCore
+
+
+def _entries(n, text="x" * 35):
+    return [{'text': text} for _ in range(n)]
+
+
+def _result(latency=1.0, error=None, output_tokens=0, output_chars=0):
+    return {'error': error, 'latency': latency, 'output_tokens': output_tokens, 'output_chars': output_chars}
+
+
+@pytest.fixture
+def engine():
+    return AlumenCore.AlumenEngine()
+
+
+def test_fixed_mode_uses_batch_size_and_ignores_results(engine, make_args):
+    args = make_args(batch_size=4)
+    batcher = engine.call(AlumenCore.AdaptiveBatcher, _entries(10), args)
+    assert [len(engine.call(batcher.next_batch)) for _ in range(3)] == [4, 4, 2]
+    assert not batcher.has_pending()
+    engine.call(batcher.record, 4, _result(error=ValueError("x")))
+    assert batcher.size == 4 and engine.adaptive_batch_state == {}
+
+
+def test_token_limit_caps_the_batch(engine, make_args):
+    args = make_args(batch_size=100)
+    # 3500 caratteri = 1000 token stimati: ne entrano 3 sotto BATCH_TOKEN_LIMIT
+    batcher = engine.call(AlumenCore.AdaptiveBatcher, _entries(5, "x" * 3500), args)
+    assert len(batcher.next_batch()) == AlumenCore.BATCH_TOKEN_LIMIT // 1000
+
+
+def test_oversized_entry_still_gets_its_own_batch(engine, make_args):
+    args = make_args(batch_size=10)
+    batcher = engine.call(AlumenCore.AdaptiveBatcher, _entries(2, "x" * 50000), args)
+    assert len(batcher.next_batch()) == 1
+    assert len(batcher.next_batch()) == 1
+
+
+def test_adaptive_grows_shrinks_and_halves(engine, make_args):
+    args = make_args(batch_size=20)
+    batcher = engine.call(AlumenCore.AdaptiveBatcher, [], args, adaptive=True)
+    engine.call(batcher.record, 20, _result(latency=1.0))
+    assert batcher.size == 25
+    # Batch non pieno: nessuna crescita
+    engine.call(batcher.record, 10, _result(latency=1.0))
+    assert batcher.size == 25
+    engine.call(batcher.record, 25, _result(latency=AlumenCore.ADAPTIVE_TARGET_LATENCY + 1))
+    assert batcher.size == 18
+    engine.call(batcher.record, 18, _result(error=ValueError("json")))
+    assert batcher.size == 9 and batcher.failures == 1
+    # Il dimezzamento parte dal batch fallito se più piccolo della dimensione corrente
+    engine.call(batcher.record, 4, _result(error=ValueError("json")))
+    assert batcher.size == 2
+
+
+def test_adaptive_size_is_bounded(engine, make_args):
+    args = make_args(batch_size=1)
+    batcher = engine.call(AlumenCore.AdaptiveBatcher, [], args, adaptive=True)
+    engine.call(batcher.record, 1, _result(error=ValueError("x")))
+    assert batcher.size == 1
+    batcher.size = AlumenCore.ADAPTIVE_MAX_BATCH_SIZE
+    engine.call(batcher.record, batcher.size, _result(latency=0.1))
+    assert batcher.size == AlumenCore.ADAPTIVE_MAX_BATCH_SIZE
+
+
+def test_chars_per_token_calibration(engine, make_args):
+    args = make_args(batch_size=10)
+    batcher = engine.call(AlumenCore.AdaptiveBatcher, [], args, adaptive=True)
+    engine.call(batcher.record, 5, _result(output_tokens=100, output_chars=500))
+    assert batcher.chars_per_token == pytest.approx(0.8 * AlumenCore.ESTIMATED_CHARS_PER_TOKEN + 0.2 * 5)
+
+
+def test_learned_state_is_shared_per_model(engine, make_args):
+    args = make_args(batch_size=20, model_name="gemini-test | descrizione")
+    first = engine.call(AlumenCore.AdaptiveBatcher, [], args, adaptive=True)
+    engine.call(first.record, 20, _result(latency=1.0))
+    assert engine.adaptive_batch_state["gemini-test"]['size'] == 25
+    second = engine.call(AlumenCore.AdaptiveBatcher, [], args, adaptive=True)
+    assert second.size == 25
+    # Un altro motore non vede lo stato appreso
+    other = AlumenCore.AlumenEngine().call(AlumenCore.AdaptiveBatcher, [], args, adaptive=True)
+    assert other.size == 20
@@ -0,0 +1,39 @@
+import json
+
+import AlumenCore
+
+
+def _engines(tmp_path):
+    cache_file = str(tmp_path / "cache.json")
+    parent = AlumenCore.AlumenEngine()
+    parent.active_cache_file = cache_file
+    parent.cache_journal = AlumenCore.CacheJournal(cache_file + ".journal")
+    child = AlumenCore.AlumenEngine(cache=parent.translation_cache)
+    child.active_cache_file, child.cache_journal, child.compact_cache = cache_file, parent.cache_journal, False
+    return parent, child
+
+
+def _journal_keys(journal):
+    with open(journal.path, encoding='utf-8') as f: return [json.loads(line)[0] for line in f]
+
+
+def test_language_engine_only_commits_the_journal(tmp_path, make_args, monkeypatch):
+    monkeypatch.setattr(AlumenCore, "CACHE_COMPACT_JOURNAL_BYTES", 0)
+    parent, child = _engines(tmp_path)
+    args = make_args(persistent_cache=True)
+    child.call(AlumenCore._cache_put, "k1", "v1")
+    child.call(AlumenCore.check_and_save_cache, args)
+    child.call(AlumenCore.check_and_save_cache, args, force=True)
+    # Il journal oltre soglia non fa compattare il motore di una lingua
+    assert not (tmp_path / "cache.json").exists()
+    assert _journal_keys(parent.cache_journal) == ["k1"]
+
+
+def test_parent_compacts_the_shared_cache(tmp_path, make_args):
+    parent, child = _engines(tmp_path)
+    args = make_args(persistent_cache=True)
+    child.call(AlumenCore._cache_put, "k1", "v1")
+    child.call(AlumenCore.check_and_save_cache, args)
+    parent.call(AlumenCore.check_and_save_cache, args, force=True)
+    assert json.loads((tmp_path / "cache.json").read_text(encoding='utf-8')) == {"k1": "v1"}
+    assert parent.cache_journal.size() == 0
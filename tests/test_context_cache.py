@@ -0,0 +1,148 @@
+import types
+
+import google.api_core.exceptions
+import pytest
+
+import AlumenCore
+
+
+class FakeCachedContent:
+    def __init__(self, name, model, log):
+        self.name, self.model, self.log = name, model, log
+    def delete(self):
+        self.log.append(("delete", self.name, self.log.configured[-1]))
+    def update(self, *, ttl=None):
+        if self.log.fail_update: raise google.api_core.exceptions.NotFound("CachedContent not found")
+        self.log.append(("update", self.name, self.log.configured[-1], ttl))
+
+
+class Log(list):
+    configured = None
+    fail_update = False
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = types.SimpleNamespace(now=1000.0)
+    monkeypatch.setattr(AlumenCore, "time", types.SimpleNamespace(time=lambda: fake.now))
+    return fake
+
+
+def _setup(monkeypatch):
+    log = Log()
+    log.configured = []
+    monkeypatch.setattr(AlumenCore.genai, "configure", lambda **kw: log.configured.append(kw["api_key"]))
+    def create(model, *, display_name=None, system_instruction=None, ttl=None):
+        name = f"cachedContents/{len(log)}"
+        log.append(("create", name, log.configured[-1], model, system_instruction))
+        return FakeCachedContent(name, f"models/{model}", log)
+    monkeypatch.setattr(AlumenCore.genai_caching.CachedContent, "create", staticmethod(create))
+    eng = AlumenCore.AlumenEngine()
+    eng.available_api_keys, eng.current_api_key_index = ["k1", "k2"], 0
+    return eng, log
+
+
+def test_upload_once_per_key_under_that_key(monkeypatch):
+    eng, log = _setup(monkeypatch)
+    cc = AlumenCore.GeminiContextCache()
+    handles = eng.call(lambda: [cc.get(k, "gemini-x", "SYS") for k in ("k1", "k2", "k1", "k2")])
+    assert cc.uploads == 2
+    assert [(e[0], e[2], e[4]) for e in log] == [("create", "k1", "SYS"), ("create", "k2", "SYS")]
+    assert handles[0] is handles[2] and handles[1] is handles[3]
+    assert log.configured[-1] == "k1"  # Torna alla chiave corrente del motore
+
+
+def test_model_references_cached_content(monkeypatch):
+    eng, log = _setup(monkeypatch)
+    cc = AlumenCore.GeminiContextCache()
+    handle = eng.call(cc.get, "k2", "gemini-x", "SYS")
+    m = cc.model("gemini-x", handle, "SYS")
+    assert m._cached_content == handle.name
+    assert m.model_name == "models/gemini-x"
+
+
+def test_release_deletes_each_content_with_its_key(monkeypatch):
+    eng, log = _setup(monkeypatch)
+    cc = AlumenCore.GeminiContextCache()
+    eng.call(lambda: [cc.get(k, "gemini-x", "SYS") for k in ("k1", "k2")])
+    eng.call(cc.release)
+    assert sorted(e[2] for e in log if e[0] == "delete") == ["k1", "k2"]
+    assert cc.handles == {}
+
+
+def test_local_cache_keeps_instruction_on_model():
+    cc = AlumenCore.LocalContextCache()
+    handle = cc.get("k1", "gemini-x", "SYS")
+    assert cc.get("k1", "gemini-x", "SYS") == handle and cc.uploads == 1
+    assert cc.model("gemini-x", handle, "SYS")._system_instruction is not None
+
+
+def test_ttl_is_extended_before_expiry(monkeypatch, clock):
+    eng, log = _setup(monkeypatch)
+    cc = AlumenCore.GeminiContextCache(ttl=600)
+    handle = eng.call(cc.get, "k1", "gemini-x", "SYS")
+    clock.now += 600 - AlumenCore.CONTEXT_CACHE_REFRESH_MARGIN - 1
+    assert eng.call(cc.refresh, "k1") is False and cc.refreshes == 0
+    clock.now += 2
+    assert eng.call(cc.refresh, "k1") is False
+    assert log[-1] == ("update", handle.name, "k1", 600) and cc.refreshes == 1
+    assert cc.expires[("k1", "gemini-x")] == clock.now + 600
+    assert eng.call(cc.get, "k1", "gemini-x", "SYS") is handle and cc.uploads == 1
+
+
+def test_failed_extension_drops_the_handle_for_a_new_upload(monkeypatch, clock):
+    eng, log = _setup(monkeypatch)
+    log.fail_update = True
+    cc = AlumenCore.GeminiContextCache(ttl=600)
+    first = eng.call(cc.get, "k1", "gemini-x", "SYS")
+    clock.now += 600
+    assert eng.call(cc.refresh, "k1") is True and cc.handles == {}
+    assert eng.call(cc.get, "k1", "gemini-x", "SYS") is not first and cc.uploads == 2
+
+
+def test_dropped_handle_rebuilds_the_key_model(make_args, monkeypatch, clock):
+    eng = AlumenCore.AlumenEngine()
+    eng.system_instruction = "SYS"
+    eng.context_cache = cc = AlumenCore.LocalContextCache(ttl=600)
+    args = make_args()
+    first = eng.call(AlumenCore._get_model_for_key, "k1", args)
+    assert eng.call(AlumenCore._get_model_for_key, "k1", args) is first
+    def expired(api_key, handle): raise RuntimeError("scaduto")
+    monkeypatch.setattr(cc, "_extend", expired)
+    clock.now += 600
+    assert eng.call(AlumenCore._get_model_for_key, "k1", args) is not first and cc.uploads == 2
+
+
+class FakeModel:
+    def __init__(self, error=None):
+        self.error, self.prompts = error, []
+    def generate_content(self, prompt):
+        self.prompts.append(prompt)
+        if self.error: raise self.error
+        return types.SimpleNamespace(text=" ok ", usage_metadata=None)
+
+
+def test_expired_content_is_retried_without_cache_and_not_blamed_on_the_key(make_args, monkeypatch):
+    eng = AlumenCore.AlumenEngine()
+    eng.available_api_keys, eng.api_call_counts = ["k1"], {"k1": 0}
+    eng.context_cache = cc = AlumenCore.LocalContextCache()
+    eng.call(cc.get, "k1", "gemini-x", "SYS")
+    eng.key_models["k1"] = cached = FakeModel(google.api_core.exceptions.BadRequest("400 Cache content 123 is expired."))
+    plain = FakeModel()
+    monkeypatch.setattr(AlumenCore, "_get_model_for_key", lambda key, args: eng.key_models.get(key, cached))
+    monkeypatch.setattr(AlumenCore, "_plain_model_for_key", lambda key, args, kind='generative': plain)
+    rotations = []
+    monkeypatch.setattr(AlumenCore, "rotate_key", lambda *a: rotations.append(a))
+    assert eng.call(AlumenCore.call_ai_raw, "prompt", make_args()) == "ok"
+    assert plain.prompts == ["prompt"] and rotations == []
+    assert cc.handles == {} and "k1" not in eng.key_models
+    assert eng.telemetry.snapshot().get('counters', {}).get('request_errors_total', 0) == 0
+
+
+def test_other_errors_still_propagate(make_args, monkeypatch):
+    eng = AlumenCore.AlumenEngine()
+    eng.available_api_keys, eng.api_call_counts = ["k1"], {"k1": 0}
+    eng.context_cache = AlumenCore.LocalContextCache()
+    monkeypatch.setattr(AlumenCore, "_get_model_for_key", lambda key, args: FakeModel(RuntimeError("boom")))
+    with pytest.raises(RuntimeError) as info: eng.call(AlumenCore._generate, "prompt", make_args())
+    assert info.value.alumen_api_key == "k1"
@@ -0,0 +1,132 @@
+import json
+from collections import deque
+
+import pytest
+
+import AlumenCore
+
+
+def test_key_is_compact_and_depends_on_every_part():
+    key = AlumenCore.ContextKeyTier.key("Open", "en", "it", "ctx")
+    assert len(key) == 32
+    assert key == AlumenCore.ContextKeyTier.key("Open", "en", "it", "ctx")
+    others = {AlumenCore.ContextKeyTier.key(*parts) for parts in
+              [("Open", "en", "it", "ctx2"), ("Open", "en", "fr", "ctx"), ("Open ", "en", "it", "ctx"), ("Open\x00en", "it", "", "ctx")]}
+    assert key not in others and len(others) == 4
+
+
+def test_lru_evicts_least_recently_used():
+    tier = AlumenCore.ContextKeyTier(max_entries=2)
+    tier.put("a", "A")
+    tier.put("b", "B")
+    assert tier.get("a") == "A"
+    tier.put("c", "C")
+    assert tier.get("b") is None and tier.get("a") == "A" and tier.get("c") == "C"
+    assert len(tier) == 2 and tier.evictions == 1
+
+
+def test_save_and_load_round_trip(tmp_path):
+    path = str(tmp_path / ("cache.json" + AlumenCore.CONTEXT_TIER_SUFFIX))
+    tier = AlumenCore.ContextKeyTier()
+    tier.put("a", "Apri")
+    tier.put("b", "Chiudi")
+    tier.save(path)
+    # Caricato in un livello più piccolo restano le voci più recenti
+    small = AlumenCore.ContextKeyTier(max_entries=1)
+    small.load(path)
+    assert small.get("b") == "Chiudi" and small.get("a") is None
+
+
+def test_load_ignores_missing_or_corrupt_file(tmp_path):
+    tier = AlumenCore.ContextKeyTier()
+    tier.load(str(tmp_path / "assente.json"))
+    bad = tmp_path / "rotto.json"
+    bad.write_text("{troncato", encoding='utf-8')
+    tier.load(str(bad))
+    assert len(tier) == 0
+
+
+@pytest.fixture
+def legacy(monkeypatch, make_args):
+    eng = AlumenCore.AlumenEngine()
+    eng.context_tier = AlumenCore.ContextKeyTier()
+    calls = []
+    def call_ai_raw(prompt, args):
+        calls.append(prompt)
+        return "IT:" + prompt.split("Testo originale:\n", 1)[1].split("\n\n", 1)[0]
+    monkeypatch.setattr(AlumenCore, "call_ai_raw", call_ai_raw)
+    def run(text, file_context=None):
+        out = []
+        eng.call(AlumenCore._translate_single_entry_legacy, {'text': text, 'callback': out.append}, make_args(source_lang="en", target_lang="it"), file_context)
+        return out[0]
+    return eng, calls, run
+
+
+def test_contextual_entries_live_only_in_the_tier(legacy):
+    eng, calls, run = legacy
+    assert run("Open", file_context="menu") == "IT:Open"
+    assert len(eng.context_tier) == 1 and len(eng.translation_cache) == 0
+    assert run("Open", file_context="menu") == "IT:Open"
+    assert len(calls) == 1 and eng.cache_hit_count == 1
+
+
+def test_contextual_lookup_falls_back_to_generic_entry_without_promotion(legacy):
+    eng, calls, run = legacy
+    assert run("Close") == "IT:Close"
+    assert json.dumps(("Close", "en", "it", ""), ensure_ascii=False) in eng.translation_cache
+    assert run("Close", file_context="menu") == "IT:Close"
+    assert len(calls) == 1 and len(eng.context_tier) == 0
+
+
+def test_cache_hits_do_not_enter_the_context_window(legacy, make_args):
+    eng, calls, run = legacy
+    eng.context_window_deque = deque(maxlen=5)
+    eng.translation_cache[json.dumps(("Open", "en", "it", ""), ensure_ascii=False)] = "Apri"
+    args = make_args(source_lang="en", target_lang="it", context_window=5)
+    eng.call(AlumenCore._translate_single_entry_legacy, {'text': "Open", 'callback': lambda t: None}, args)
+    assert list(eng.context_window_deque) == [] and calls == []
+    eng.call(AlumenCore._translate_single_entry_legacy, {'text': "Close", 'callback': lambda t: None}, args)
+    assert list(eng.context_window_deque) == [("Close", "IT:Close")]
+
+
+LEGACY = {
+    json.dumps(("Open", "en", "it"), ensure_ascii=False): "Apri",
+    json.dumps(("Open", "en", "it", ""), ensure_ascii=False): "Apri",
+    json.dumps(("Open", "en", "it", "Contesto: \"menu\", \"pausa\""), ensure_ascii=False): "Apri (menu)",
+    json.dumps(('Say ", "hi", "', "en", "it"), ensure_ascii=False): "Saluta",
+}
+
+
+def _migrate(tmp_path, cache):
+    eng = AlumenCore.AlumenEngine(cache=cache)
+    eng.context_tier = AlumenCore.ContextKeyTier()
+    eng.active_cache_file = str(tmp_path / "cache.json")
+    return eng, eng.call(AlumenCore._migrate_context_entries)
+
+
+def _context_key():
+    return AlumenCore.ContextKeyTier.key("Open", "en", "it", 'Contesto: "menu", "pausa"')
+
+
+def test_legacy_context_keys_move_out_of_the_json_cache(tmp_path):
+    cache = dict(LEGACY)
+    eng, moved = _migrate(tmp_path, cache)
+    assert moved == 1 and len(cache) == 3
+    assert eng.context_tier.get(_context_key()) == "Apri (menu)"
+    # Il livello viene salvato subito: la cache principale perde le voci alla prima compattazione
+    reloaded = AlumenCore.ContextKeyTier()
+    reloaded.load(str(tmp_path / ("cache.json" + AlumenCore.CONTEXT_TIER_SUFFIX)))
+    assert reloaded.get(_context_key()) == "Apri (menu)"
+    assert _migrate(tmp_path, cache)[1] == 0
+
+
+@pytest.mark.parametrize("store_cls", [AlumenCore.SQLiteCacheStore, AlumenCore.TieredCacheStore])
+def test_legacy_context_keys_move_out_of_sqlite(tmp_path, store_cls):
+    store = store_cls(str(tmp_path / "cache.sqlite"))
+    store.update_many(LEGACY.items())
+    eng, moved = _migrate(tmp_path, store)
+    assert moved == 1 and len(store) == 2
+    assert store.get(json.dumps(("Open", "en", "it"), ensure_ascii=False)) == "Apri"
+    assert eng.context_tier.get(_context_key()) == "Apri (menu)"
+    assert list(store.conn.execute("SELECT COUNT(*) FROM translations WHERE context != ''")) == [(0,)]
+    store.close()
@@ -0,0 +1,99 @@
+import codecs
+import csv
+import io
+from threading import Event
+
+import pytest
+
+import AlumenCore
+
+
+def _write_csv(path, rows, encoding):
+    buf = io.StringIO()
+    csv.writer(buf).writerows(rows)
+    path.write_bytes(buf.getvalue().encode(encoding))
+
+
+ROWS = [["id", "text", "out"]] + [[str(i), f"line {i}", ""] for i in range(10)]
+EXPECTED = [ROWS[0]] + [[r[0], r[1], "IT:" + r[1]] for r in ROWS[1:]]
+
+
+def _read(path, encoding):
+    data = path.read_bytes()
+    return data, list(csv.reader(io.StringIO(data.decode(encoding))))
+
+
+@pytest.fixture
+def stream_args(make_args, monkeypatch):
+    monkeypatch.setattr(AlumenCore, "STREAM_CHUNK_ROWS", 3)
+    return lambda encoding, **kw: make_args(encoding=encoding, translate_col=1, output_col=2, delimiter=",", stream=True, **kw)
+
+
+@pytest.mark.parametrize("encoding, bom", [("utf-8-sig", codecs.BOM_UTF8), ("utf-16", codecs.BOM_UTF16)])
+def test_bom_written_once_across_chunks(tmp_path, stream_args, fake_translate, encoding, bom):
+    src, out = tmp_path / "in.csv", tmp_path / "out.csv"
+    _write_csv(src, ROWS, encoding)
+    AlumenCore.process_csv_stream(str(src), str(out), stream_args(encoding), Event())
+    data, rows = _read(out, encoding)
+    assert data.startswith(bom) and data.count(bom) == 1
+    assert rows == EXPECTED
+    assert not (tmp_path / "out.csv.progress").exists()
+
+
+@pytest.mark.parametrize("encoding, bom", [("utf-8-sig", codecs.BOM_UTF8), ("utf-16", codecs.BOM_UTF16)])
+def test_resume_continues_without_second_bom(tmp_path, stream_args, monkeypatch, encoding, bom):
+    src, out = tmp_path / "in.csv", tmp_path / "out.csv"
+    _write_csv(src, ROWS, encoding)
+    stop = Event()
+    calls = []
+    def translate_batch(entries, args, stop_event, file_context=None, reset_context=True):
+        calls.append([e['text'] for e in entries])
+        for e in entries: e['callback']("IT:" + e['text'])
+        if len(calls) == 2: stop.set() # Interrompe durante il secondo blocco: resta scritto solo il primo
+    monkeypatch.setattr(AlumenCore, "translate_batch", translate_batch)
+    AlumenCore.process_csv_stream(str(src), str(out), stream_args(encoding), stop)
+    assert AlumenCore._load_stream_progress(str(out) + ".progress")['rows'] == 3
+
+    calls.clear()
+    AlumenCore.process_csv_stream(str(src), str(out), stream_args(encoding, resume=True), Event())
+    assert calls[0] == ["line 2", "line 3", "line 4"]
+    data, rows = _read(out, encoding)
+    assert data.count(bom) == 1
+    assert rows == EXPECTED
+
+
+def test_resume_skips_completed_file(tmp_path, stream_args, fake_translate):
+    src, out = tmp_path / "in.csv", tmp_path / "out.csv"
+    _write_csv(src, ROWS, "utf-8")
+    AlumenCore.process_csv_stream(str(src), str(out), stream_args("utf-8"), Event())
+    fake_translate.clear()
+    AlumenCore.process_csv_stream(str(src), str(out), stream_args("utf-8", resume=True), Event())
+    assert fake_translate == []
+
+
+@pytest.mark.parametrize("encoding, bom", [("utf-8", b""), ("utf-16", codecs.BOM_UTF16)])
+def test_stop_in_first_chunk_is_resumed_from_scratch(tmp_path, stream_args, monkeypatch, encoding, bom):
+    src, out = tmp_path / "in.csv", tmp_path / "out.csv"
+    _write_csv(src, ROWS, encoding)
+    stop = Event()
+    seen = []
+    def translate_batch(entries, args, stop_event, file_context=None, reset_context=True):
+        if not stop_event.is_set() and not seen: stop.set(); seen.append(None); return
+        for e in entries: seen.append(e['text']); e['callback']("IT:" + e['text'])
+    monkeypatch.setattr(AlumenCore, "translate_batch", translate_batch)
+    AlumenCore.process_csv_stream(str(src), str(out), stream_args(encoding), stop)
+    assert out.read_bytes() == b""
+    assert AlumenCore._load_stream_progress(str(out) + ".progress") == {'rows': 0, 'bytes': 0}
+
+    AlumenCore.process_csv_stream(str(src), str(out), stream_args(encoding, resume=True), Event())
+    data, rows = _read(out, encoding)
+    assert data.startswith(bom) and rows == EXPECTED and len(seen) == 1 + 10
+
+
+def test_empty_output_without_progress_is_not_treated_as_complete(tmp_path, stream_args, fake_translate):
+    # Output lasciato vuoto da una versione precedente interrotta nel primo blocco
+    src, out = tmp_path / "in.csv", tmp_path / "out.csv"
+    _write_csv(src, ROWS, "utf-8")
+    out.write_bytes(b"")
+    AlumenCore.process_csv_stream(str(src), str(out), stream_args("utf-8", resume=True), Event())
+    assert _read(out, "utf-8")[1] == EXPECTED
@@ -0,0 +1,84 @@
+import random
+import time
+
+import pytest
+from rapidfuzz import fuzz as rf_fuzz, process as rf_process
+from thefuzz import fuzz
+
+import AlumenCore
+
+
+def _corpus(seed=7, n=3000):
+    rnd = random.Random(seed)
+    words = "the of sword shield potion magic dragon fire ice king queen castle open close door key gold".split()
+    docs = {" ".join(rnd.choice(words) for _ in range(rnd.randint(1, 8))).capitalize() + rnd.choice(["", ".", "!"]) for _ in range(n)}
+    return rnd, sorted(docs)
+
+
+def _mutate(rnd, text):
+    chars = list(text)
+    for _ in range(rnd.randint(0, 4)):
+        op, i = rnd.random(), rnd.randrange(len(chars) + 1)
+        if op < 0.4 and i < len(chars): chars[i] = rnd.choice("abcdefg ")
+        elif op < 0.7: chars.insert(i, rnd.choice("xyz"))
+        elif i < len(chars): del chars[i]
+    return "".join(chars) or "x"
+
+
+@pytest.mark.parametrize("threshold", [70, 80, 90, 95])
+def test_best_match_equals_brute_force(threshold):
+    rnd, docs = _corpus()
+    index = AlumenCore.FuzzyIndex(threshold)
+    for d in docs: index.add(d)
+    for _ in range(150):
+        query = _mutate(rnd, rnd.choice(docs))
+        best = max(fuzz.ratio(query, d) for d in docs)
+        text, score = index.best_match(query)
+        assert score == (best if best >= threshold else 0)
+        if text is not None: assert fuzz.ratio(query, text) == score
+
+
+def test_texts_added_after_a_lookup_are_found():
+    index = AlumenCore.FuzzyIndex(90)
+    for d in ("Open the golden door", "Open the iron door", "Close the golden door"): index.add(d)
+    assert index.best_match("Open the golden doors") == ("Open the golden door", 98)
+    index.add("Open the golden doors")
+    index.add("Open the wooden doors!")
+    assert index.best_match("Open the golden doors") == ("Open the golden doors", 100)
+    assert index.best_match("Open the wooden doors") == ("Open the wooden doors!", 98)
+
+
+def test_200k_entries_exact_and_fast():
+    rnd = random.Random(3)
+    words = ["".join(rnd.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(rnd.randint(2, 8))) for _ in range(20)]
+    docs = set()
+    while len(docs) < 200_000: docs.add(" ".join(rnd.choice(words) for _ in range(rnd.randint(2, 10))))
+    docs = sorted(docs)
+    index = AlumenCore.FuzzyIndex(90)
+    for d in docs: index.add(d)
+    queries = [_mutate(rnd, rnd.choice(docs)) for _ in range(100)] + [" ".join(rnd.choice(words) for _ in range(rnd.randint(2, 10))) for _ in range(100)]
+    results = [index.best_match(q) for q in queries]   # la prima passata indicizza le fasce
+    for query, (_, score) in list(zip(queries, results))[::10]:
+        best = round(rf_process.extractOne(query, docs, scorer=rf_fuzz.ratio)[1])
+        assert score == (best if best >= 90 else 0)
+    start = time.perf_counter()
+    assert [index.best_match(q) for q in queries] == results
+    # Senza filtro sui caratteri ogni ricerca valutava ~60k testi (8-13 ms)
+    assert (time.perf_counter() - start) / len(queries) < 0.003
+
+
+def test_no_match_below_threshold_and_duplicates_ignored():
+    index = AlumenCore.FuzzyIndex(90)
+    index.add("Open the door")
+    index.add("Open the door")
+    assert len(index.docs) == 1
+    assert index.best_match("Open the door!") == ("Open the door", 96)
+    assert index.best_match("Close the castle gate") == (None, 0)
+    assert index.best_match("") == (None, 0)
+
+
+def test_python_fallback_without_rapidfuzz(monkeypatch):
+    monkeypatch.setattr(AlumenCore, "rf_process", None)
+    index = AlumenCore.FuzzyIndex(85)
+    for d in ("Fire sword", "Ice sword", "Fire shield"): index.add(d)
+    assert index.best_match("Fire swords") == ("Fire sword", fuzz.ratio("Fire swords", "Fire sword"))
@@ -0,0 +1,73 @@
+import json
+import random
+
+import AlumenCore
+
+
+def _brute_force(glossary, text):
+    """Ricerca ingenua di riferimento: ogni occorrenza di ogni termine, con confine di parola ASCII."""
+    low = text.lower()
+    found = {}
+    for term, value in glossary.items():
+        key = term.lower()
+        if not key: continue
+        start = low.find(key)
+        while start != -1:
+            end = start + len(key) - 1
+            before = start > 0 and AlumenCore.GlossaryIndex._joins(low[start - 1], low[start])
+            after = end + 1 < len(low) and AlumenCore.GlossaryIndex._joins(low[end], low[end + 1])
+            if not before and not after:
+                found[term] = value
+                break
+            start = low.find(key, start + 1)
+    return found
+
+
+def test_case_insensitive_whole_words_only():
+    index = AlumenCore.GlossaryIndex({"Mana": "Mana", "HP": "PV", "Fire Ball": "Palla di Fuoco"})
+    assert index.find("Cast a FIRE BALL, it costs mana.") == {"Fire Ball": "Palla di Fuoco", "Mana": "Mana"}
+    assert index.find("manager, HPS, fireball") == {}
+    assert index.find("HP") == {"HP": "PV"}
+
+
+def test_overlapping_and_nested_terms():
+    index = AlumenCore.GlossaryIndex({"he": "1", "she": "2", "hers": "3", "his": "4", "ushers": "5"})
+    assert index.find("ushers") == {"ushers": "5"}
+    assert index.find("she, he and hers") == {"she": "2", "he": "1", "hers": "3"}
+
+
+def test_terms_are_reported_in_order_of_occurrence():
+    index = AlumenCore.GlossaryIndex({"spada": "a", "scudo": "b", "elmo": "c"})
+    assert list(index.find("elmo e scudo, poi spada e di nuovo elmo")) == ["elmo", "scudo", "spada"]
+
+
+def test_non_ascii_neighbours_do_not_block_a_match():
+    # Le lingue senza spazi (e le lettere accentate) non hanno confini di parola ASCII
+    index = AlumenCore.GlossaryIndex({"HP": "PV", "魔法": "magia"})
+    assert index.find("魔法使いのHPが") == {"魔法": "magia", "HP": "PV"}
+    assert index.find("perchéHP") == {"HP": "PV"}
+
+
+def test_empty_terms_and_texts():
+    index = AlumenCore.GlossaryIndex({"": "x", "ok": "va bene"})
+    assert index.find("") == {}
+    assert index.find("ok") == {"ok": "va bene"}
+
+
+def test_matches_brute_force_on_random_texts():
+    rng = random.Random(7)
+    alphabet = "abAB è,.-"
+    glossary = {"".join(rng.choice("abAB") for _ in range(rng.randint(1, 4))) + rng.choice(["", " a", "-b"]): str(i) for i in range(40)}
+    index = AlumenCore.GlossaryIndex(glossary)
+    for _ in range(500):
+        text = "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 30)))
+        assert index.find(text) == _brute_force(glossary, text), text
+
+
+def test_glossary_block_lists_only_terms_in_the_batch():
+    eng = AlumenCore.AlumenEngine()
+    eng.glossary_index = AlumenCore.GlossaryIndex({"Mana": "Mana", "Sword": "Spada"})
+    block = eng.call(AlumenCore._glossary_block, ["Draw your sword", "Run"])
+    assert block == "GLOSSARIO (usa TASSATIVAMENTE):\n" + json.dumps({"Sword": "Spada"}) + "\n"
+    assert eng.call(AlumenCore._glossary_block, ["Run"]) == ""
+    assert AlumenCore.AlumenEngine().call(AlumenCore._glossary_block, ["Draw your sword"]) == ""
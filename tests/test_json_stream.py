@@ -0,0 +1,68 @@
+import json
+from threading import Event
+
+import AlumenCore
+
+
+def _scan(path, args, keys):
+    return [value for _, _, value in AlumenCore._scan_json_strings(str(path), args, keys)]
+
+
+def test_scan_skips_bare_literals(tmp_path, make_args):
+    src = tmp_path / "in.json"
+    src.write_text('{"a": 1, "text": "x", "b": [true, null, 2.5], "c": {"text": "y", "n": -3e2}, "d": false}', encoding="utf-8")
+    args = make_args(match_full_json_path=False)
+    assert _scan(src, args, {"text"}) == ["x", "y"]
+
+
+def test_scan_full_path_through_arrays(tmp_path, make_args):
+    src = tmp_path / "in.json"
+    src.write_text('{"list": [1, {"text": "a"}, null, {"text": "b"}], "text": "c"}', encoding="utf-8")
+    args = make_args(match_full_json_path=True)
+    assert _scan(src, args, {"list[1].text", "list[3].text"}) == ["a", "b"]
+
+
+def test_scan_tokens_split_across_read_blocks(tmp_path, make_args, monkeypatch):
+    monkeypatch.setattr(AlumenCore, "STREAM_READ_CHARS", 7)
+    data = {"text": "alpha beta", "n": 123456789, "items": [{"text": "gamma"}, True, None]}
+    src = tmp_path / "in.json"
+    src.write_text(json.dumps(data), encoding="utf-8")
+    args = make_args(match_full_json_path=False)
+    assert _scan(src, args, {"text"}) == ["alpha beta", "gamma"]
+
+
+def test_stream_rewrite_keeps_formatting_and_crlf(tmp_path, make_args, fake_translate):
+    raw = '{\r\n  "a": 1,\r\n  "text": "x",\r\n  "b": [true, null, 2.5],\r\n  "text2": "not me"\r\n}\r\n'
+    src, out = tmp_path / "in.json", tmp_path / "out.json"
+    src.write_bytes(raw.encode("utf-8"))
+    args = make_args(json_keys="text", match_full_json_path=False)
+    AlumenCore.process_json_stream(str(src), str(out), args, Event())
+    assert out.read_bytes() == raw.replace('"x"', '"IT:x"').encode("utf-8")
+    assert fake_translate == ["x"]
+
+
+def test_stopped_stream_writes_no_output_and_is_redone_on_resume(tmp_path, make_args, monkeypatch):
+    src, out = tmp_path / "in.json", tmp_path / "out.json"
+    src.write_text('{"text": "x", "list": [{"text": "y"}]}', encoding="utf-8")
+    stop = Event()
+    def translate_batch(entries, args, stop_event, file_context=None, reset_context=True):
+        entries[0]['callback']("IT:" + entries[0]['text'])
+        stop.set()
+    monkeypatch.setattr(AlumenCore, "translate_batch", translate_batch)
+    args = make_args(json_keys="text", match_full_json_path=False, stream=True, resume=True)
+    AlumenCore.process_json(str(src), str(out), args, stop)
+    assert not out.exists() and not (tmp_path / "out.json.tmp").exists()
+
+    monkeypatch.setattr(AlumenCore, "translate_batch", lambda entries, *a, **kw: [e['callback']("IT:" + e['text']) for e in entries])
+    AlumenCore.process_json(str(src), str(out), args, Event())
+    assert json.loads(out.read_text(encoding="utf-8")) == {"text": "IT:x", "list": [{"text": "IT:y"}]}
+
+
+def test_no_file_context_call_without_strings(tmp_path, make_args, fake_translate, monkeypatch):
+    calls = []
+    monkeypatch.setattr(AlumenCore, "generate_file_context", lambda *a: calls.append(a))
+    src, out = tmp_path / "in.json", tmp_path / "out.json"
+    src.write_text('{"id": 1, "text": "42"}', encoding="utf-8")
+    args = make_args(json_keys="text", match_full_json_path=False, enable_file_context=True)
+    AlumenCore.process_json_stream(str(src), str(out), args, Event())
+    assert calls == [] and out.read_text(encoding="utf-8") == '{"id": 1, "text": "42"}'
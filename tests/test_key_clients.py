@@ -0,0 +1,40 @@
+import AlumenCore
+
+
+def _api_key_of(client):
+    return client.transport._credentials.token
+
+
+def test_each_model_uses_its_own_key(make_args):
+    args = make_args()
+    eng = AlumenCore.AlumenEngine()
+    m1, m2, again = eng.call(lambda: [AlumenCore._get_model_for_key(k, args) for k in ("key-one", "key-two", "key-one")])
+    assert _api_key_of(m1._client) == "key-one"
+    assert _api_key_of(m2._client) == "key-two"
+    assert again is m1
+    assert set(eng.key_clients) == {("key-one", "generative"), ("key-two", "generative")}
+
+
+def test_unverified_sdk_falls_back_to_global_configure(make_args, monkeypatch):
+    configured = []
+    monkeypatch.setattr(AlumenCore, "GENAI_PER_KEY_CLIENT_VERSIONS", ("0.0.1", "0.0.2"))
+    monkeypatch.setattr(AlumenCore.genai, "configure", lambda **kw: configured.append(kw["api_key"]))
+    args = make_args()
+    eng = AlumenCore.AlumenEngine()
+    m = eng.call(AlumenCore._get_model_for_key, "key-one", args)
+    assert configured == ["key-one"]
+    assert m._client is None
+    assert eng.key_clients == {}
+
+
+def test_async_models_use_their_key_and_share_nothing_with_sync(make_args):
+    import asyncio
+    args = make_args()
+    eng = AlumenCore.AlumenEngine()
+    async def build():
+        return [AlumenCore._get_async_model_for_key(k, args) for k in ("key-one", "key-two")]
+    a1, a2 = eng.call(asyncio.run, build())
+    assert _api_key_of(a1._async_client) == "key-one"
+    assert _api_key_of(a2._async_client) == "key-two"
+    assert a1._client is None
+    assert ("key-one", "generative_async") in eng.key_clients and ("key-one", "generative") not in eng.key_clients
@@ -0,0 +1,33 @@
+import threading
+import time
+
+import AlumenCore
+
+
+def test_stop_cancels_queued_parses(tmp_path, make_args, monkeypatch):
+    src_dir = tmp_path / "in"
+    src_dir.mkdir()
+    files = []
+    for k in range(6):
+        path = src_dir / f"f{k}.srt"
+        path.write_text(f"1\n00:00:01,000 --> 00:00:02,000\nLine {k}\n\n", encoding='utf-8')
+        files.append(str(path))
+    parsed = []
+    real_prepare = AlumenCore._prepare_file
+    def prepare(fpath, out, args):
+        parsed.append(fpath)
+        time.sleep(0.05)
+        return real_prepare(fpath, out, args)
+    monkeypatch.setattr(AlumenCore, "_prepare_file", prepare)
+    stop = threading.Event()
+    def translate_batch(entries, args, stop_event, file_context=None, reset_context=True):
+        for e in entries: e['callback']("IT:" + e['text'])
+        stop.set()
+    monkeypatch.setattr(AlumenCore, "translate_batch", translate_batch)
+
+    args = make_args(file_type='srt', input=str(src_dir), encoding='utf-8')
+    AlumenCore.AlumenEngine().call(AlumenCore.run_pipeline, files, str(tmp_path / "out"), args, stop)
+    # Il primo file viene scritto; delle letture anticipate partono al più quelle già in corso
+    assert (tmp_path / "out" / "f0.srt").read_text(encoding='utf-8').count("IT:Line 0") == 1
+    assert len(parsed) <= 1 + AlumenCore.PIPELINE_PREFETCH_FILES
+    assert not (tmp_path / "out" / "f1.srt").exists()
@@ -0,0 +1,92 @@
+import csv
+import json
+
+import polib
+import pytest
+
+import AlumenCore
+
+
+def _csv_args(make_args, **kw):
+    return make_args(file_type='csv', translate_col=1, output_col=2, delimiter=",", encoding="utf-8", **kw)
+
+
+def _write_rows(path, rows):
+    with open(path, 'w', encoding='utf-8', newline='') as f: csv.writer(f).writerows(rows)
+
+
+def _read_rows(path):
+    with open(path, encoding='utf-8', newline='') as f: return list(csv.reader(f))
+
+
+def _translate(prepared):
+    entries, write = prepared
+    for e in entries: e['callback']("IT:" + e['text'])
+    write()
+    return [e['text'] for e in entries]
+
+
+@pytest.mark.parametrize("text, expected", [("Open", True), ("  ", False), ("42", False), ("...", False), ("{player.name}", False), ("Hi {name}", True)])
+def test_determine_if_translatable(text, expected):
+    assert AlumenCore.determine_if_translatable(text) is expected
+
+
+@pytest.mark.parametrize("ctx, expected", [("menu principale", True), ("NPC_Guard_01", False), ("MainMenu", False), ("menu", True), ("123", False), ("", False)])
+def test_should_translate_msgctxt(ctx, expected):
+    assert AlumenCore.should_translate_msgctxt(ctx) is expected
+
+
+def test_csv_skips_header_untranslatable_and_wide_rows(tmp_path, make_args):
+    src, out = tmp_path / "in.csv", tmp_path / "out.csv"
+    _write_rows(src, [["id", "text", "out"], ["1", "Open", ""], ["2", "99", ""], ["3", "Close", "", "extra"]])
+    texts = _translate(AlumenCore._prepare_csv(str(src), str(out), _csv_args(make_args, max_cols=3)))
+    assert texts == ["Open"]
+    assert _read_rows(out)[:2] == [["id", "text", "out"], ["1", "Open", "IT:Open"]]
+
+
+def test_csv_resume_keeps_existing_translations(tmp_path, make_args):
+    src, out = tmp_path / "in.csv", tmp_path / "out.csv"
+    _write_rows(src, [["id", "text", "out"], ["1", "Open", ""], ["2", "Close", ""]])
+    _write_rows(out, [["id", "text", "out"], ["1", "Open", "Apri"], ["2", "Close", ""]])
+    texts = _translate(AlumenCore._prepare_csv(str(src), str(out), _csv_args(make_args, resume=True)))
+    assert texts == ["Close"]
+    assert _read_rows(out) == [["id", "text", "out"], ["1", "Open", "Apri"], ["2", "Close", "IT:Close"]]
+
+
+def test_json_keys_by_name_and_by_full_path(tmp_path, make_args):
+    src, out = tmp_path / "in.json", tmp_path / "out.json"
+    src.write_text(json.dumps({"title": "Menu", "items": [{"title": "Open", "id": "x"}, {"title": "7"}]}), encoding='utf-8')
+    args = make_args(file_type='json', json_keys="title", encoding="utf-8")
+    assert _translate(AlumenCore._prepare_json(str(src), str(out), args)) == ["Menu", "Open"]
+    assert json.loads(out.read_text(encoding='utf-8')) == {"title": "IT:Menu", "items": [{"title": "IT:Open", "id": "x"}, {"title": "7"}]}
+    args = make_args(file_type='json', json_keys="items[0].title", match_full_json_path=True, encoding="utf-8")
+    assert [e['text'] for e in AlumenCore._prepare_json(str(src), str(out), args)[0]] == ["Open"]
+
+
+def test_po_translates_msgctxt_and_resumes_existing_msgstr(tmp_path, make_args):
+    src, out = tmp_path / "in.po", tmp_path / "out.po"
+    po = polib.POFile()
+    po.append(polib.POEntry(msgid="Open", msgstr=""))
+    po.append(polib.POEntry(msgid="Close", msgctxt="menu principale", msgstr=""))
+    po.append(polib.POEntry(msgid="Save", msgctxt="NPC_Menu_01", msgstr=""))
+    po.append(polib.POEntry(msgid="42", msgstr=""))
+    po.save(str(src))
+    done = polib.POFile()
+    done.append(polib.POEntry(msgid="Open", msgstr="Apri"))
+    done.save(str(out))
+
+    args = make_args(file_type='po', encoding="utf-8", resume=True)
+    texts = _translate(AlumenCore._prepare_po(str(src), str(out), args))
+    assert texts == ["menu principale", "Close", "Save"]
+    result = {e.msgid: (e.msgctxt, e.msgstr) for e in polib.pofile(str(out))}
+    assert result == {"Open": (None, "Apri"), "Close": ("IT:menu principale", "IT:Close"),
+                      "Save": ("NPC_Menu_01", "IT:Save"), "42": (None, "42")}
+
+
+def test_srt_blocks_round_trip(tmp_path, make_args):
+    src, out = tmp_path / "in.srt", tmp_path / "out.srt"
+    src.write_text("1\n00:00:01,000 --> 00:00:02,000\nOpen\nthe door\n\n2\n00:00:03,000 --> 00:00:04,000\n...\n\n", encoding='utf-8')
+    texts = _translate(AlumenCore._prepare_srt(str(src), str(out), make_args(file_type='srt', encoding="utf-8")))
+    assert texts == ["Open\nthe door"]
+    content = out.read_text(encoding='utf-8')
+    assert "00:00:01,000 --> 00:00:02,000\nIT:Open\nthe door" in content and "\n...\n" in content
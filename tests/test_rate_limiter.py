@@ -0,0 +1,86 @@
+import asyncio
+import time
+import types
+
+import pytest
+
+import AlumenCore
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Orologio finto per RateLimiter: clock.now avanza solo quando lo sposta il test."""
+    fake = types.SimpleNamespace(now=1000.0)
+    monkeypatch.setattr(AlumenCore, "time", types.SimpleNamespace(monotonic=lambda: fake.now))
+    return fake
+
+
+def _try(limiter, keys, tokens=0):
+    with limiter.cond: return limiter._try_acquire(keys, tokens)
+
+
+def test_rpm_budget_then_wait_until_refill(clock):
+    rl = AlumenCore.RateLimiter(rpm=2)
+    assert _try(rl, ["a"]) == ("a", 0)
+    assert _try(rl, ["a"]) == ("a", 0)
+    key, wait = _try(rl, ["a"])
+    assert key is None and wait == pytest.approx(30)
+    clock.now += 30
+    assert _try(rl, ["a"]) == ("a", 0)
+
+
+def test_picks_the_key_that_has_capacity(clock):
+    rl = AlumenCore.RateLimiter(rpm=1)
+    assert _try(rl, ["a", "b"]) == ("a", 0)
+    assert _try(rl, ["a", "b"]) == ("b", 0)
+    clock.now += 15
+    key, wait = _try(rl, ["a", "b"])
+    assert key is None and wait == pytest.approx(45)
+
+
+def test_tpm_budget_and_settle(clock):
+    rl = AlumenCore.RateLimiter(tpm=1000)
+    assert _try(rl, ["a"], 600) == ("a", 0)
+    key, wait = _try(rl, ["a"], 600)
+    assert key is None and wait == pytest.approx(200 * 60 / 1000)
+    # La richiesta ha usato meno token della stima: il budget torna disponibile
+    rl.settle("a", 600, 100)
+    assert _try(rl, ["a"], 600) == ("a", 0)
+
+
+def test_refill_is_capped_at_the_budget(clock):
+    rl = AlumenCore.RateLimiter(rpm=2)
+    _try(rl, ["a"])
+    clock.now += 3600
+    assert _try(rl, ["a"])[0] == "a"
+    assert _try(rl, ["a"])[0] == "a"
+    assert _try(rl, ["a"])[0] is None
+
+
+def test_request_larger_than_tpm_does_not_block_forever():
+    rl = AlumenCore.RateLimiter(tpm=100)
+    assert rl.acquire(["a"], tokens=500) == "a"
+
+
+def test_acquire_sleeps_until_capacity():
+    rl = AlumenCore.RateLimiter(rpm=600)  # una richiesta ogni 0,1 s
+    rl.acquire(["a"])
+    rl.buckets["a"][0] = 0
+    start = time.monotonic()
+    assert rl.acquire(["a"]) == "a"
+    assert 0.05 < time.monotonic() - start < 1
+
+
+def test_acquire_async_does_not_block_the_loop():
+    rl = AlumenCore.RateLimiter(rpm=600)
+    rl.acquire(["a"])
+    rl.buckets["a"][0] = 0
+    ticks = []
+    async def ticker():
+        for _ in range(5):
+            ticks.append(time.monotonic())
+            await asyncio.sleep(0.01)
+    async def main():
+        return (await asyncio.gather(rl.acquire_async(["a"]), ticker()))[0]
+    assert asyncio.run(main()) == "a"
+    assert len(ticks) == 5
@@ -0,0 +1,130 @@
+import json
+import threading
+
+import pytest
+
+import AlumenCore
+
+
+@pytest.fixture
+def engine():
+    return AlumenCore.AlumenEngine()
+
+
+@pytest.fixture
+def ai(monkeypatch):
+    """
+    Finto call_ai_raw per le richieste con ID: ai.reply(id_texts) decide la risposta.
+    Di default traduce tutto; ai.requests registra gli input ricevuti.
+    """
+    class FakeAI:
+        requests = []
+        reply = staticmethod(lambda ids: json.dumps({k: "IT:" + v for k, v in ids.items()}))
+    def call_ai_raw(prompt, args):
+        ids = json.loads(prompt.split("INPUT:\n", 1)[1])
+        FakeAI.requests.append(ids)
+        return FakeAI.reply(ids)
+    monkeypatch.setattr(AlumenCore, "call_ai_raw", call_ai_raw)
+    return FakeAI
+
+
+@pytest.fixture
+def singles(monkeypatch):
+    seen = []
+    def translate_single(entry, args, file_context=None):
+        seen.append(entry['text'])
+        entry['callback']("SINGLE:" + entry['text'])
+    monkeypatch.setattr(AlumenCore, "_translate_single_entry", translate_single)
+    return seen
+
+
+def _batch(n):
+    out = {}
+    entries = [{'text': f"riga {i}", 'callback': (lambda i: lambda t: out.__setitem__(i, t))(i)} for i in range(n)]
+    return entries, out
+
+
+def _recover(engine, batch, args, stop=None):
+    stop = stop or threading.Event()
+    engine.call(AlumenCore._recover_failed_batch, batch, args, stop, None, None)
+    return stop
+
+
+def test_full_salvage_in_one_call(engine, ai, singles, make_args):
+    batch, out = _batch(5)
+    _recover(engine, batch, make_args())
+    assert out == {i: f"IT:riga {i}" for i in range(5)}
+    assert engine.recovery_stats == {'batches': 1, 'rows': 5, 'calls': 1, 'salvaged': 5}
+    assert singles == []
+
+
+def test_truncated_json_keeps_readable_pairs_and_resends_only_missing(engine, ai, singles, make_args):
+    # Prima risposta troncata a metà: le coppie complete vengono salvate
+    ai.reply = staticmethod(lambda ids: ('{"0": "IT:riga 0", "1": "IT:riga 1", "2": "IT:ri' if len(ai.requests) == 1
+                                         else json.dumps({k: "IT:" + v for k, v in ids.items()})))
+    batch, out = _batch(4)
+    _recover(engine, batch, make_args())
+    assert ai.requests[1] == {"0": "riga 2", "1": "riga 3"}
+    assert out == {i: f"IT:riga {i}" for i in range(4)}
+    assert engine.recovery_stats['calls'] == 2 and engine.recovery_stats['salvaged'] == 4
+
+
+def test_unknown_ids_and_non_string_values_are_ignored(engine, ai, singles, make_args):
+    ai.reply = staticmethod(lambda ids: json.dumps({**{k: "IT:" + v for k, v in ids.items() if k != "1"}, "1": 7, "99": "x"}))
+    batch, out = _batch(3)
+    _recover(engine, batch, make_args())
+    assert out[0] == "IT:riga 0" and out[2] == "IT:riga 2"
+    assert out[1] == "SINGLE:riga 1"
+    assert singles == ["riga 1"]
+
+
+def test_nothing_salvaged_splits_down_to_single_rows(engine, ai, singles, make_args):
+    ai.reply = staticmethod(lambda ids: "non è JSON")
+    batch, out = _batch(4)
+    _recover(engine, batch, make_args())
+    assert [sorted(r.values()) for r in ai.requests] == [[f"riga {i}" for i in range(4)], ["riga 0", "riga 1"], ["riga 2", "riga 3"]]
+    assert singles == [f"riga {i}" for i in range(4)]
+    assert engine.recovery_stats['calls'] == 3 + 4 and engine.recovery_stats['salvaged'] == 0
+
+
+def test_worst_case_calls_are_bounded(engine, ai, singles, make_args):
+    # Nessuna risposta utilizzabile: una richiesta, una divisione in due metà, poi riga per riga
+    ai.reply = staticmethod(lambda ids: "non è JSON")
+    batch, out = _batch(16)
+    _recover(engine, batch, make_args())
+    assert len(ai.requests) == 3 and len(singles) == 16
+    assert engine.recovery_stats['calls'] == len(batch) + 3
+    assert out == {i: f"SINGLE:riga {i}" for i in range(16)}
+
+
+def test_partial_salvage_after_split_still_resends_missing(engine, ai, singles, make_args):
+    # Il gruppo intero fallisce, le metà recuperano una riga per volta
+    ai.reply = staticmethod(lambda ids: "{}" if len(ai.requests) == 1 else json.dumps({min(ids): "IT:" + ids[min(ids)]}))
+    batch, out = _batch(6)
+    _recover(engine, batch, make_args())
+    # Ogni metà (3 righe): due richieste con ID, l'ultima riga rimasta passa alla traduzione singola
+    assert singles == ["riga 2", "riga 5"]
+    assert out == {i: ("SINGLE:" if i in (2, 5) else "IT:") + f"riga {i}" for i in range(6)}
+    assert engine.recovery_stats['calls'] == 1 + 2 * 3
+
+
+def test_api_key_error_stops_recovery(engine, ai, singles, make_args):
+    ai.reply = staticmethod(lambda ids: "ERROR_API_KEY")
+    batch, out = _batch(4)
+    stop = _recover(engine, batch, make_args())
+    assert stop.is_set() and out == {} and singles == []
+    assert len(ai.requests) == 1
+
+
+def test_recovery_feeds_the_adaptive_batcher(engine, ai, singles, make_args):
+    ai.reply = staticmethod(lambda ids: "{}")
+    args = make_args(batch_size=8)
+    batcher = engine.call(AlumenCore.AdaptiveBatcher, [], args, adaptive=True)
+    batch, _ = _batch(8)
+    engine.call(AlumenCore._recover_failed_batch, batch, args, threading.Event(), None, batcher)
+    assert batcher.failures == 1 + 2 and batcher.size == 1
+
+
+def test_parse_id_response_salvages_from_markdown_fence():
+    resp = '```json\n{"0": "Apri \\"la\\" porta", "1": "Chiu'
+    assert AlumenCore._parse_id_response(resp, {"0", "1"}) == {"0": 'Apri "la" porta'}
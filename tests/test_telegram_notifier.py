@@ -0,0 +1,38 @@
+import time
+import types
+
+import telegram_bot
+
+
+def _engine():
+    return types.SimpleNamespace(total_files_translated=0, total_entries_translated=0, files_total=0)
+
+
+def _counting_notifier(monkeypatch, **kw):
+    calls = []
+    real_collect = telegram_bot.TelegramNotifier._collect
+    def collect(self, force_digest=False):
+        calls.append(force_digest)
+        return real_collect(self, force_digest)
+    monkeypatch.setattr(telegram_bot.TelegramNotifier, "_collect", collect)
+    monkeypatch.setattr(telegram_bot.TelegramNotifier, "_deliver", lambda self, text: calls.append(text))
+    return telegram_bot.TelegramNotifier(_engine(), **kw), calls
+
+
+def test_idle_notifier_sleeps_between_digests(monkeypatch):
+    notifier, calls = _counting_notifier(monkeypatch, digest_interval=0.1, min_interval=0)
+    time.sleep(0.55)
+    notifier.close()
+    # Circa un giro per intervallo (più quello di close): senza novità niente invii e niente busy loop
+    assert len(calls) <= 8
+    assert all(isinstance(c, bool) for c in calls)
+
+
+def test_events_are_sent_in_the_next_digest(monkeypatch):
+    notifier, calls = _counting_notifier(monkeypatch, digest_interval=0.1, min_interval=0)
+    notifier.notify("⚠️ Riga saltata", telegram_bot.AlumenCore.LOG_WARNING)
+    time.sleep(0.3)
+    final = notifier.close()
+    sent = [c for c in calls if isinstance(c, str)]
+    assert len(sent) == 1 and "Riga saltata" in sent[0] and "Avvisi: `1`" in sent[0]
+    assert final == ""
@@ -0,0 +1,96 @@
+import json
+
+import pytest
+
+import AlumenCore
+
+
+def _key(text, ctx=None):
+    return json.dumps((text, "en", "it") if ctx is None else (text, "en", "it", ctx), ensure_ascii=False)
+
+
+@pytest.fixture
+def db(tmp_path):
+    return str(tmp_path / "cache.sqlite")
+
+
+def test_bloom_filter_has_no_false_negatives_and_few_false_positives():
+    bloom = AlumenCore.BloomFilter(2000)
+    for i in range(2000): bloom.add(f"k{i}")
+    assert all(f"k{i}" in bloom for i in range(2000))
+    false_pos = sum(f"x{i}" in bloom for i in range(20000))
+    assert false_pos / 20000 < AlumenCore.BLOOM_ERROR_RATE * 3
+
+
+def test_hot_cold_and_bloom_tiers(db):
+    store = AlumenCore.TieredCacheStore(db, hot_size=2)
+    store[_key("a")] = "A"
+    store[_key("b")] = "B"
+    store.flush()
+    assert store[_key("a")] == "A"
+    assert store.stats['hot_hits'] == 1
+    # Una chiave mai salvata viene scartata dal filtro senza query
+    assert store.get(_key("nessuno")) is None
+    assert store.stats['bloom_misses'] == 1
+    store[_key("c")] = "C"
+    assert store.stats['evictions'] == 1 and _key("b") not in store.hot
+    # "b" è uscita dalla LRU: arriva da SQLite e torna calda
+    assert store[_key("b")] == "B"
+    assert store.stats['cold_hits'] == 1 and _key("b") in store.hot
+    store.close()
+
+
+def test_generic_key_with_empty_context_is_the_same_entry(db):
+    store = AlumenCore.TieredCacheStore(db, hot_size=10)
+    store[_key("a", "")] = "A"
+    assert store[_key("a")] == "A"
+    store[_key("a")] = "A2"
+    assert len(store) == 1
+    store.close()
+
+
+def test_count_tracks_new_and_overwritten_keys(db):
+    store = AlumenCore.TieredCacheStore(db, hot_size=1)
+    store[_key("a")] = "A"
+    store[_key("b")] = "B"
+    store.flush()
+    store[_key("a")] = "A2"
+    assert len(store) == 2
+    del store[_key("a")]
+    assert len(store) == 1 and _key("a") not in store
+    store.close()
+
+
+def test_bloom_sidecar_is_reused_when_row_count_matches(db, monkeypatch):
+    store = AlumenCore.TieredCacheStore(db)
+    store[_key("a")] = "A"
+    store.close()
+
+    def rebuild(self): raise AssertionError("filtro ricostruito")
+    monkeypatch.setattr(AlumenCore.TieredCacheStore, "_build_bloom", rebuild)
+    reopened = AlumenCore.TieredCacheStore(db)
+    assert reopened[_key("a")] == "A" and reopened.stats['cold_hits'] == 1
+    reopened.conn.close()
+
+
+def test_stale_bloom_sidecar_is_rebuilt(db):
+    store = AlumenCore.TieredCacheStore(db)
+    store[_key("a")] = "A"
+    store.close()
+    # Voce aggiunta da un altro processo senza aggiornare il .bloom
+    plain = AlumenCore.SQLiteCacheStore(db)
+    plain[_key("b")] = "B"
+    plain.close()
+    reopened = AlumenCore.TieredCacheStore(db)
+    assert reopened[_key("b")] == "B"
+    reopened.close()
+
+
+def test_update_many_refreshes_bloom_and_hot_tier(db):
+    store = AlumenCore.TieredCacheStore(db)
+    store[_key("a")] = "A"
+    store.flush()
+    store.update_many([(_key("a"), "A2"), (_key("z"), "Z")])
+    assert store[_key("a")] == "A2" and store[_key("z")] == "Z"
+    assert len(store) == 2
+    store.close()
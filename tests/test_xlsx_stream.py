@@ -0,0 +1,67 @@
+from threading import Event
+
+import openpyxl
+import pytest
+
+import AlumenCore
+
+
+SHEETS = {
+    "Menu": [["id", "text", None]] + [[i, f"line {i}", None] for i in range(7)],
+    "Vuoto": [],
+    "Dialoghi": [[1, "Hello there", None], [2, "123", None], [3, None, None], [4, "Bye"]],
+}
+
+
+def _make_workbook(path):
+    wb = openpyxl.Workbook()
+    wb.remove(wb.active)
+    for title, rows in SHEETS.items():
+        ws = wb.create_sheet(title)
+        for row in rows: ws.append(row)
+    wb.save(path)
+
+
+def _values(path):
+    wb = openpyxl.load_workbook(path)
+    return {ws.title: [list(r) for r in ws.iter_rows(values_only=True)] for ws in wb.worksheets}
+
+
+@pytest.fixture
+def xlsx_args(make_args, monkeypatch):
+    monkeypatch.setattr(AlumenCore, "STREAM_CHUNK_ROWS", 3)
+    return lambda **kw: make_args(file_type='xlsx', xlsx_source_col="B", xlsx_target_col="C", **kw)
+
+
+def test_stream_translates_every_sheet_like_the_default_path(tmp_path, xlsx_args, fake_translate):
+    src = tmp_path / "in.xlsx"
+    _make_workbook(src)
+    stream_out, default_out = str(tmp_path / "stream.xlsx"), str(tmp_path / "default.xlsx")
+    AlumenCore.process_xlsx(str(src), stream_out, xlsx_args(stream=True), Event())
+    streamed = list(fake_translate)
+    fake_translate.clear()
+    AlumenCore.process_xlsx(str(src), default_out, xlsx_args(), Event())
+    assert streamed == fake_translate
+    assert list(_values(stream_out)) == list(SHEETS)
+    assert _values(stream_out) == _values(default_out)
+    assert _values(stream_out)["Dialoghi"] == [[1, "Hello there", "IT:Hello there"], [2, "123", None], [3, None, None], [4, "Bye", "IT:Bye"]]
+    assert not (tmp_path / "stream.xlsx.tmp").exists()
+
+
+def test_stream_skips_files_over_max_entries(tmp_path, xlsx_args, fake_translate):
+    src = tmp_path / "in.xlsx"
+    _make_workbook(src)
+    out = tmp_path / "out.xlsx"
+    AlumenCore.process_xlsx_stream(str(src), str(out), xlsx_args(stream=True, max_entries=5), Event())
+    assert fake_translate == [] and not out.exists()
+
+
+def test_stop_leaves_no_partial_output(tmp_path, xlsx_args, monkeypatch):
+    src = tmp_path / "in.xlsx"
+    _make_workbook(src)
+    out = tmp_path / "out.xlsx"
+    stop = Event()
+    def translate_batch(entries, args, stop_event, file_context=None, reset_context=True): stop_event.set()
+    monkeypatch.setattr(AlumenCore, "translate_batch", translate_batch)
+    AlumenCore.process_xlsx_stream(str(src), str(out), xlsx_args(stream=True), stop)
+    assert not out.exists() and not (tmp_path / "out.xlsx.tmp").exists()